@@ -98,6 +98,8 @@ DATABASES = {
         'OPTIONS': {
             'sslmode': os.environ.get('PGSSLMODE', 'require')
         },
+        # port 6543 is Supabase's transaction-mode pgbouncer: named cursors do not survive it
+        'DISABLE_SERVER_SIDE_CURSORS': True,
     }
 }
 
@@ -148,11 +150,50 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# ML models served through routes.ml_registry. Arrays are memory-mapped from
+# the joblib files (dump them uncompressed), so gunicorn workers share pages.
+ML_MODELS = {
+    'damage_classifier': os.path.join(BASE_DIR, 'routes', 'ml_models', 'model_pipeline.pkl'),
+    'label_encoder': os.path.join(BASE_DIR, 'routes', 'ml_models', 'label_encoder.pkl'),
+}
+ML_MODEL_MMAP_MODE = 'r'
+ML_MODEL_RELOAD_CHECK_SECONDS = 5       # how often a worker looks for a swapped model file
+ML_PRELOAD = env.bool("ML_PRELOAD", default=True)
+FEATURE_DECODE_WORKERS = env.int("FEATURE_DECODE_WORKERS", default=4)  # image decode threads per process
+
+# in-memory manufacturer/model search index (routes.search)
+SEARCH_PRELOAD = env.bool("SEARCH_PRELOAD", default=True)
+SEARCH_INDEX_CHECK_SECONDS = 2          # how often a worker looks for catalogue edits
+WARRANTY_CACHE_CHECK_SECONDS = 2        # same, for the cached warranty curves (routes.warranty)
+REFERENCE_CACHE_CHECK_SECONDS = 2       # same, for the cached lookup tables; bounds how stale they get
+
+# hash uploads while they stream in (routes.storage content-addressed images)
+FILE_UPLOAD_HANDLERS = [
+    "routes.storage.HashingMemoryFileUploadHandler",
+    "routes.storage.HashingTemporaryFileUploadHandler",
+]
+
+# staging area for resumable chunked uploads (routes.chunked); keep it on the
+# same filesystem as MEDIA_ROOT so completed files are moved, not copied
+CHUNKED_UPLOAD_DIR = env("CHUNKED_UPLOAD_DIR", default=os.path.join(BASE_DIR, "chunked_uploads"))
+
+# radiometric thermal TIFFs (routes.thermal): degC = raw * scale + offset;
+# the default reads 16-bit counts in centi-Kelvin (FLIR TLinear 0.01 K)
+THERMAL_RAW_SCALE = env.float("THERMAL_RAW_SCALE", default=0.01)
+THERMAL_RAW_OFFSET = env.float("THERMAL_RAW_OFFSET", default=-273.15)
+
+# predict/batch/ accepts one image per panel for a whole site visit
+DATA_UPLOAD_MAX_NUMBER_FILES = 2500
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    # list endpoints page with a (created_at, id) keyset cursor; ?page_size= up to API_MAX_PAGE_SIZE
+    'DEFAULT_PAGINATION_CLASS': 'routes.pagination.KeysetPagination',
+    'PAGE_SIZE': env.int("API_PAGE_SIZE", default=100),
 }
+API_MAX_PAGE_SIZE = env.int("API_MAX_PAGE_SIZE", default=1000)
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),  # or whatever you want
@@ -7,6 +7,7 @@ For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 """
 
+import logging
 import os
 
 from django.core.wsgi import get_wsgi_application
@@ -14,5 +15,30 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.ML_PRELOAD:
+    # load models in the gunicorn master (preload_app) so forked workers share them
+    from routes.features import check_classifier
+    from routes.ml_registry import registry
+    registry.warm()
+    if registry.get('damage_classifier') is not None:
+        # refuse to start with a model fit on another feature layout
+        check_classifier(registry.get('damage_classifier'))
+
+if settings.SEARCH_PRELOAD:
+    # build the manufacturer search index once, before gunicorn forks
+    from django.db import connections
+    from routes.search import manufacturer_search
+    try:
+        manufacturer_search.ensure_fresh()
+    except Exception as e:
+        # database not ready (e.g. first deploy); the first search builds it
+        logging.getLogger(__name__).warning("Search index not preloaded: %s", e)
+    finally:
+        # forked workers must not inherit (and share) the master's database socket
+        connections.close_all()
+
 # add this vercel variable
 app = application
@@ -0,0 +1,3 @@
+# Import the app (and warm the ML model registry) once in the master process,
+# so workers fork with the memory-mapped model pages already shared.
+preload_app = True
@@ -31,6 +31,10 @@ class DonationResource(resources.ModelResource):
     class Meta:
         model = Donation
 
+class ThresholdProfileResource(resources.ModelResource):
+    class Meta:
+        model = ThresholdProfile
+
 class ManufacturerDataResource(resources.ModelResource):
     class Meta:
         model = ManufacturerData
@@ -51,7 +55,19 @@ class UserAdmin(ImportExportModelAdmin):
 @admin.register(SolarPanels)
 class SolarPanelsAdmin(ImportExportModelAdmin):
     resource_class = SolarPanelsResource
-    list_display = ("companyName", "installationYear", "user", "created_at")
+    list_display = ("companyName", "installationYear", "user", "decision", "threshold_version", "created_at")
+
+@admin.register(ThresholdProfile)
+class ThresholdProfileAdmin(ImportExportModelAdmin):
+    resource_class = ThresholdProfileResource
+    list_display = ("version", "name", "is_active", "overheat_margin", "underheat_margin",
+                    "typhoon_speed_threshold", "medium_damage_threshold", "severe_damage_threshold", "created_at")
+
+    def get_readonly_fields(self, request, obj=None):
+        # a saved version is immutable; tuning means creating a new profile
+        if obj is None:
+            return ()
+        return tuple(f.name for f in obj._meta.fields if f.name not in ("name", "is_active"))
 
 @admin.register(InspectionType)
 class InspectionTypeAdmin(ImportExportModelAdmin):
@@ -0,0 +1,374 @@
+import datetime
+from collections import namedtuple
+import numpy as np
+
+TEMP_SURFACE_FLAT_TOLERANCE = 2         # minimal surface fluctuation
+TEMP_AMBIENT_VARIATION = 5              # significant ambient swing
+TEMP_OVERHEAT_MARGIN = 25               # excess heat above ambient
+TEMP_UNDERHEAT_MARGIN = 10              # unusual cooling below ambient
+TYPHOON_SPEED_THRESHOLD = 8             # typhoon threshold from flowchart "T8"
+MEDIUM_DAMAGE_THRESHOLD = 0.3
+SEVERE_DAMAGE_THRESHOLD = 0.6
+PANEL_LIFETIME_YEARS = 25
+
+Thresholds = namedtuple('Thresholds', [
+    'surface_flat_tolerance', 'ambient_variation', 'overheat_margin',
+    'underheat_margin', 'typhoon_speed_threshold', 'medium_damage_threshold',
+    'severe_damage_threshold',
+])
+
+DEFAULT_THRESHOLDS = Thresholds(
+    surface_flat_tolerance=TEMP_SURFACE_FLAT_TOLERANCE,
+    ambient_variation=TEMP_AMBIENT_VARIATION,
+    overheat_margin=TEMP_OVERHEAT_MARGIN,
+    underheat_margin=TEMP_UNDERHEAT_MARGIN,
+    typhoon_speed_threshold=TYPHOON_SPEED_THRESHOLD,
+    medium_damage_threshold=MEDIUM_DAMAGE_THRESHOLD,
+    severe_damage_threshold=SEVERE_DAMAGE_THRESHOLD,
+)
+
+DAMAGE_TYPES = (
+    "Normal",
+    "Unknown",
+    "Sensor or panel unresponsive",
+    "Critical overheating",
+    "Excessive heating",
+    "Unusual cooling",
+    "Sensor anomaly (C2 < C1)",
+)
+
+DECISIONS = (
+    "Undetermined",
+    "Panel in good condition",
+    "Repair with warranty",
+    "Repair without warranty",
+    "Replace with warranty",
+    "Replace without warranty",
+    "Recycle Panel",
+)
+
+# decision-tree leaves: (decision code, recommendations)
+BRANCHES = (
+    (1, ("No immediate action required",)),
+    (4, ("Issue replacement under warranty; schedule inspection",
+         "Schedule urgent inspection (drone or technician)")),
+    (5, ("Recommend replacement; warranty expired",
+         "Schedule urgent inspection (drone or technician)")),
+    (4, ("High damage detected; replace under warranty",)),
+    (5, ("High damage detected; recommend replacement",)),
+    (2, ("Moderate damage; repair covered under warranty",)),
+    (3, ("Moderate damage; repair recommended (out-of-warranty)",)),
+    (1, ("Minor / uncertain damage; monitor or request user confirmation",)),
+)
+
+TYPHOON_RECOMMENDATION = "Typhoon alert: schedule drone inspection within 48 hours after typhoon"
+SENSOR_RECOMMENDATION = "Sensor abnormal: request sensor diagnostics and visual inspection"
+
+END_OF_LIFE_DAMAGE_TYPE = 'End of life / recycle recommended'
+
+# damage type codes stored in PanelAssessment: DAMAGE_TYPES plus end of life
+ASSESSED_DAMAGE_TYPES = DAMAGE_TYPES + (END_OF_LIFE_DAMAGE_TYPE,)
+
+# raw request keys kept on each panel so it can be re-scored later
+INPUT_KEYS = (
+    'companyName', 'modelName', 'installationYear', 'savingsPerYear',
+    'maintenanceCost', 'kwhGenerated', 'promisedDegradationRate',
+    'currentDegradationRate', 'currentTyphoonSpeed', 'promisedWindBearingSpeed',
+    'warrantyAge', 'sensorAlert', 'typhoonAlert', 'C1', 'C2', 'T1', 'T2',
+    'installedCapacity_kWp', 'annualIrradiation', 'systemCost',
+    'electricityRate', 'lossFactor', 'lifetimeYears', 'latitude', 'longitude',
+)
+
+# per-panel inputs, in the order they are stacked into arrays
+PARAM_FIELDS = (
+    'installation_year', 'savings_per_year', 'maintenance_cost', 'kwh_generated',
+    'promised_degradation', 'current_degradation', 'current_typhoon_speed',
+    'promised_wind_speed', 'warranty_age', 'x1', 'x2', 'c1', 'c2', 't1', 't2',
+    'installed_capacity_kwp', 'annual_irradiation', 'system_cost',
+    'electricity_rate', 'loss_factor', 'lifetime_years', 'latitude', 'longitude',
+)
+
+
+def _safe_float(val, default=0.0):
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return default
+
+def _safe_int(val, default=0):
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        return default
+
+def _optional_float(val):
+    return None if val in (None, '', 'None') else _safe_float(val, None)
+
+
+def parse_panel_params(data, now_year=None):
+    """
+    Normalizes one panel's raw parameters (request.POST or a row of the
+    batch parameter table) into the scalar inputs used by the assessment.
+    Defaults mirror the ones predict_damage has always applied.
+    """
+    if now_year is None:
+        now_year = datetime.datetime.now().year
+    return {
+        'company_name': data.get('companyName', 'Unknown'),
+        'model_name': data.get('modelName', None),
+        'installation_year': _safe_int(data.get('installationYear'), now_year),
+        'savings_per_year': _safe_float(data.get('savingsPerYear'), 0.0),
+        'maintenance_cost': _safe_float(data.get('maintenanceCost'), 1.0),  # avoid /0
+        'kwh_generated': _safe_float(data.get('kwhGenerated', 0.0), 0.0),
+        'promised_degradation': _safe_float(data.get('promisedDegradationRate', 0.01), 0.01),
+        'current_degradation': _safe_float(data.get('currentDegradationRate', 0.01), 0.01),
+        'current_typhoon_speed': _safe_float(data.get('currentTyphoonSpeed', 0.0), 0.0),
+        'promised_wind_speed': _safe_float(data.get('promisedWindBearingSpeed', 1.0), 1.0),
+        'warranty_age': _safe_int(data.get('warrantyAge', 25), 25),
+        'x1': _safe_int(data.get('sensorAlert', 0), 0),
+        'x2': _safe_int(data.get('typhoonAlert', 0), 0),
+        'c1': _optional_float(data.get('C1')),
+        'c2': _optional_float(data.get('C2')),
+        't1': _optional_float(data.get('T1')),
+        't2': _optional_float(data.get('T2')),
+        'installed_capacity_kwp': _safe_float(data.get('installedCapacity_kWp', 0.0), 0.0),
+        'annual_irradiation': _safe_float(data.get('annualIrradiation', 0.0), 0.0),  # kWh/m^2
+        'system_cost': _safe_float(data.get('systemCost', 0.0), 0.0),
+        'electricity_rate': _safe_float(data.get('electricityRate', 0.0), 0.0),
+        'loss_factor': _safe_float(data.get('lossFactor', 0.10), 0.10),  # default 10% loss
+        'lifetime_years': _safe_int(data.get('lifetimeYears', 25), 25),
+        'latitude': _optional_float(data.get('latitude')),
+        'longitude': _optional_float(data.get('longitude')),
+    }
+
+
+def raw_inputs(data):
+    """The subset of a request/row that parse_panel_params reads, JSON-ready."""
+    return {key: data.get(key) for key in INPUT_KEYS if data.get(key) is not None}
+
+
+def stack_params(rows):
+    """
+    Turns a list of parse_panel_params() dicts into one float64 column per
+    field; missing readings (None) become NaN.
+    """
+    return {
+        field: np.array([np.nan if row[field] is None else row[field] for row in rows],
+                        dtype=np.float64)
+        for field in PARAM_FIELDS
+    }
+
+
+def damage_types_from_temps(c1, c2, t1, t2, thresholds=DEFAULT_THRESHOLDS):
+    """
+    Vectorized compute_damage_type_from_temps over whole arrays (NaN marks a
+    missing reading). Returns (codes, notes) where codes index DAMAGE_TYPES.
+    The C2 < C1 sensor anomaly override applied by predict_damage is included.
+    """
+    with np.errstate(invalid='ignore'):
+        surface_delta = c2 - t2
+        conditions = [
+            np.isnan(c1) | np.isnan(c2),
+            ((np.abs(c2 - c1) < thresholds.surface_flat_tolerance)
+             & (np.abs(t2 - t1) > thresholds.ambient_variation)),
+            surface_delta > thresholds.overheat_margin,
+            surface_delta > 0,
+            (t1 - c1) > thresholds.underheat_margin,
+        ]
+        codes = np.select(conditions, [1, 2, 3, 4, 5], default=0)
+        codes = np.where(c2 < c1, 6, codes)
+    notes = (
+        "Temperatures within expected ranges",
+        "Missing surface temperature readings",
+        "Surface flat while ambient swings",
+        f"C2-T2 > {thresholds.overheat_margin:g}",
+        "Moderate heating vs ambient",
+        f"T1 - C1 > {thresholds.underheat_margin:g}",
+        "C2 < C1 (max < min) - possible sensor mis-reporting",
+    )
+    return codes.astype(np.int8), notes
+
+
+def _divide(num, denom):
+    # a zero denominator made the scalar formula raise; keep that as "no value"
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denom == 0, np.nan, num / np.where(denom == 0, 1.0, denom))
+
+
+def sensor_s_values(p, current_age):
+    """S_sensor for every panel, picking the sensor/typhoon/default formula per row."""
+    ratio = p['savings_per_year'] / np.maximum(p['maintenance_cost'], 1e-6)
+    sensor = ratio * _divide(p['promised_degradation'], p['current_degradation'] * current_age + 1)
+    typhoon = ratio * _divide(
+        p['promised_degradation'] * p['promised_wind_speed'],
+        p['current_degradation'] * current_age * np.maximum(1.0, p['current_typhoon_speed']) + 1,
+    )
+    default = ratio * _divide(p['promised_degradation'], p['current_degradation'] + current_age + 1)
+    return np.select([p['x1'] == 1, p['x2'] == 1], [sensor, typhoon], default=default)
+
+
+def theoretical_s_values(p):
+    """S_theoretical for every panel; NaN where the economic inputs are incomplete."""
+    annual_energy = p['installed_capacity_kwp'] * p['annual_irradiation'] * np.maximum(0.0, 1.0 - p['loss_factor'])
+    valid = ((p['installed_capacity_kwp'] > 0) & (p['annual_irradiation'] > 0)
+             & (p['lifetime_years'] > 0) & (p['system_cost'] > 0) & (annual_energy > 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cost_per_kwh = p['system_cost'] / (annual_energy * p['lifetime_years'])
+        S1 = p['electricity_rate'] - cost_per_kwh
+        denom = np.maximum(1e-6, p['savings_per_year'])
+        S_theoretical = S1 / (denom / (annual_energy + 1e-6))  # normalized indicator
+    return np.where(valid, S_theoretical, np.nan)
+
+
+def assess(p, now_year=None, damage_prob=None, normal_label=None, thresholds=DEFAULT_THRESHOLDS):
+    """
+    Runs the full flowchart (temperature rules, S values, damage score and
+    decision tree) over stacked panel columns in one pass.
+
+    damage_prob / normal_label are optional per-panel classifier outputs
+    (NaN / False where no prediction is available). thresholds is a
+    Thresholds tuple, usually ThresholdProfile.as_thresholds().
+    Returns a dict of result arrays, one entry per panel.
+    """
+    if now_year is None:
+        now_year = datetime.datetime.now().year
+    n = len(p['installation_year'])
+    if damage_prob is None:
+        damage_prob = np.full(n, np.nan)
+    if normal_label is None:
+        normal_label = np.zeros(n, dtype=bool)
+
+    current_age = np.maximum(now_year - p['installation_year'], 0)
+    end_of_life = (current_age > PANEL_LIFETIME_YEARS) | (current_age > p['warranty_age'])
+
+    damage_codes, damage_notes = damage_types_from_temps(p['c1'], p['c2'], p['t1'], p['t2'], thresholds)
+
+    S_sensor = sensor_s_values(p, current_age)
+    S_theoretical = theoretical_s_values(p)
+    S_value = np.where(~np.isnan(S_sensor), S_sensor,
+                       np.where(~np.isnan(S_theoretical), S_theoretical, 0.0))
+
+    has_prob = ~np.isnan(damage_prob)
+    fallback_score = np.clip(2.0 * np.where(S_value < 1.0, 1.0, 0.5), 0.0, 1.0)
+    damage_score = np.where(has_prob,
+                            np.where(normal_label, 1.0 - damage_prob, damage_prob),
+                            fallback_score)
+
+    warranty_active = current_age <= p['warranty_age']
+    good = (S_value >= 1.0) & (damage_score < thresholds.medium_damage_threshold) & (damage_codes == 0)
+    critical = (damage_codes == 3) | (damage_codes == 2)
+    severe = damage_score >= thresholds.severe_damage_threshold
+    medium = (damage_score >= thresholds.medium_damage_threshold) & ~severe
+    branch = np.select(
+        [good, critical, severe, medium],
+        [0, np.where(warranty_active, 1, 2), np.where(warranty_active, 3, 4),
+         np.where(warranty_active, 5, 6)],
+        default=7,
+    )
+    branch_decisions = np.array([decision for decision, _ in BRANCHES], dtype=np.int8)
+    decision = np.where(end_of_life, DECISIONS.index("Recycle Panel"), branch_decisions[branch])
+
+    typhoon = (p['x2'] == 1) | (p['current_typhoon_speed'] >= thresholds.typhoon_speed_threshold)
+    sensor_fault = (p['x1'] == 1) & np.isin(damage_codes, (2, 6))
+
+    return {
+        'current_age': current_age,
+        'end_of_life': end_of_life,
+        'damage_type': damage_codes,
+        'damage_notes': damage_notes,
+        'S_sensor': S_sensor,
+        'S_theoretical': S_theoretical,
+        'S_value': S_value,
+        'damage_probability': damage_prob,
+        'damage_score': damage_score,
+        'branch': branch,
+        'decision': decision.astype(np.int8),
+        'send_inspection_request': typhoon,
+        'schedule_drone_inspection': typhoon,
+        'send_reminders': typhoon | sensor_fault,
+        'sensor_fault': sensor_fault,
+    }
+
+
+def _nullable(value):
+    return None if np.isnan(value) else float(value)
+
+
+def stored_fields(result, i):
+    """Verdict columns persisted on SolarPanels for panel i."""
+    if result['end_of_life'][i]:
+        return {
+            'damage_type': END_OF_LIFE_DAMAGE_TYPE,
+            'decision': 'Recycle Panel',
+            'S_value': 0.0,
+            'damage_score': None,
+        }
+    return {
+        'damage_type': DAMAGE_TYPES[result['damage_type'][i]],
+        'decision': DECISIONS[result['decision'][i]],
+        'S_value': float(result['S_value'][i]),
+        'damage_score': float(result['damage_score'][i]),
+        'send_inspection_request': bool(result['send_inspection_request'][i]),
+        'schedule_drone_inspection': bool(result['schedule_drone_inspection'][i]),
+        'send_reminders': bool(result['send_reminders'][i]),
+    }
+
+
+def history_fields(result, i):
+    """PanelAssessment columns for panel i: enum codes and plain floats (None for NaN)."""
+    if result['end_of_life'][i]:
+        return {
+            'damage_type': ASSESSED_DAMAGE_TYPES.index(END_OF_LIFE_DAMAGE_TYPE),
+            'decision': DECISIONS.index('Recycle Panel'),
+            'S_value': 0.0,
+            'damage_score': None,
+            'damage_probability': _nullable(result['damage_probability'][i]),
+        }
+    return {
+        'damage_type': int(result['damage_type'][i]),
+        'decision': int(result['decision'][i]),
+        'S_value': _nullable(result['S_value'][i]),
+        'damage_score': _nullable(result['damage_score'][i]),
+        'damage_probability': _nullable(result['damage_probability'][i]),
+    }
+
+
+def build_payload(result, i, label="Unknown"):
+    """
+    Response payload for panel i, in exactly the shape predict_damage returns
+    for a single panel (saved_id is filled in by the caller).
+    """
+    if result['end_of_life'][i]:
+        return {
+            'prediction': None,
+            'damage_type': END_OF_LIFE_DAMAGE_TYPE,
+            'decision': 'Recycle Panel',
+            'reason': 'Panel age exceeds lifetime or warranty',
+            'saved_id': None,
+        }
+
+    action_recommendations = list(BRANCHES[result['branch'][i]][1])
+    if result['send_inspection_request'][i]:
+        action_recommendations.append(TYPHOON_RECOMMENDATION)
+    if result['sensor_fault'][i]:
+        action_recommendations.append(SENSOR_RECOMMENDATION)
+
+    damage_code = result['damage_type'][i]
+    return {
+        'prediction_label': label,
+        'damage_probability': _nullable(result['damage_probability'][i]),
+        'damage_score': float(result['damage_score'][i]),
+        'damage_type_from_temps': DAMAGE_TYPES[damage_code],
+        'temperature_notes': result['damage_notes'][damage_code],
+        'S_value': float(result['S_value'][i]),
+        'S_components': {
+            'sensor_based_S': _nullable(result['S_sensor'][i]),
+            'theoretical_S': _nullable(result['S_theoretical'][i]),
+        },
+        'decision': DECISIONS[result['decision'][i]],
+        'action_recommendations': action_recommendations,
+        'send_inspection_request': bool(result['send_inspection_request'][i]),
+        'schedule_drone_inspection': bool(result['schedule_drone_inspection'][i]),
+        'send_reminders': bool(result['send_reminders'][i]),
+        'saved_id': None,
+    }
@@ -0,0 +1,192 @@
+import csv
+import io
+import json
+import time
+from types import SimpleNamespace
+from django.db import connection, transaction
+from django.utils import timezone
+from .bulk import insert_values, update_from_values
+from .models import ManufacturerData
+from .signals import MANUFACTURER_DATA, bump_after_commit
+from .specs import CATALOGUE_FIELDS, SPEC_FIELDS, catalogue_hash, spec_column, spec_values
+
+CHUNK_SIZE = 5000                       # file rows per transaction
+WRITE_BATCH_SIZE = 500                  # rows per INSERT/UPDATE; ~40 columns each stays under SQLite's variable limit
+MAX_ERRORS = 100                        # row errors listed in the summary
+MAX_LENGTH = 250                        # every catalogue column is a CharField(250)
+FORMATS = ('csv', 'ndjson')
+
+_WRITE_FIELDS = [*CATALOGUE_FIELDS, *(spec_column(name) for name in SPEC_FIELDS), 'content_hash', 'updated_at']
+
+
+class CatalogueError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt='csv'):
+    """
+    Yields (line number, dict) from a binary catalogue file without loading
+    it: CSV with a header row of ManufacturerData field names, or one JSON
+    object per line.
+    """
+    if fmt not in FORMATS:
+        raise CatalogueError(f"Unknown format '{fmt}'; choose from {', '.join(FORMATS)}")
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        try:
+            for row in reader:
+                yield reader.line_num, row
+        except csv.Error as e:
+            raise CatalogueError(f"Malformed CSV after line {reader.line_num}: {e}")
+        return
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise CatalogueError(f"Line {line_number}: not valid JSON")
+        if not isinstance(row, dict):
+            raise CatalogueError(f"Line {line_number}: expected a JSON object")
+        yield line_number, row
+
+
+def clean_values(row):
+    """CATALOGUE_FIELDS values of one file row: stripped text, blanks and missing columns as None."""
+    values = []
+    for field in CATALOGUE_FIELDS:
+        value = row.get(field)
+        value = None if value is None else str(value).strip()
+        values.append(value or None)
+    return tuple(values)
+
+
+def _natural_key(values):
+    # company, series and model name, compared case- and whitespace-insensitively
+    return tuple(' '.join((values[i] or '').lower().split()) for i in (0, 2, 3))
+
+
+class CatalogueImport:
+    """
+    Bulk upsert of catalogue rows into ManufacturerData. A file row
+    matches an existing record by `id` when it holds a known one, else by
+    company, series and model name; anything else is a new record. Rows
+    whose specs.catalogue_hash equals the stored content_hash are skipped
+    without touching the database; new and changed rows are written with
+    one multi-row INSERT or UPDATE ... FROM (VALUES ...) per batch,
+    CHUNK_SIZE file rows per transaction. With dry_run nothing is written,
+    and the summary counts what would have been.
+    """
+
+    def __init__(self, dry_run=False, chunk_size=CHUNK_SIZE):
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size
+        self.hashes = {}
+        self.by_key = {}
+        self._placeholder = 0
+        self.summary = {'rows': 0, 'inserted': 0, 'changed': 0, 'unchanged': 0, 'invalid': 0, 'errors': []}
+        existing = ManufacturerData.objects.order_by('id').values_list(
+            'id', 'name', 'series_name', 'model_name', 'content_hash')
+        for row_id, name, series, model, content_hash in existing.iterator(chunk_size=10000):
+            self.hashes[row_id] = content_hash
+            # the oldest record wins when the catalogue already holds duplicates
+            self.by_key.setdefault(_natural_key((name, None, series, model)), row_id)
+
+    def _error(self, line, message):
+        self.summary['invalid'] += 1
+        if len(self.summary['errors']) < MAX_ERRORS:
+            self.summary['errors'].append(f"Line {line}: {message}")
+
+    def _target(self, row, key):
+        raw_id = row.get('id')
+        if raw_id not in (None, ''):
+            try:
+                row_id = int(raw_id)
+            except (TypeError, ValueError):
+                return None
+            if row_id in self.hashes:
+                return row_id
+        return self.by_key.get(key)
+
+    def _write(self, inserts, updates):
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+        def row(values, content_hash):
+            parsed = spec_values(SimpleNamespace(**dict(zip(CATALOGUE_FIELDS, values))))
+            return (*values, *(parsed[spec_column(name)] for name in SPEC_FIELDS), content_hash, now)
+
+        with transaction.atomic():
+            if inserts:
+                ids = insert_values(ManufacturerData, [*_WRITE_FIELDS, 'created_at'],
+                                    [(*row(*item), now) for item in inserts.values()], batch_size=WRITE_BATCH_SIZE)
+                for (key, (_, content_hash)), row_id in zip(inserts.items(), ids):
+                    self.by_key[key] = row_id
+                    self.hashes[row_id] = content_hash
+            if updates:
+                update_from_values(ManufacturerData, _WRITE_FIELDS,
+                                   [(row_id, *row(*item)) for row_id, item in updates.items()],
+                                   batch_size=WRITE_BATCH_SIZE)
+            # raw writes bypass save() and post_save: the search index and warranty caches refresh off this bump
+            bump_after_commit(MANUFACTURER_DATA)
+
+    def _process(self, chunk):
+        inserts = {}
+        updates = {}
+        for line, row in chunk:
+            self.summary['rows'] += 1
+            values = clean_values(row)
+            if not (values[0] or values[3]):
+                self._error(line, "needs a name or a model_name")
+                continue
+            too_long = [field for field, value in zip(CATALOGUE_FIELDS, values) if value and len(value) > MAX_LENGTH]
+            if too_long:
+                self._error(line, f"longer than {MAX_LENGTH} characters: {', '.join(too_long)}")
+                continue
+            content_hash = catalogue_hash(values)
+            key = _natural_key(values)
+            target = self._target(row, key)
+            if key in inserts and target is None:
+                # repeated within the chunk: the last occurrence is the one written
+                if inserts[key][1] == content_hash:
+                    self.summary['unchanged'] += 1
+                else:
+                    inserts[key] = (values, content_hash)
+                    self.summary['changed'] += 1
+            elif target is None:
+                inserts[key] = (values, content_hash)
+                self.summary['inserted'] += 1
+            elif self.hashes.get(target) == content_hash:
+                self.summary['unchanged'] += 1
+            else:
+                updates[target] = (values, content_hash)
+                self.summary['changed'] += 1
+                self.hashes[target] = content_hash
+        if self.dry_run:
+            for key, (_, content_hash) in inserts.items():
+                # stand-in ids, so later rows of the same model count as updates
+                self._placeholder -= 1
+                self.by_key[key] = self._placeholder
+                self.hashes[self._placeholder] = content_hash
+        elif inserts or updates:
+            self._write(inserts, updates)
+
+    def run(self, rows):
+        """Imports (line, dict) rows chunk by chunk; returns the summary."""
+        started = time.perf_counter()
+        chunk = []
+        for item in rows:
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                self._process(chunk)
+                chunk = []
+        if chunk:
+            self._process(chunk)
+        self.summary['dry_run'] = self.dry_run
+        self.summary['seconds'] = round(time.perf_counter() - started, 3)
+        return self.summary
+
+
+def import_catalogue(stream, fmt='csv', dry_run=False, chunk_size=CHUNK_SIZE):
+    """Streams a catalogue file into ManufacturerData; returns the CatalogueImport summary."""
+    return CatalogueImport(dry_run=dry_run, chunk_size=chunk_size).run(read_rows(stream, fmt))
@@ -0,0 +1,198 @@
+import datetime
+import hashlib
+import os
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from .models import ChunkedUpload, UploadChunk, User
+from .storage import store_blobs
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_UPLOAD_SIZE = 2 * 1024 * 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+MAX_OPEN_UPLOADS = 10                   # unfinished uploads per user
+MAX_OPEN_BYTES = 4 * 1024 * 1024 * 1024 # staging space reserved per user across them
+STALE_HOURS = 48                        # unfinished uploads untouched this long are purged
+
+
+class ChunkError(Exception):
+    pass
+
+
+class _StagedFile(File):
+    """Assembled upload on local disk; FileSystemStorage moves it instead of copying."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def staging_path(upload):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{upload.id}.part")
+
+
+def purge_stale(hours=STALE_HOURS, user=None):
+    """Deletes unfinished uploads not touched for `hours`, with their staging files; returns how many."""
+    stale = ChunkedUpload.objects.filter(status="uploading",
+                                         updated_at__lt=timezone.now() - datetime.timedelta(hours=hours))
+    if user is not None:
+        stale = stale.filter(user=user)
+    count = 0
+    for upload in stale.iterator():
+        try:
+            os.remove(staging_path(upload))
+        except FileNotFoundError:
+            pass
+        count += 1
+    stale.delete()
+    return count
+
+
+def start_upload(user, file_name, total_size, chunk_size=None, content_type='', sha256=''):
+    """
+    Opens an upload and its sparse staging file. Each user may hold at most
+    MAX_OPEN_UPLOADS unfinished uploads reserving MAX_OPEN_BYTES between
+    them; their own abandoned uploads are purged first.
+    """
+    if total_size <= 0 or total_size > MAX_UPLOAD_SIZE:
+        raise ChunkError(f"totalSize must be between 1 and {MAX_UPLOAD_SIZE} bytes")
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if chunk_size <= 0 or chunk_size > MAX_CHUNK_SIZE:
+        raise ChunkError(f"chunkSize must be between 1 and {MAX_CHUNK_SIZE} bytes")
+
+    purge_stale(user=user)
+    with transaction.atomic():
+        # serializes one user's concurrent starts so the quota check holds
+        User.objects.select_for_update().filter(pk=user.pk).first()
+        open_uploads = ChunkedUpload.objects.filter(user=user, status="uploading").aggregate(
+            count=Count('id'), size=Sum('total_size'))
+        if open_uploads['count'] >= MAX_OPEN_UPLOADS:
+            raise ChunkError(f"At most {MAX_OPEN_UPLOADS} unfinished uploads; complete or abandon one first")
+        if (open_uploads['size'] or 0) + total_size > MAX_OPEN_BYTES:
+            raise ChunkError(f"Unfinished uploads may reserve at most {MAX_OPEN_BYTES} bytes in total")
+        upload = ChunkedUpload.objects.create(
+            user=user, file_name=os.path.basename(file_name)[:255], content_type=content_type or '',
+            total_size=total_size, chunk_size=chunk_size, sha256=(sha256 or '').lower(),
+        )
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    # sparse file of the final size; chunks land at their offsets in any order
+    with open(staging_path(upload), 'wb') as f:
+        f.truncate(total_size)
+    return upload
+
+
+def write_chunk(upload, index, stream, expected_sha256):
+    """
+    Streams one chunk from `stream` straight to its offset in the staging
+    file, hashing as it goes. The chunk is only recorded as received when
+    its size and SHA-256 match; a re-sent chunk simply overwrites it.
+    """
+    if upload.status != "uploading":
+        raise ChunkError("Upload already completed")
+    if index < 0 or index >= upload.chunk_count:
+        raise ChunkError(f"Chunk index must be between 0 and {upload.chunk_count - 1}")
+    if not expected_sha256:
+        raise ChunkError("Send the chunk's SHA-256 in the X-Chunk-SHA256 header")
+
+    size = upload.expected_chunk_size(index)
+    offset = index * upload.chunk_size
+    h = hashlib.sha256()
+    written = 0
+    fd = os.open(staging_path(upload), os.O_WRONLY)
+    try:
+        while written < size:
+            data = stream.read(min(COPY_BUFFER_SIZE, size - written)) if stream is not None else b''
+            if not data:
+                break
+            os.pwrite(fd, data, offset + written)
+            h.update(data)
+            written += len(data)
+        if stream is not None and written == size and stream.read(1):
+            raise ChunkError(f"Chunk {index} is larger than {size} bytes")
+    finally:
+        os.close(fd)
+
+    if written != size:
+        raise ChunkError(f"Chunk {index} must be {size} bytes, got {written}")
+    digest = h.hexdigest()
+    if digest != expected_sha256.lower():
+        raise ChunkError(f"Chunk {index} SHA-256 mismatch")
+
+    try:
+        with transaction.atomic():
+            UploadChunk.objects.update_or_create(upload=upload, index=index, defaults={'sha256': digest})
+    except IntegrityError:
+        # the same chunk was retried concurrently; either copy is identical
+        pass
+    return upload.chunks.count()
+
+
+def missing_chunks(upload):
+    received = set(upload.chunks.values_list('index', flat=True))
+    return [i for i in range(upload.chunk_count) if i not in received]
+
+
+def complete_upload(upload):
+    """
+    Verifies that every chunk arrived, hashes the assembled file in fixed
+    size blocks and moves it into content-addressed storage.
+    """
+    if upload.status == "complete":
+        return upload
+    missing = missing_chunks(upload)
+    if missing:
+        raise ChunkError(f"{len(missing)} chunks missing, first is {missing[0]}")
+
+    path = staging_path(upload)
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    if upload.sha256 and upload.sha256 != digest:
+        raise ChunkError("File SHA-256 mismatch")
+
+    with open(path, 'rb') as f:
+        staged = _StagedFile(f, name=upload.file_name)
+        staged.sha256 = digest
+        staged.size = upload.total_size  # the staged path is gone once storage moves it
+        staged.content_type = upload.content_type
+        blob = store_blobs([staged])[0]
+    if os.path.exists(path):
+        # identical bytes were already stored, so nothing was moved
+        os.remove(path)
+
+    upload.sha256 = digest
+    upload.blob = blob
+    upload.status = "complete"
+    upload.save(update_fields=['sha256', 'blob', 'status', 'updated_at'])
+    return upload
+
+
+def resolve_uploads(upload_ids, user=None):
+    """
+    Completed uploads by ID, as {str(id): upload}. With a user, only that
+    user's uploads resolve. Unknown, foreign or unfinished IDs are absent.
+    """
+    ids = [str(upload_id) for upload_id in upload_ids if upload_id]
+    if not ids:
+        return {}
+    qs = ChunkedUpload.objects.filter(status="complete").select_related('blob')
+    if user is not None:
+        qs = qs.filter(user=user)
+    valid = []
+    for upload_id in ids:
+        try:
+            valid.append(ChunkedUpload._meta.pk.to_python(upload_id))
+        except Exception:
+            continue
+    return {str(upload.id): upload for upload in qs.filter(id__in=valid)}
+
+
+def upload_file(upload):
+    """The stored file of a completed upload, carrying its digest for store_blobs."""
+    image_file = upload.blob.file
+    image_file.sha256 = upload.blob.sha256
+    return image_file
@@ -0,0 +1,291 @@
+import math
+import time
+import numpy as np
+from .geo import EARTH_RADIUS_KM
+from .reference import reference_tables
+
+DRONE_SPEED_KMH = 36.0                  # ~10 m/s cruise
+FLIGHT_BUDGET_MINUTES = 25.0            # one battery
+BATTERY_SWAP_MINUTES = 5.0
+DEFAULT_STOP_MINUTES = 5.0              # per panel when the risk type has no estimate
+DEFAULT_RESPONSE_HOURS = 72.0
+MAX_CLUSTER_STOPS = 250                 # stops routed together; bounds the (n, n) distance matrix
+MAX_TWO_OPT_PASSES = 50
+KMEANS_ITERATIONS = 25
+
+# panel damage_type -> ThermalRiskInspection.risk_type
+RISK_TYPES = {
+    "Critical overheating": "Critical Overheating",
+    "Excessive heating": "Excessive Heating",
+    "Unusual cooling": "Unusual Cooling",
+    "Sensor or panel unresponsive": "Panel/Sensor Unresponsive",
+}
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=1)
+
+
+def distance_matrix_km(lat, lon):
+    """Pairwise great-circle distances (haversine) as an (n, n) array."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _kmeans(points, k, rng):
+    """k-means labels of unit vectors with k-means++ seeding (cosine distance)."""
+    n = len(points)
+    centers = [points[rng.integers(n)]]
+    closest = np.full(n, np.inf)
+    for _ in range(1, k):
+        closest = np.minimum(closest, ((points - centers[-1]) ** 2).sum(axis=1))
+        total = closest.sum()
+        centers.append(points[rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)])
+    centers = np.array(centers)
+    labels = None
+    for _ in range(KMEANS_ITERATIONS):
+        # |p - c|^2 = 2 - 2 p.c for unit vectors
+        new = np.argmax(points @ centers.T, axis=1)
+        if labels is not None and np.array_equal(new, labels):
+            break
+        labels = new
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, points)
+        counts = np.bincount(labels, minlength=k)
+        filled = counts > 0
+        centers[filled] = sums[filled] / np.linalg.norm(sums[filled], axis=1, keepdims=True)
+    return labels
+
+
+def cluster_stops(lat, lon, max_stops=MAX_CLUSTER_STOPS, seed=0):
+    """
+    Spatial clusters of at most max_stops stops: k-means on unit vectors
+    (so it behaves across the antimeridian), with k = n / max_stops and
+    k-means++ seeding. k-means does not bound cluster sizes, so any
+    cluster still over max_stops is split again the same way; stops too
+    close together for k-means to separate are split in equal runs.
+    Returns a cluster label per stop, numbered from 0.
+    """
+    n = len(lat)
+    labels = np.zeros(n, dtype=np.int64)
+    if n <= max_stops:
+        return labels
+    points = _unit_vectors(lat, lon)
+    rng = np.random.default_rng(seed)
+    pending = [np.arange(n)]
+    label = 0
+    while pending:
+        members = pending.pop()
+        if len(members) <= max_stops:
+            labels[members] = label
+            label += 1
+            continue
+        k = max(2, math.ceil(len(members) / max_stops))
+        parts = _kmeans(points[members], k, rng)
+        groups = [members[parts == j] for j in np.unique(parts)]
+        if len(groups) == 1:
+            groups = np.array_split(members, k)
+        pending.extend(reversed(groups))
+    return labels
+
+
+def nearest_neighbour_tour(dist, start=0):
+    """Greedy open path over a distance matrix, starting at `start`."""
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    tour = np.empty(n, dtype=np.int64)
+    current = start
+    for step in range(n):
+        tour[step] = current
+        visited[current] = True
+        if step + 1 < n:
+            row = np.where(visited, np.inf, dist[current])
+            current = int(np.argmin(row))
+    return tour
+
+
+def two_opt(dist, tour, max_passes=MAX_TWO_OPT_PASSES):
+    """
+    Improves an open path with 2-opt moves (first improvement per position;
+    each position's candidate moves are scored in one vectorized step).
+    The first stop stays first.
+    """
+    n = len(tour)
+    if n < 4:
+        return tour
+    tour = tour.copy()
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 2):
+            a, b = tour[i], tour[i + 1]
+            c, d = tour[i + 2:], tour[i + 3:]
+            # reversing b..c swaps edges (a,b),(c,d) for (a,c),(b,d); the last c has no d
+            delta = dist[a, c] - dist[a, b]
+            delta[:-1] += dist[b, d] - dist[c[:-1], d]
+            j = int(np.argmin(delta))
+            if delta[j] < -1e-9:
+                tour[i + 1:i + 3 + j] = tour[i + 1:i + 3 + j][::-1]
+                improved = True
+        if not improved:
+            break
+    return tour
+
+
+def path_km(dist, tour):
+    return float(dist[tour[:-1], tour[1:]].sum()) if len(tour) > 1 else 0.0
+
+
+def split_sorties(dist, tour, stop_minutes, speed_kmh=DRONE_SPEED_KMH, budget_minutes=FLIGHT_BUDGET_MINUTES):
+    """
+    Cuts an ordered path into battery sorties. A sortie launches at its
+    first stop, flies the stops in order and returns to the launch point;
+    a stop joins the current sortie while travel plus inspection time,
+    including the flight back, stays within the budget. A single stop
+    over budget gets a sortie of its own. Returns lists of tour positions.
+    """
+    per_km = 60.0 / speed_kmh
+    sorties = []
+    current = [0]
+    flown = stop_minutes[tour[0]]
+    for k in range(1, len(tour)):
+        prev, stop, launch = tour[k - 1], tour[k], tour[current[0]]
+        added = dist[prev, stop] * per_km + stop_minutes[stop]
+        if flown + added + dist[stop, launch] * per_km <= budget_minutes:
+            current.append(k)
+            flown += added
+        else:
+            sorties.append(current)
+            current = [k]
+            flown = stop_minutes[stop]
+    sorties.append(current)
+    return sorties
+
+
+def plan_routes(lat, lon, stop_minutes, deadline_hours, speed_kmh=DRONE_SPEED_KMH,
+                budget_minutes=FLIGHT_BUDGET_MINUTES, max_stops=MAX_CLUSTER_STOPS):
+    """
+    Drone inspection plan over stops (parallel arrays): spatial clusters
+    (one crew each), and within a cluster the stops of each response-time
+    tier routed in urgency order with nearest neighbour + 2-opt, then cut
+    into battery sorties. Each stop gets an ETA in minutes from the crew's
+    start (battery swaps included) and `late` when that misses its
+    deadline. Returns a list of cluster dicts holding index arrays.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    stop_minutes = np.asarray(stop_minutes, dtype=np.float64)
+    deadline_hours = np.asarray(deadline_hours, dtype=np.float64)
+    labels = cluster_stops(lat, lon, max_stops)
+    per_km = 60.0 / speed_kmh
+
+    clusters = []
+    for label in range(labels.max() + 1 if len(labels) else 0):
+        members = np.flatnonzero(labels == label)
+        dist = distance_matrix_km(lat[members], lon[members])
+        minutes = stop_minutes[members]
+        order = []
+        for tier in np.unique(deadline_hours[members]):
+            local = np.flatnonzero(deadline_hours[members] == tier)
+            sub = dist[np.ix_(local, local)]
+            if order:
+                # enter the tier at the stop nearest to where the previous one ended
+                start = int(np.argmin(dist[order[-1], local]))
+            else:
+                start = 0
+            tour = two_opt(sub, nearest_neighbour_tour(sub, start))
+            order.extend(local[tour].tolist())
+        order = np.array(order, dtype=np.int64)
+
+        sorties = []
+        clock = 0.0
+        for positions in split_sorties(dist, order, minutes, speed_kmh, budget_minutes):
+            stops = order[positions]
+            eta = np.empty(len(stops))
+            t = clock
+            for k, stop in enumerate(stops):
+                if k:
+                    t += dist[stops[k - 1], stop] * per_km
+                t += minutes[stop]
+                eta[k] = t
+            flight = t - clock + dist[stops[-1], stops[0]] * per_km
+            sorties.append({
+                'stops': members[stops],
+                'eta_minutes': eta,
+                'late': eta > deadline_hours[members[stops]] * 60.0,
+                'flight_minutes': flight,
+                'distance_km': path_km(dist, stops) + dist[stops[-1], stops[0]],
+            })
+            clock += flight + BATTERY_SWAP_MINUTES
+        clusters.append({'members': members, 'sorties': sorties, 'total_minutes': clock - BATTERY_SWAP_MINUTES})
+    return clusters
+
+
+def risk_profiles():
+    """
+    {panel damage_type: (minutes per stop, response deadline hours)} from
+    the cached ThermalRiskInspection table; the last row of a risk type wins.
+    """
+    risks = reference_tables.get().risks
+    profiles = {}
+    for damage_type, risk_type in RISK_TYPES.items():
+        risk = risks.get(risk_type)
+        if risk is not None:
+            profiles[damage_type] = (
+                DEFAULT_STOP_MINUTES if risk.drone_minutes is None else risk.drone_minutes,
+                DEFAULT_RESPONSE_HOURS if risk.response_hours is None else risk.response_hours,
+            )
+    return profiles
+
+
+def plan_inspections(queryset, speed_kmh=DRONE_SPEED_KMH, budget_minutes=FLIGHT_BUDGET_MINUTES,
+                     max_stops=MAX_CLUSTER_STOPS):
+    """
+    Routes for every panel in `queryset` with schedule_drone_inspection set
+    and coordinates. Stop time and deadline come from the panel's risk type
+    (defaults for typhoon-only flags and unmapped types). Clusters are
+    returned most urgent first, as JSON-ready dicts.
+    """
+    started = time.perf_counter()
+    rows = list(queryset.filter(schedule_drone_inspection=True, latitude__isnull=False, longitude__isnull=False)
+                .values_list('id', 'latitude', 'longitude', 'damage_type'))
+    profiles = risk_profiles()
+    default = (DEFAULT_STOP_MINUTES, DEFAULT_RESPONSE_HOURS)
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    lat = np.array([row[1] for row in rows], dtype=np.float64)
+    lon = np.array([row[2] for row in rows], dtype=np.float64)
+    minutes, deadline = np.array([profiles.get(row[3], default) for row in rows], dtype=np.float64).reshape(-1, 2).T
+    clusters = plan_routes(lat, lon, minutes, deadline, speed_kmh, budget_minutes, max_stops) if rows else []
+
+    routes = []
+    for cluster in clusters:
+        sorties = []
+        for sortie in cluster['sorties']:
+            stops = sortie['stops']
+            sorties.append({
+                'flight_minutes': round(sortie['flight_minutes'], 1),
+                'distance_km': round(sortie['distance_km'], 3),
+                'stops': [
+                    {'id': int(ids[s]), 'latitude': float(lat[s]), 'longitude': float(lon[s]),
+                     'eta_minutes': round(float(eta), 1), 'deadline_hours': float(deadline[s]), 'late': bool(late)}
+                    for s, eta, late in zip(stops, sortie['eta_minutes'], sortie['late'])
+                ],
+            })
+        routes.append({
+            'deadline_hours': float(deadline[cluster['members']].min()),
+            'stops': int(len(cluster['members'])),
+            'sorties': sorties,
+            'total_minutes': round(cluster['total_minutes'], 1),
+            'late': int(sum(s['late'].sum() for s in cluster['sorties'])),
+        })
+    routes.sort(key=lambda route: (route['deadline_hours'], -route['stops']))
+    return {
+        'stops': len(rows),
+        'clusters': len(routes),
+        'sorties': sum(len(route['sorties']) for route in routes),
+        'late': sum(route['late'] for route in routes),
+        'seconds': round(time.perf_counter() - started, 3),
+        'routes': routes,
+    }
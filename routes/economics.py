@@ -0,0 +1,80 @@
+import functools
+import numpy as np
+
+SCENARIOS = 10000                       # Monte Carlo scenarios per predict_damage panel
+BATCH_SCENARIOS = 1000                  # per panel of a predict/batch/ request
+MAX_YEARS = 50                          # longest simulated lifetime
+SEED = 20240601                         # fixed, so a panel always gets the same distribution
+DISCOUNT_RATE = 0.06                    # real, per year
+PRICE_ESCALATION = 0.02                 # mean yearly electricity price drift (log)
+PRICE_VOLATILITY = 0.05                 # sd of the yearly price step (log)
+IRRADIATION_VARIABILITY = 0.05          # year-to-year sd of irradiation, relative
+DEGRADATION_SPREAD = 0.25               # sd of the degradation rate, relative to the panel's
+LOSS_SPREAD = 0.03                      # sd of the loss factor, absolute
+PERCENTILES = (10, 50, 90)
+
+
+@functools.lru_cache(maxsize=4)
+def _shocks(scenarios):
+    """
+    Parameter-free random paths shared by every panel (common random
+    numbers): electricity price index and irradiation multiplier per
+    (scenario, year), plus per-scenario degradation and loss shocks.
+    Drawn once per process, so a simulation is only arithmetic.
+    """
+    rng = np.random.default_rng(SEED)
+    steps = PRICE_ESCALATION + PRICE_VOLATILITY * rng.standard_normal((scenarios, MAX_YEARS - 1))
+    price_index = np.exp(np.concatenate([np.zeros((scenarios, 1)), np.cumsum(steps, axis=1)], axis=1))
+    irradiation = np.clip(1.0 + IRRADIATION_VARIABILITY * rng.standard_normal((scenarios, MAX_YEARS)), 0.5, 1.5)
+    return price_index, irradiation, rng.standard_normal(scenarios), rng.standard_normal(scenarios)
+
+
+def has_inputs(p):
+    """Whether a parse_panel_params() dict carries what theoretical_s_values needs."""
+    return (p['installed_capacity_kwp'] > 0 and p['annual_irradiation'] > 0 and p['lifetime_years'] > 0
+            and p['system_cost'] > 0 and p['loss_factor'] < 1)
+
+
+def simulate(p, scenarios=SCENARIOS):
+    """
+    Lifetime cash flows of one panel/system (a parse_panel_params() dict)
+    under `scenarios` draws of degradation, electricity price, irradiation
+    and loss factor. Returns per-scenario arrays: 'lcoe' (discounted cost
+    per kWh including yearly maintenance), 'npv' (discounted savings at
+    the simulated prices minus cost) and 'S', the theoretical_s_values
+    indicator on lifetime averages. S equals S_theoretical only when the
+    spreads, PRICE_ESCALATION, DISCOUNT_RATE, the panel's degradation and
+    its maintenance cost are all zero: theoretical_s_values models no
+    price drift and no yearly energy loss.
+    """
+    price_index, irradiation, degradation_z, loss_z = _shocks(scenarios)
+    years = min(int(p['lifetime_years']), MAX_YEARS)
+    age = np.arange(years)
+    degradation = np.clip(p['current_degradation'] * (1.0 + DEGRADATION_SPREAD * degradation_z), 0.0, 0.5)
+    loss = np.clip(p['loss_factor'] + LOSS_SPREAD * loss_z, 0.0, 0.95)
+    energy = (p['installed_capacity_kwp'] * p['annual_irradiation'] * (1.0 - loss)[:, None]
+              * irradiation[:, :years] * np.exp(np.log1p(-degradation)[:, None] * age))
+    discount = (1.0 + DISCOUNT_RATE) ** -(age + 1.0)
+    pv_energy = energy @ discount
+    pv_savings = p['electricity_rate'] * ((energy * price_index[:, :years]) @ discount)
+    cost = p['system_cost'] + p['maintenance_cost'] * discount.sum()
+    lcoe = cost / pv_energy
+    S = (pv_savings / pv_energy - lcoe) * energy.mean(axis=1) / max(p['savings_per_year'], 1e-6)
+    return {'lcoe': lcoe, 'npv': pv_savings - cost, 'S': S}
+
+
+def lifetime_economics(p, scenarios=SCENARIOS):
+    """
+    P10/P50/P90 of S, LCOE and NPV for a parse_panel_params() dict, plus
+    the share of scenarios with S >= 1, for the predict_damage payload.
+    None when the economic inputs are incomplete.
+    """
+    if not has_inputs(p):
+        return None
+    result = simulate(p, scenarios)
+    quantiles = np.percentile(np.stack([result['S'], result['lcoe'], result['npv']]), PERCENTILES, axis=1)
+    summary = {'scenarios': scenarios, 'years': min(int(p['lifetime_years']), MAX_YEARS)}
+    for j, (name, digits) in enumerate((('S', 4), ('lcoe', 4), ('npv', 2))):
+        summary[name] = {f'p{q}': round(float(quantiles[k, j]), digits) for k, q in enumerate(PERCENTILES)}
+    summary['probability_S_at_least_1'] = round(float(np.mean(result['S'] >= 1.0)), 4)
+    return summary
@@ -0,0 +1,142 @@
+import csv
+import datetime
+import decimal
+import io
+import json
+import uuid
+import zlib
+from django.core.exceptions import PermissionDenied
+from django.db import models
+from .models import Donation, ManufacturerData, Registrations, SolarPanels
+
+CHUNK_SIZE = 2000                       # rows per keyset batch query and per streamed piece
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# export name -> (model, staff only)
+EXPORTS = {
+    'panels': (SolarPanels, False),
+    'donations': (Donation, True),
+    'registrations': (Registrations, True),
+    'manufacturers': (ManufacturerData, False),
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _json_text(value):
+    return None if value is None else json.dumps(value, separators=(',', ':'))
+
+
+def _converter(field, for_csv):
+    """Function turning a values_list() value into a JSON/CSV-ready one, or None when it already is."""
+    if isinstance(field, (models.DateTimeField, models.DateField, models.TimeField)):
+        return lambda value: None if value is None else value.isoformat()
+    if isinstance(field, (models.DecimalField, models.UUIDField)):
+        return lambda value: None if value is None else str(value)
+    if isinstance(field, models.BinaryField):
+        return lambda value: None if value is None else bytes(value).hex()
+    if isinstance(field, models.JSONField) and for_csv:
+        return _json_text
+    return None
+
+
+def export_columns(model):
+    """(column names, concrete fields) exported for a model: every concrete column, FKs as <name>_id."""
+    fields = [field for field in model._meta.concrete_fields]
+    return [field.attname for field in fields], fields
+
+
+def _default(value):
+    # safety net for values a converter did not anticipate
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def iter_rows(queryset, names, chunk_size=CHUNK_SIZE):
+    """
+    values_list() tuples in id order, read as keyset batches of chunk_size
+    rows (pk > last id seen). Each batch is its own short query, so no
+    cursor has to outlive a transaction behind the pgbouncer pooler, and
+    memory stays flat however large the table is.
+    """
+    pk = names.index(queryset.model._meta.pk.attname)
+    batch = queryset
+    while True:
+        rows = list(batch.order_by('pk').values_list(*names)[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        batch = queryset.filter(pk__gt=rows[-1][pk])
+
+
+def encode(rows, names, fields, fmt, chunk_size=CHUNK_SIZE):
+    """
+    Yields the export as text pieces of about chunk_size rows each:
+    one JSON object per line, or CSV with a header row.
+    """
+    converters = [(i, convert) for i, convert in enumerate(_converter(field, fmt == 'csv') for field in fields)
+                  if convert is not None]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(names)
+    dumps = json.JSONEncoder(separators=(',', ':'), default=_default).encode
+    pending = 0
+    for row in rows:
+        values = list(row)
+        for i, convert in converters:
+            values[i] = convert(values[i])
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(dumps(dict(zip(names, values))))
+            buffer.write('\n')
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzipped(pieces):
+    """gzip-compresses a stream of text pieces on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for piece in pieces:
+        data = compressor.compress(piece.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(name, user, fmt='ndjson', compress=False, after=None, chunk_size=CHUNK_SIZE):
+    """
+    (byte/text iterator, content type, file name) for one export. Non-staff
+    users only get exports that are not staff-only, and only their own
+    panels. `after` resumes behind the last id of an interrupted export.
+    """
+    if name not in EXPORTS:
+        raise ExportError(f"Unknown export '{name}'; choose from {', '.join(EXPORTS)}")
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format '{fmt}'; choose from {', '.join(FORMATS)}")
+    model, staff_only = EXPORTS[name]
+    if staff_only and not user.is_staff:
+        raise PermissionDenied(f"The {name} export is staff only")
+    queryset = model.objects.all()
+    if model is SolarPanels and not user.is_staff:
+        queryset = queryset.filter(user=user)
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    names, fields = export_columns(model)
+    pieces = encode(iter_rows(queryset, names, chunk_size), names, fields, fmt, chunk_size)
+    filename = f"{name}.{fmt}"
+    if compress:
+        return gzipped(pieces), 'application/gzip', f"{filename}.gz"
+    return pieces, FORMATS[fmt], filename
@@ -0,0 +1,165 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from PIL import Image, UnidentifiedImageError
+from scipy import ndimage as ndi
+from .ml_registry import registry
+
+FEATURE_SIZE = 128                      # images are scored at 128x128, like the training pipeline
+FEATURE_DIM = 12                        # columns of batch_features; the classifier's n_features_in_ must match
+DARK_LUMINANCE = 0.1
+BRIGHT_LUMINANCE = 0.9
+
+_SOBEL_SMOOTH = np.array([1.0, 2.0, 1.0]) / 4.0
+_SOBEL_EDGE = np.array([1.0, 0.0, -1.0])
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _decode_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'FEATURE_DECODE_WORKERS', 4),
+                    thread_name_prefix='feature-decode',
+                )
+    return _executor
+
+
+def decode_reduced(image_file, size=FEATURE_SIZE):
+    """
+    Decodes an image straight to a (size, size, 3) uint8 array. JPEGs use
+    draft mode, so libjpeg decodes at 1/2, 1/4 or 1/8 scale instead of the
+    full drone resolution; Pillow's resize then antialiases the remainder.
+    """
+    if hasattr(image_file, 'seek'):
+        image_file.seek(0)
+    with Image.open(image_file) as img:
+        img.draft('RGB', (size, size))
+        img = img.convert('RGB').resize((size, size), Image.Resampling.BILINEAR)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def _sobel_magnitude(grey):
+    """skimage.filters.sobel applied to each (H, W) image of an (N, H, W) stack."""
+    gy = ndi.correlate1d(ndi.correlate1d(grey, _SOBEL_EDGE, axis=1, mode='reflect'),
+                         _SOBEL_SMOOTH, axis=2, mode='reflect')
+    gx = ndi.correlate1d(ndi.correlate1d(grey, _SOBEL_EDGE, axis=2, mode='reflect'),
+                         _SOBEL_SMOOTH, axis=1, mode='reflect')
+    return np.sqrt((gx * gx + gy * gy) / 2.0)
+
+
+def batch_features(stack):
+    """
+    FEATURE_DIM feature rows for an (N, H, W, 3) stack of uint8 images, in
+    one NumPy pass. Columns: per-channel mean (3), per-channel std (3),
+    overall mean and std, dark and bright pixel fractions, then edge mean
+    and density - the old extract_image_features_from_array output (10)
+    with the edge pair predict_damage appended.
+    """
+    imgs = np.asarray(stack, dtype=np.float32) / 255.0
+    n = imgs.shape[0]
+    flat = imgs.reshape(n, -1, 3)
+    means = flat.mean(axis=1)
+    stds = flat.std(axis=1)
+    overall_mean = flat.mean(axis=(1, 2))
+    overall_std = flat.std(axis=(1, 2))
+
+    lum = imgs.mean(axis=3)
+    pixels = lum.shape[1] * lum.shape[2]
+    dark_frac = (lum < DARK_LUMINANCE).sum(axis=(1, 2)) / pixels
+    bright_frac = (lum > BRIGHT_LUMINANCE).sum(axis=(1, 2)) / pixels
+
+    edges = _sobel_magnitude(lum)
+    edge_mean = edges.mean(axis=(1, 2))
+    edge_density = (edges > edge_mean[:, None, None]).sum(axis=(1, 2)) / pixels
+
+    return np.concatenate([
+        means, stds,
+        np.stack([overall_mean, overall_std, dark_frac, bright_frac, edge_mean, edge_density], axis=1),
+    ], axis=1).astype(np.float64)
+
+
+def _decode_or_none(image_file):
+    # bad uploads score as "no prediction"; anything else is a bug and propagates
+    try:
+        return decode_reduced(image_file)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+        logger.warning("Could not decode image %s: %s", getattr(image_file, 'name', image_file), e)
+        return None
+
+
+def extract_features(image_files):
+    """
+    Feature matrix (N, FEATURE_DIM) for uploaded images plus a per-image ok mask.
+    Decoding runs on the shared, bounded thread pool (Pillow releases the
+    GIL while decoding); images that fail to decode get an all-zero row.
+    """
+    decoded = list(_decode_executor().map(_decode_or_none, image_files))
+    ok = np.array([img is not None for img in decoded], dtype=bool)
+    features = np.zeros((len(decoded), FEATURE_DIM), dtype=np.float64)
+    if ok.any():
+        features[ok] = batch_features(np.stack([img for img in decoded if img is not None]))
+    return features, ok
+
+
+def check_classifier(model):
+    """
+    Raises ImproperlyConfigured when a classifier was fit on another feature
+    layout; it would otherwise fail every prediction as "Prediction failed".
+    """
+    expected = getattr(model, 'n_features_in_', FEATURE_DIM)
+    if expected != FEATURE_DIM:
+        raise ImproperlyConfigured(
+            f"damage_classifier expects {expected} features but batch_features produces {FEATURE_DIM}")
+
+
+def classify_features(image_feat):
+    """
+    Runs the registered damage classifier over a feature matrix. Returns
+    (labels, damage_probs, normal_labels); labels are "Unknown" and
+    probabilities NaN when no model is deployed.
+    """
+    n = len(image_feat)
+    labels = ["Unknown"] * n
+    damage_probs = np.full(n, np.nan)
+    model = registry.get('damage_classifier')
+    if model is None or n == 0:
+        return labels, damage_probs, np.zeros(n, dtype=bool)
+    check_classifier(model)
+
+    label_encoder = registry.get('label_encoder')
+    try:
+        preds = model.predict(image_feat)
+        if label_encoder is not None and hasattr(label_encoder, 'inverse_transform'):
+            try:
+                labels = [str(v) for v in label_encoder.inverse_transform(preds)]
+            except Exception:
+                labels = [str(v) for v in preds]
+        else:
+            labels = [str(v) for v in preds]
+        if hasattr(model, 'predict_proba'):
+            try:
+                probs = model.predict_proba(image_feat)
+                if hasattr(model, 'classes_'):
+                    classes = list(model.classes_)
+                    idx = np.array([classes.index(pred) for pred in preds])
+                    damage_probs = probs[np.arange(n), idx].astype(np.float64)
+                else:
+                    damage_probs = probs.max(axis=1).astype(np.float64)
+            except Exception:
+                damage_probs = np.full(n, np.nan)
+    except Exception:
+        labels = ["Prediction failed"] * n
+        damage_probs = np.full(n, np.nan)
+
+    normal_labels = np.array([label.lower() in ('normal', 'no_damage', 'ok') for label in labels], dtype=bool)
+    return labels, damage_probs, normal_labels
@@ -0,0 +1,206 @@
+import math
+import numpy as np
+from django.db.models import Q
+
+CELL_BITS = 26                          # per axis: ~0.3 m of latitude, ~0.6 m of longitude at the equator
+MAX_COVER_CELLS = 16                    # cells a query region is split into; each is one index range
+EARTH_RADIUS_KM = 6371.0088
+NEAREST_START_KM = 2.0
+NEAREST_MAX_KM = 500.0                  # widest radius or nearest-panel search; bounds the rows one query reads
+
+_CELLS = 1 << CELL_BITS
+_MASKS = (
+    (16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+    (2, 0x3333333333333333), (1, 0x5555555555555555),
+)
+
+
+def _spread(v):
+    """Moves bit k of each value to bit 2k (uint64 arrays)."""
+    for shift, mask in _MASKS:
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def _compact(v):
+    """Inverse of _spread: bit 2k of each value back to bit k."""
+    masks = [mask for _, mask in reversed(_MASKS)] + [0x00000000FFFFFFFF]
+    v = v & np.uint64(masks[0])
+    for (shift, _), mask in zip(reversed(_MASKS), masks[1:]):
+        v = (v | (v >> np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def _interleave(i, j):
+    return (_spread(np.asarray(i, dtype=np.uint64)) << np.uint64(1)) | _spread(np.asarray(j, dtype=np.uint64))
+
+
+def _quantize(lat, lon):
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -90.0, 90.0)
+    lon = (np.asarray(lon, dtype=np.float64) + 180.0) % 360.0 - 180.0
+    i = np.clip(np.floor((lat + 90.0) / 180.0 * _CELLS), 0, _CELLS - 1).astype(np.int64)
+    j = np.clip(np.floor((lon + 180.0) / 360.0 * _CELLS), 0, _CELLS - 1).astype(np.int64)
+    return i, j
+
+
+def cell_ids(lat, lon):
+    """
+    Z-order (Morton) cell ids of coordinate arrays: latitude and longitude
+    quantized to CELL_BITS each and bit-interleaved, so every coarser cell
+    is one contiguous id range (the same trick as geohash or S2 cell ids,
+    as a B-tree-friendly integer). -1 where a coordinate is missing.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    missing = np.isnan(lat) | np.isnan(lon)
+    i, j = _quantize(np.where(missing, 0.0, lat), np.where(missing, 0.0, lon))
+    return np.where(missing, -1, _interleave(i, j).astype(np.int64))
+
+
+def parent_cells(cells, level):
+    """Ids of the enclosing cells at `level` (1..CELL_BITS bits per axis)."""
+    return np.asarray(cells, dtype=np.int64) >> (2 * (CELL_BITS - level))
+
+
+def cell_indices(cells):
+    """(row, column) of cell ids at any level: row counts north from -90, column east from -180."""
+    v = np.asarray(cells, dtype=np.int64).astype(np.uint64)
+    return _compact(v >> np.uint64(1)).astype(np.int64), _compact(v).astype(np.int64)
+
+
+def cell_from_indices(rows, columns):
+    """Cell ids from (row, column) at one level; the inverse of cell_indices."""
+    return _interleave(rows, columns).astype(np.int64)
+
+
+def geo_cell(latitude, longitude):
+    """Cell id of one point, or None when a coordinate is missing."""
+    if latitude is None or longitude is None:
+        return None
+    cell = int(cell_ids([latitude], [longitude])[0])
+    return None if cell < 0 else cell
+
+
+def _split_dateline(south, west, north, east):
+    if west <= east:
+        return [(south, west, north, east)]
+    return [(south, west, north, 180.0), (south, -180.0, north, east)]
+
+
+def _cover_box(south, west, north, east):
+    (i0, i1), (j0, j1) = _quantize([south, north], [west, min(east, 180.0 - 1e-9)])
+    # deepest level at which the box spans at most MAX_COVER_CELLS cells
+    level = CELL_BITS
+    while level > 0:
+        shift = CELL_BITS - level
+        if ((i1 >> shift) - (i0 >> shift) + 1) * ((j1 >> shift) - (j0 >> shift) + 1) <= MAX_COVER_CELLS:
+            break
+        level -= 1
+    shift = CELL_BITS - level
+    ii, jj = np.meshgrid(np.arange(i0 >> shift, (i1 >> shift) + 1), np.arange(j0 >> shift, (j1 >> shift) + 1))
+    prefixes = np.sort(_interleave(ii.ravel(), jj.ravel()).astype(np.int64))
+    return [(int(p) << (2 * shift), (int(p) + 1) << (2 * shift)) for p in prefixes]
+
+
+def _merge(ranges):
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return [tuple(r) for r in merged]
+
+
+def covering_ranges(south, west, north, east):
+    """
+    Sorted, merged half-open [lo, hi) cell id ranges covering a lat/lon box
+    (west > east crosses the antimeridian). Each range is one B-tree scan.
+    """
+    return _merge(r for box in _split_dateline(south, west, north, east) for r in _cover_box(*box))
+
+
+def cell_filter(boxes, field='geo_cell'):
+    """
+    Q selecting rows in the cells covering any of the (south, west, north,
+    east) boxes. A superset of the boxes: callers refine with an exact test.
+    """
+    cells = Q()
+    for lo, hi in _merge(r for box in boxes for r in covering_ranges(*box)):
+        cells |= Q(**{f'{field}__gte': lo, f'{field}__lt': hi})
+    return cells
+
+
+def bbox_filter(south, west, north, east, field='geo_cell'):
+    """
+    Q selecting rows inside a lat/lon box: the cell ranges prune through the
+    index, the plain coordinate bounds make the result exact.
+    """
+    if west <= east:
+        lon = Q(longitude__gte=west, longitude__lte=east)
+    else:
+        lon = Q(longitude__gte=west) | Q(longitude__lte=east)
+    return cell_filter([(south, west, north, east)], field) & Q(latitude__gte=south, latitude__lte=north) & lon
+
+
+def radius_box(lat, lon, radius_km):
+    """(south, west, north, east) enclosing a circle; full longitude range when it reaches a pole."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = lat - dlat, lat + dlat
+    if south <= -90.0 or north >= 90.0:
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+    # widest longitude span of the circle, reached at its poleward latitude
+    dlon = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    if dlon >= 180.0:
+        return south, -180.0, north, 180.0
+    west = (lon - dlon + 180.0) % 360.0 - 180.0
+    east = (lon + dlon + 180.0) % 360.0 - 180.0
+    return south, west, north, east
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance from one point to arrays of points."""
+    lat1, lat2 = math.radians(lat), np.radians(lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(lons) - math.radians(lon)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _candidates(queryset, box):
+    rows = np.array(list(queryset.filter(bbox_filter(*box)).values_list('id', 'latitude', 'longitude')),
+                    dtype=np.float64).reshape(-1, 3)
+    return rows[:, 0].astype(np.int64), rows[:, 1], rows[:, 2]
+
+
+def within_radius(queryset, lat, lon, radius_km, limit):
+    """
+    (ids, distances km) of the nearest `limit` rows within `radius_km`,
+    nearest first, plus the total number inside the circle. Raises
+    ValueError beyond NEAREST_MAX_KM, where the box would scan a continent.
+    """
+    if radius_km > NEAREST_MAX_KM:
+        raise ValueError(f"radius_km must be at most {NEAREST_MAX_KM:g}")
+    ids, lats, lons = _candidates(queryset, radius_box(lat, lon, radius_km))
+    distance = haversine_km(lat, lon, lats, lons)
+    inside = np.flatnonzero(distance <= radius_km)
+    total = len(inside)
+    if total > limit:
+        inside = inside[np.argpartition(distance[inside], limit)[:limit]]
+    inside = inside[np.argsort(distance[inside], kind='stable')]
+    return ids[inside], distance[inside], total
+
+
+def nearest(queryset, lat, lon, k, max_radius_km=NEAREST_MAX_KM):
+    """
+    (ids, distances km) of up to k nearest rows within `max_radius_km`.
+    The search radius starts small and quadruples until it holds k rows,
+    so dense areas stay cheap; a point far from every row stops at the cap
+    with fewer than k rather than scanning the whole scope.
+    """
+    radius = min(NEAREST_START_KM, max_radius_km)
+    while True:
+        ids, distance, total = within_radius(queryset, lat, lon, radius, k)
+        if total >= k or radius >= max_radius_km:
+            return ids, distance
+        radius = min(radius * 4, max_radius_km)
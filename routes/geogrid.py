@@ -0,0 +1,164 @@
+import numpy as np
+from django.db import transaction
+from .bulk import increment_counts
+from .assessment import DECISIONS
+from .geo import cell_from_indices, cell_indices, parent_cells
+from .models import PanelGridCount, SolarPanels
+from .signals import PANEL_GRID, bump_after_commit
+
+TILE_DETAIL = 5                         # a tile is a 2^5 x 2^5 grid of aggregate cells
+MAX_LEVEL = 17                          # finest aggregate: ~150 m of latitude per cell
+LEVELS = tuple(range(TILE_DETAIL, MAX_LEVEL + 1))
+MAX_ZOOM = MAX_LEVEL - TILE_DETAIL
+REBUILD_BATCH_SIZE = 50000              # panels read per query while rebuilding
+TILE_SIZE = 1 << TILE_DETAIL
+
+# (level, decision, cell) packed into one int64 so numpy can group on it
+_CELL_BITS = 2 * MAX_LEVEL
+_DECISION_BITS = 4
+_DECISION_CODES = {name: code for code, name in enumerate(DECISIONS)}
+
+# binary tile record: bin = row * TILE_SIZE + col, then panels per decision
+TILE_RECORD = np.dtype([('bin', '<u2'), ('counts', '<u4', (len(DECISIONS),))])
+
+
+def decision_codes(decisions):
+    """DECISIONS index per stored decision; unknown or missing ones count as Undetermined."""
+    return np.array([_DECISION_CODES.get(decision, 0) for decision in decisions], dtype=np.int64)
+
+
+def _keys(cells, codes):
+    keys = [(level << (_DECISION_BITS + _CELL_BITS)) | (codes << _CELL_BITS) | parent_cells(cells, level)
+            for level in LEVELS]
+    return np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+
+
+def _unpack(keys):
+    return (keys >> (_DECISION_BITS + _CELL_BITS), (keys >> _CELL_BITS) & ((1 << _DECISION_BITS) - 1),
+            keys & ((1 << _CELL_BITS) - 1))
+
+
+def grid_counts(cells, decisions, weight=1):
+    """
+    (packed keys, counts) of panels per (level, cell, decision) across every
+    aggregate level for parallel geo_cell / decision sequences. Panels
+    without a cell are skipped.
+    """
+    cells = np.array([-1 if cell is None else cell for cell in cells], dtype=np.int64)
+    codes = decision_codes(decisions)
+    located = cells >= 0
+    keys, counts = np.unique(_keys(cells[located], codes[located]), return_counts=True)
+    return keys, counts.astype(np.int64) * weight
+
+
+def _merge_counts(parts):
+    keys = np.concatenate([k for k, _ in parts]) if parts else np.empty(0, dtype=np.int64)
+    counts = np.concatenate([c for _, c in parts]) if parts else np.empty(0, dtype=np.int64)
+    keys, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse.ravel(), weights=counts, minlength=len(keys)).astype(np.int64)
+    nonzero = totals != 0
+    return keys[nonzero], totals[nonzero]
+
+
+def _rows(keys, counts):
+    levels, codes, cells = _unpack(keys)
+    return list(zip(levels.tolist(), cells.tolist(), codes.tolist(), counts.tolist()))
+
+
+def move_panels(removed=(), added=()):
+    """
+    Applies panel changes to the aggregates: `removed` and `added` are
+    (geo_cell, decision) pairs as stored before and after (None entries
+    are skipped), so an edit is one of each and cancels out where nothing
+    moved. Every affected row is written with one upsert per batch.
+    """
+    removed = [pair for pair in removed if pair is not None]
+    added = [pair for pair in added if pair is not None]
+    parts = []
+    if removed:
+        parts.append(grid_counts([cell for cell, _ in removed], [decision for _, decision in removed], -1))
+    if added:
+        parts.append(grid_counts([cell for cell, _ in added], [decision for _, decision in added]))
+    keys, counts = _merge_counts(parts)
+    if len(keys):
+        increment_counts(PanelGridCount, ['level', 'cell', 'decision'], 'panels', _rows(keys, counts))
+        bump_after_commit(PANEL_GRID)
+
+
+def rebuild(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recounts every aggregate from SolarPanels in one transaction, reading
+    panels in id batches. Changes committed while it runs may be missed;
+    run it when panel writes are quiet. Returns the number of rows written.
+    """
+    parts = []
+    last_id = 0
+    while True:
+        rows = list(
+            SolarPanels.objects.filter(id__gt=last_id, geo_cell__isnull=False).order_by('id')
+            .values_list('id', 'geo_cell', 'decision')[:batch_size]
+        )
+        if not rows:
+            break
+        parts.append(grid_counts([row[1] for row in rows], [row[2] for row in rows]))
+        # fold as we go, so memory tracks the number of cells rather than panels
+        if len(parts) > 8:
+            parts = [_merge_counts(parts)]
+        last_id = rows[-1][0]
+    keys, counts = _merge_counts(parts)
+    with transaction.atomic():
+        PanelGridCount.objects.all().delete()
+        # the table is empty, so the upsert is a plain multi-row insert
+        increment_counts(PanelGridCount, ['level', 'cell', 'decision'], 'panels', _rows(keys, counts))
+        bump_after_commit(PANEL_GRID)
+    return len(keys)
+
+
+def tile_bounds(z, x, y):
+    """(south, west, north, east) of tile x, y at zoom z: 2^z x 2^z lat/lon tiles, x east from -180, y south from 90."""
+    lat_step, lon_step = 180.0 / (1 << z), 360.0 / (1 << z)
+    return 90.0 - (y + 1) * lat_step, -180.0 + x * lon_step, 90.0 - y * lat_step, -180.0 + (x + 1) * lon_step
+
+
+def tile_counts(z, x, y):
+    """
+    Panels per decision for the TILE_SIZE x TILE_SIZE cells of one tile,
+    read from the level z + TILE_DETAIL aggregates with one index range
+    scan. Returns (bins, counts): bin = row * TILE_SIZE + col with row 0
+    at the north edge, and counts shaped (bins, len(DECISIONS)).
+    """
+    level = z + TILE_DETAIL
+    prefix = int(cell_from_indices([(1 << z) - 1 - y], [x])[0])
+    shift = 2 * TILE_DETAIL
+    rows = np.array(list(
+        PanelGridCount.objects.filter(level=level, cell__gte=prefix << shift, cell__lt=(prefix + 1) << shift,
+                                      panels__gt=0)
+        .values_list('cell', 'decision', 'panels')
+    ), dtype=np.int64).reshape(-1, 3)
+    rows_i, cols_j = cell_indices(rows[:, 0] - (prefix << shift))
+    bins = (TILE_SIZE - 1 - rows_i) * TILE_SIZE + cols_j
+    bins, inverse = np.unique(bins, return_inverse=True)
+    counts = np.zeros((len(bins), len(DECISIONS)), dtype=np.int64)
+    np.add.at(counts, (inverse.ravel(), rows[:, 1]), rows[:, 2])
+    return bins, counts
+
+
+def tile_json(z, x, y):
+    bins, counts = tile_counts(z, x, y)
+    return {
+        'z': z, 'x': x, 'y': y,
+        'bounds': tile_bounds(z, x, y),
+        'size': TILE_SIZE,
+        'decisions': DECISIONS,
+        # [row, col, panels, panels per decision...]
+        'cells': [[int(b) // TILE_SIZE, int(b) % TILE_SIZE, int(c.sum()), *c.tolist()] for b, c in zip(bins, counts)],
+    }
+
+
+def tile_binary(z, x, y):
+    """Packed TILE_RECORD array: 2 + 4 * len(DECISIONS) bytes per non-empty cell."""
+    bins, counts = tile_counts(z, x, y)
+    records = np.empty(len(bins), dtype=TILE_RECORD)
+    records['bin'] = bins
+    records['counts'] = counts
+    return records.tobytes()
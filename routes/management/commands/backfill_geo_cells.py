@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from routes.bulk import update_from_values
+from routes.geo import cell_ids
+from routes.geogrid import rebuild as rebuild_grid
+from routes.models import SolarPanels
+
+
+class Command(BaseCommand):
+    help = ("Compute the geo_cell spatial index column of every SolarPanels row from its latitude/longitude, "
+            "then recount the map grid aggregates keyed by it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="Rows read and written per batch")
+
+    def handle(self, *args, **options):
+        last_id = 0
+        total = 0
+        while True:
+            rows = list(
+                SolarPanels.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'latitude', 'longitude')[:options['batch_size']]
+            )
+            if not rows:
+                break
+            ids = [row[0] for row in rows]
+            lat = [float('nan') if row[1] is None else row[1] for row in rows]
+            lon = [float('nan') if row[2] is None else row[2] for row in rows]
+            cells = cell_ids(lat, lon).tolist()
+            update_from_values(SolarPanels, ['geo_cell'], [
+                (panel_id, None if cell < 0 else cell) for panel_id, cell in zip(ids, cells)
+            ])
+            last_id = ids[-1]
+            total += len(rows)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{total} rows")
+        # the raw UPDATEs bypass the SolarPanels signals that keep PanelGridCount in step
+        grid_rows = rebuild_grid()
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled geo cells for {total} panels and rebuilt {grid_rows} grid aggregate rows"))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from routes.bulk import update_from_values
+from routes.models import ManufacturerData
+from routes.signals import MANUFACTURER_DATA, bump_after_commit
+from routes.specs import CATALOGUE_FIELDS, SPEC_FIELDS, catalogue_hash, spec_column, spec_values
+
+
+class Command(BaseCommand):
+    help = ("Parse the free-text spec columns of every ManufacturerData row into the typed *_num columns "
+            "and refresh each row's content_hash.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows read and written per batch")
+
+    def handle(self, *args, **options):
+        columns = [spec_column(name) for name in SPEC_FIELDS]
+        last_id = 0
+        total = 0
+        while True:
+            rows = list(
+                ManufacturerData.objects.filter(id__gt=last_id).order_by('id').only('id', *CATALOGUE_FIELDS)
+                [:options['batch_size']]
+            )
+            if not rows:
+                break
+            values = []
+            for row in rows:
+                parsed = spec_values(row)
+                content_hash = catalogue_hash([getattr(row, field) for field in CATALOGUE_FIELDS])
+                values.append((row.id, *(parsed[column] for column in columns), content_hash))
+            update_from_values(ManufacturerData, [*columns, 'content_hash'], values)
+            last_id = rows[-1].id
+            total += len(rows)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{total} rows")
+        if total:
+            # raw writes bypass post_save: the search index and warranty caches refresh off this bump
+            bump_after_commit(MANUFACTURER_DATA)
+        self.stdout.write(self.style.SUCCESS(f"Backfilled typed spec columns for {total} rows"))
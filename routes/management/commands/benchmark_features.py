@@ -0,0 +1,66 @@
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+from routes.features import batch_features, decode_reduced, extract_features
+
+
+class Command(BaseCommand):
+    help = "Benchmark the image feature-extraction stage on synthetic drone JPEGs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=64)
+        parser.add_argument('--width', type=int, default=4000)
+        parser.add_argument('--height', type=int, default=3000)
+        parser.add_argument('--quality', type=int, default=90)
+
+    def _jpeg(self, rng, width, height, quality):
+        # smooth gradient plus noise compresses like a real photo, unlike pure noise
+        base = rng.integers(0, 256, size=(height // 16, width // 16, 3), dtype=np.uint8)
+        img = Image.fromarray(base).resize((width, height), Image.Resampling.BILINEAR)
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=quality)
+        return buf.getvalue()
+
+    def _rate(self, label, count, seconds, cores):
+        self.stdout.write(
+            f"{label:<32} {count / seconds:8.1f} img/s  {count / seconds / cores:8.1f} img/s/core"
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        count = options['images']
+        payload = self._jpeg(rng, options['width'], options['height'], options['quality'])
+        self.stdout.write(
+            f"{count} x {options['width']}x{options['height']} JPEG ({len(payload) / 1e6:.1f} MB each)"
+        )
+        files = [io.BytesIO(payload) for _ in range(count)]
+        workers = getattr(settings, 'FEATURE_DECODE_WORKERS', 4)
+        cores = min(workers, os.cpu_count() or 1)
+
+        started = time.perf_counter()
+        with Image.open(io.BytesIO(payload)) as img:
+            img.convert('RGB').resize((128, 128), Image.Resampling.BILINEAR)
+        full = time.perf_counter() - started
+        self._rate("full-resolution decode (1 img)", 1, full, 1)
+
+        started = time.perf_counter()
+        stack = np.stack([decode_reduced(f) for f in files])
+        self._rate("draft decode, 1 thread", count, time.perf_counter() - started, 1)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(decode_reduced, files))
+        self._rate(f"draft decode, {workers} threads", count, time.perf_counter() - started, cores)
+
+        started = time.perf_counter()
+        batch_features(stack)
+        self._rate("batched 14-dim features", count, time.perf_counter() - started, 1)
+
+        started = time.perf_counter()
+        extract_features(files)
+        self._rate(f"full stage, {workers} threads", count, time.perf_counter() - started, cores)
@@ -0,0 +1,93 @@
+import datetime
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from routes.assessment import DEFAULT_THRESHOLDS
+from routes.models import ThresholdProfile
+from routes.streaming import (
+    DEFAULT_BUCKET_SECONDS, DEFAULT_WINDOW_SECONDS, SlidingWindowEvaluator, last_states,
+    poll_updates, record_transitions, replay,
+)
+from routes.telemetry import iter_chunks
+
+FOLLOW_OVERLAP_SECONDS = 5              # re-read chunks committed around the previous poll
+
+
+class Command(BaseCommand):
+    help = "Evaluate sensor telemetry with the sliding-window temperature rules, live or as a replay."
+
+    def add_arguments(self, parser):
+        mode = parser.add_mutually_exclusive_group(required=True)
+        mode.add_argument('--replay', action='store_true', help="Backtest over stored telemetry")
+        mode.add_argument('--follow', action='store_true', help="Evaluate new telemetry as it is ingested")
+        parser.add_argument('--window', type=int, default=DEFAULT_WINDOW_SECONDS, help="Window length in seconds")
+        parser.add_argument('--bucket', type=int, default=DEFAULT_BUCKET_SECONDS, help="Window step in seconds")
+        parser.add_argument('--start', type=datetime.date.fromisoformat, help="Replay: first UTC day")
+        parser.add_argument('--end', type=datetime.date.fromisoformat, help="Replay: last UTC day")
+        parser.add_argument('--panels', help="Replay: comma-separated panel ids")
+        parser.add_argument('--record', action='store_true', help="Replay: save transitions as alerts")
+        parser.add_argument('--output', help="Replay: write transitions to this NDJSON file")
+        parser.add_argument('--interval', type=float, default=30.0, help="Follow: seconds between polls")
+
+    def handle(self, *args, **options):
+        profile = ThresholdProfile.active()
+        try:
+            evaluator = SlidingWindowEvaluator(
+                options['window'], options['bucket'],
+                profile.as_thresholds() if profile else DEFAULT_THRESHOLDS,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['replay']:
+            self._replay(evaluator, options)
+        else:
+            self._follow(evaluator, options)
+
+    def _replay(self, evaluator, options):
+        panels = None
+        if options['panels']:
+            try:
+                panels = [int(p) for p in options['panels'].split(',') if p.strip()]
+            except ValueError:
+                raise CommandError("--panels must be comma-separated ids")
+        output = open(options['output'], 'w') if options['output'] else None
+        found = 0
+
+        def on_transitions(transitions):
+            nonlocal found
+            found += len(transitions)
+            if options['record']:
+                record_transitions(transitions)
+            if output is not None:
+                for t in transitions:
+                    output.write(json.dumps(t._asdict()) + '\n')
+
+        started = time.perf_counter()
+        try:
+            readings, _ = replay(evaluator, iter_chunks(panels, options['start'], options['end']),
+                                 on_transitions=on_transitions)
+        finally:
+            if output is not None:
+                output.close()
+        seconds = time.perf_counter() - started
+        rate = readings / seconds if seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {readings} readings in {seconds:.1f}s ({rate:,.0f}/s): "
+            f"{found} transitions, {evaluator.late} late readings dropped"
+        ))
+
+    def _follow(self, evaluator, options):
+        evaluator.seed_states(last_states())
+        # warm up on the last window so the first poll evaluates full windows
+        not_before = int(time.time()) - options['window']
+        since = timezone.now() - datetime.timedelta(seconds=options['window'])
+        self.stdout.write(f"Following telemetry every {options['interval']}s")
+        while True:
+            polled_at = timezone.now()
+            transitions = poll_updates(evaluator, since, not_before)
+            if transitions:
+                record_transitions(transitions)
+                self.stdout.write(f"{polled_at:%Y-%m-%d %H:%M:%S}: {len(transitions)} transitions")
+            since = polled_at - datetime.timedelta(seconds=FOLLOW_OVERLAP_SECONDS)
+            time.sleep(options['interval'])
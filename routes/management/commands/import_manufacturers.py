@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from routes.catalogue import CHUNK_SIZE, FORMATS, CatalogueError, import_catalogue
+
+
+class Command(BaseCommand):
+    help = "Bulk import a ManufacturerData catalogue (CSV or NDJSON), skipping rows whose content is unchanged."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Catalogue file; the format follows the extension unless --format is given")
+        parser.add_argument('--format', choices=FORMATS, help="csv or ndjson")
+        parser.add_argument('--dry-run', action='store_true', help="Count inserted, changed and unchanged rows only")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="File rows per transaction")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('ndjson' if options['path'].endswith(('.ndjson', '.jsonl')) else 'csv')
+        try:
+            with open(options['path'], 'rb') as stream:
+                summary = import_catalogue(stream, fmt, dry_run=options['dry_run'], chunk_size=options['chunk_size'])
+        except (OSError, CatalogueError) as e:
+            raise CommandError(str(e))
+        for error in summary['errors']:
+            self.stderr.write(error)
+        prefix = "Dry run: would import" if summary['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {summary['rows']} rows in {summary['seconds']}s: {summary['inserted']} inserted, "
+            f"{summary['changed']} changed, {summary['unchanged']} unchanged, {summary['invalid']} invalid"
+        ))
@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from routes.models import MosaicJob
+from routes.mosaic import LEASE_SECONDS, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Score queued site orthomosaics (sites/mosaic/ jobs) using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to CPU count)")
+        parser.add_argument('--poll', type=float, default=0,
+                            help="Keep running, checking for new jobs every this many seconds")
+        parser.add_argument('--lease', type=int, default=LEASE_SECONDS,
+                            help="Re-queue running jobs with no heartbeat for this many seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            done = 0
+            requeued, failed = requeue_stale_jobs(options['lease'])
+            if requeued or failed:
+                self.stdout.write(f"Stalled jobs: {requeued} re-queued, {failed} failed")
+            pending = MosaicJob.objects.filter(status="pending").order_by('created_at').select_related('upload__blob', 'user')
+            for job in list(pending):
+                if run_job(job, options['workers']):
+                    done += 1
+                    job.refresh_from_db(fields=['status', 'error'])
+                    self.stdout.write(f"Job {job.id}: {job.status} {job.error}".rstrip())
+            if not options['poll']:
+                break
+            if not done:
+                time.sleep(options['poll'])
+        self.stdout.write(self.style.SUCCESS("Mosaic queue drained"))
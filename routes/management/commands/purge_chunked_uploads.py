@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from routes.chunked import STALE_HOURS, purge_stale
+
+
+class Command(BaseCommand):
+    help = "Delete unfinished chunked uploads (and their staging files) older than --hours."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=STALE_HOURS)
+
+    def handle(self, *args, **options):
+        count = purge_stale(options['hours'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {count} stale uploads"))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from routes.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recount the fleet rollups (panels by company, installation year and decision) from SolarPanels."
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} fleet rollup rows"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from routes.geogrid import REBUILD_BATCH_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = "Recount the fleet map grid aggregates (PanelGridCount) from every SolarPanels row."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE, help="Panels read per query")
+
+    def handle(self, *args, **options):
+        rows = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} grid aggregate rows"))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from routes.models import ThresholdProfile
+from routes.rescoring import Checkpoint, rescore_fleet
+
+
+class Command(BaseCommand):
+    help = "Re-score every stored panel against a threshold profile using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', type=int, help="Profile version (defaults to the active profile)")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to CPU count)")
+        parser.add_argument('--chunk-size', type=int, default=20000, help="Panel ids per task")
+        parser.add_argument('--checkpoint', help="Checkpoint file (defaults to rescore-v<version>.json)")
+        parser.add_argument('--resume', action='store_true', help="Skip chunks recorded in the checkpoint")
+
+    def handle(self, *args, **options):
+        if options['profile'] is not None:
+            profile = ThresholdProfile.objects.filter(version=options['profile']).first()
+        else:
+            profile = ThresholdProfile.active()
+        if profile is None:
+            raise CommandError("No such threshold profile")
+
+        checkpoint = Checkpoint(
+            options['checkpoint'] or f"rescore-v{profile.version}.json",
+            profile.version,
+            options['chunk_size'],
+        )
+        if options['resume']:
+            try:
+                checkpoint.load()
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"Resuming: {len(checkpoint.done)} chunks already done")
+
+        def progress(start, count):
+            self.stdout.write(f"ids {start}-{start + options['chunk_size'] - 1}: {count} panels")
+
+        updated = rescore_fleet(
+            profile,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            checkpoint=checkpoint,
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Re-scored {updated} panels against profile v{profile.version}"))
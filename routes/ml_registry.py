@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+import joblib
+import numpy as np
+from django.conf import settings
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _array_bytes(obj, seen=None, depth=0):
+    """(heap bytes, memory-mapped bytes) of the numpy arrays reachable from obj."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or depth > 8:
+        return 0, 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        base = obj
+        while isinstance(base, np.ndarray) and not isinstance(base, np.memmap):
+            base = base.base
+        if isinstance(base, np.memmap):
+            return 0, obj.nbytes
+        return obj.nbytes, 0
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple, set)):
+        children = obj
+    elif hasattr(obj, '__dict__'):
+        children = vars(obj).values()
+    else:
+        return 0, 0
+    heap = mapped = 0
+    for child in children:
+        h, m = _array_bytes(child, seen, depth + 1)
+        heap += h
+        mapped += m
+    return heap, mapped
+
+
+class _Entry:
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.obj = None
+        self.signature = None       # (inode, mtime) of the file that was loaded
+        self.checked_at = 0.0
+        self.load_seconds = None
+        self.loaded_at = None
+        self.rss_delta_bytes = None
+        self.heap_bytes = None
+        self.mapped_bytes = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Lazily loaded, process-wide joblib models.
+
+    Arrays are loaded with joblib's mmap_mode, so they stay backed by the file
+    in the OS page cache: workers forked after a gunicorn preload (and even
+    workers that load the same file independently) share one copy of the
+    pages. A model is hot-swapped by atomically replacing its file
+    (os.replace); every worker notices the new inode/mtime on its next get()
+    after `reload_check_seconds` and reloads without a restart.
+    """
+
+    def __init__(self, mmap_mode='r', reload_check_seconds=5.0):
+        self.mmap_mode = mmap_mode
+        self.reload_check_seconds = reload_check_seconds
+        self._entries = {}
+
+    def register(self, name, path):
+        self._entries[name] = _Entry(name, path)
+
+    def _signature(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _load(self, entry, signature):
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        obj = joblib.load(entry.path, mmap_mode=self.mmap_mode)
+        entry.load_seconds = time.perf_counter() - started
+        rss_after = _rss_bytes()
+        entry.rss_delta_bytes = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        entry.heap_bytes, entry.mapped_bytes = _array_bytes(obj)
+        entry.loaded_at = time.time()
+        entry.signature = signature
+        # swap the reference last so concurrent readers see old or new, never half-loaded
+        entry.obj = obj
+
+    def get(self, name):
+        """The loaded model, or None when it is not registered or its file is missing."""
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry.checked_at < self.reload_check_seconds:
+            return entry.obj
+        with entry.lock:
+            if now - entry.checked_at >= self.reload_check_seconds:
+                entry.checked_at = now
+                signature = self._signature(entry.path)
+                if signature is not None and signature != entry.signature:
+                    try:
+                        self._load(entry, signature)
+                    except Exception:
+                        # keep serving the previous version if the new file is unreadable
+                        entry.signature = signature
+        return entry.obj
+
+    def swap(self, name, path):
+        """Points a model at a new file and loads it now, replacing the old version."""
+        entry = _Entry(name, path)
+        self._load(entry, self._signature(path))
+        entry.checked_at = time.monotonic()
+        self._entries[name] = entry
+
+    def warm(self):
+        """Loads every registered model; call before forking workers."""
+        for name in list(self._entries):
+            self.get(name)
+
+    def stats(self):
+        return {
+            name: {
+                'path': entry.path,
+                'loaded': entry.obj is not None,
+                'loaded_at': entry.loaded_at,
+                'load_seconds': entry.load_seconds,
+                'rss_delta_bytes': entry.rss_delta_bytes,
+                'heap_array_bytes': entry.heap_bytes,
+                'mapped_array_bytes': entry.mapped_bytes,
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+registry = ModelRegistry(
+    mmap_mode=getattr(settings, 'ML_MODEL_MMAP_MODE', 'r'),
+    reload_check_seconds=getattr(settings, 'ML_MODEL_RELOAD_CHECK_SECONDS', 5.0),
+)
+for _name, _path in getattr(settings, 'ML_MODELS', {}).items():
+    registry.register(_name, _path)
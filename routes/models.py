@@ -1,5 +1,11 @@
+import uuid
+import numpy as np
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from .assessment import ASSESSED_DAMAGE_TYPES, DECISIONS, DEFAULT_THRESHOLDS, Thresholds
+from .geo import geo_cell
+from .specs import CATALOGUE_FIELDS, SPEC_FIELDS, catalogue_hash, spec_column, spec_values
 
 class MaterialRecovery(models.Model):
     material = models.CharField(max_length=20, default=None)
@@ -75,18 +81,419 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 
+class ImageBlob(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='solar_panels/cas/', max_length=255)  # named by routes.storage.blob_name
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+
+class ChunkedUpload(models.Model):
+    STATUS_CHOICES = [
+        ("uploading", "uploading"),
+        ("complete", "complete"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # the upload ID clients reference
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    total_size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)  # expected digest if the client sent one, else the computed one
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="uploading")
+    blob = models.ForeignKey(ImageBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name='uploads')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def expected_chunk_size(self, index):
+        if index == self.chunk_count - 1:
+            return self.total_size - index * self.chunk_size
+        return self.chunk_size
+
+
+class UploadChunk(models.Model):
+    upload = models.ForeignKey(ChunkedUpload, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['upload', 'index'], name='unique_upload_chunk'),
+        ]
+
+
 class SolarPanels(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='solar_panels')
     companyName = models.CharField(max_length=100)
     installationYear = models.CharField(max_length=100)
-    image = models.ImageField(upload_to='solar_panels/', null=True, blank=True)
+    image = models.ImageField(upload_to='solar_panels/', max_length=255, null=True, blank=True)
+    image_blob = models.ForeignKey(ImageBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name='panels')
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    geo_cell = models.BigIntegerField(null=True, blank=True, editable=False)  # routes.geo cell id, set by save()
+    assessment_inputs = models.JSONField(default=dict, blank=True)  # raw predict_damage parameters, for re-scoring
+    manufacturer = models.ForeignKey('ManufacturerData', on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='panels')  # resolved from companyName/modelName
+    damage_type = models.CharField(max_length=100, blank=True, null=True)
+    decision = models.CharField(max_length=50, blank=True, null=True)
+    S_value = models.FloatField(null=True, blank=True)
+    damage_score = models.FloatField(null=True, blank=True)
+    threshold_version = models.PositiveIntegerField(null=True, blank=True)  # ThresholdProfile used for the verdict
+    send_inspection_request = models.BooleanField(default=False)
+    schedule_drone_inspection = models.BooleanField(default=False)
+    send_reminders = models.BooleanField(default=False)
+    typhoon_event = models.ForeignKey('TyphoonEvent', on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name='panels')  # latest storm that reached the panel
+    typhoon_speed = models.FloatField(null=True, blank=True)  # that storm's speed at the panel, None outside its core
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['geo_cell'], name='panel_geo_cell')]
+
     def __str__(self):
         return f"{self.companyName} - {self.user.email}"
+
+    # columns the map grid and fleet rollups count panels by (routes.rollups)
+    AGGREGATE_FIELDS = ('geo_cell', 'decision', 'companyName', 'installationYear')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        panel = super().from_db(db, field_names, values)
+        if all(field in field_names for field in cls.AGGREGATE_FIELDS):
+            # the stored values, so a save can move the panel's aggregate counts
+            panel._stored_state = {field: getattr(panel, field) for field in cls.AGGREGATE_FIELDS}
+        return panel
+
+    def save(self, *args, **kwargs):
+        self.geo_cell = geo_cell(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geo_cell'}
+        super().save(*args, **kwargs)
+
+
+class RealField(models.FloatField):
+    """4-byte float column (PostgreSQL real); scores need no more than float32 precision."""
+
+    def db_type(self, connection):
+        return 'real'
+
+
+class PanelAssessment(models.Model):
+    """
+    One verdict in a panel's assessment history. Decision and damage type
+    are codes into assessment.DECISIONS / ASSESSED_DAMAGE_TYPES, so rows
+    stay small and "decision X since T" is answered from an index alone.
+    """
+    SOURCE_PREDICT = 0
+    SOURCE_BATCH = 1
+    SOURCE_RESCORE = 2
+    SOURCE_CHOICES = [(SOURCE_PREDICT, 'predict'), (SOURCE_BATCH, 'batch'), (SOURCE_RESCORE, 'rescore')]
+
+    panel = models.ForeignKey(SolarPanels, on_delete=models.CASCADE, related_name='assessments',
+                              db_index=False)  # leads the (panel, assessed_at) index
+    assessed_at = models.DateTimeField(default=timezone.now)
+    decision = models.PositiveSmallIntegerField(choices=list(enumerate(DECISIONS)))
+    damage_type = models.PositiveSmallIntegerField(choices=list(enumerate(ASSESSED_DAMAGE_TYPES)))
+    S_value = RealField(null=True, blank=True)
+    damage_score = RealField(null=True, blank=True)
+    damage_probability = RealField(null=True, blank=True)
+    threshold_version = models.PositiveIntegerField(null=True, blank=True)
+    source = models.PositiveSmallIntegerField(choices=SOURCE_CHOICES, default=SOURCE_PREDICT)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['panel', 'assessed_at'], name='assessment_panel_time'),
+            models.Index(fields=['assessed_at', 'id'], name='assessment_time'),
+            models.Index(fields=['decision', 'assessed_at', 'panel'], name='assessment_decision_time'),
+        ]
+
+    def __str__(self):
+        return f"Panel {self.panel_id}: {self.get_decision_display()} at {self.assessed_at}"
+
+
+class SiteDefectGrid(models.Model):
+    """Per-tile damage scores of an orthomosaic, stored as packed arrays next to its site record."""
+    panel = models.OneToOneField(SolarPanels, on_delete=models.CASCADE, related_name='defect_grid')
+    tile_size = models.PositiveIntegerField()
+    rows = models.PositiveIntegerField()
+    cols = models.PositiveIntegerField()
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    scores = models.BinaryField()  # float32 [rows, cols], NaN for nodata tiles
+    label_codes = models.BinaryField()  # uint8 [rows, cols] indexing label_names
+    label_names = models.JSONField(default=list)
+    processing_seconds = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.rows}x{self.cols} grid for panel {self.panel_id}"
+
+    def scores_array(self):
+        return np.frombuffer(bytes(self.scores), dtype=np.float32).reshape(self.rows, self.cols)
+
+    def label_codes_array(self):
+        return np.frombuffer(bytes(self.label_codes), dtype=np.uint8).reshape(self.rows, self.cols)
+
+
+class MosaicJob(models.Model):
+    """An orthomosaic queued for scoring; the process_mosaic_jobs command runs it off the request path."""
+    STATUS_CHOICES = [
+        ("pending", "pending"),
+        ("running", "running"),
+        ("complete", "complete"),
+        ("failed", "failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # the job ID clients poll
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='mosaic_jobs')
+    upload = models.ForeignKey(ChunkedUpload, on_delete=models.CASCADE, related_name='mosaic_jobs')
+    tile_size = models.PositiveIntegerField()
+    inputs = models.JSONField(default=dict, blank=True)  # raw request parameters for the site record
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending", db_index=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)  # runs claimed so far, including stalled ones
+    site = models.OneToOneField(SolarPanels, on_delete=models.SET_NULL, null=True, blank=True, related_name='mosaic_job')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # heartbeat while running
+
+    def __str__(self):
+        return f"Mosaic job {self.id} ({self.status})"
+
+
+class PanelGridCount(models.Model):
+    """
+    Panels per decision in one routes.geo cell at a coarser level (the top
+    2 * level bits of geo_cell), for fleet map tiles. Kept current by
+    routes.geogrid; rebuild with the rebuild_panel_grid command.
+    """
+    level = models.PositiveSmallIntegerField()
+    cell = models.BigIntegerField()
+    decision = models.PositiveSmallIntegerField()  # index into assessment.DECISIONS
+    panels = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['level', 'cell', 'decision'], name='unique_panel_grid_count'),
+        ]
+
+    def __str__(self):
+        return f"L{self.level} cell {self.cell}: {self.panels}"
+
+
+class FleetRollup(models.Model):
+    """
+    Panels per companyName x installation year x decision, kept current by
+    routes.rollups; rebuild with the rebuild_fleet_rollups command.
+    """
+    company = models.CharField(max_length=100)
+    installation_year = models.PositiveSmallIntegerField()  # 0 when installationYear holds no year
+    decision = models.PositiveSmallIntegerField(choices=list(enumerate(DECISIONS)))
+    panels = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'installation_year', 'decision'], name='unique_fleet_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.company} {self.installation_year} {self.get_decision_display()}: {self.panels}"
+
+
+class TelemetryChunk(models.Model):
+    """
+    One panel-day of sensor readings as packed column blocks, sorted by
+    time with one reading per second at most (routes.telemetry).
+    """
+    panel = models.ForeignKey(SolarPanels, on_delete=models.CASCADE, related_name='telemetry_chunks')
+    day = models.DateField()  # UTC
+    count = models.PositiveIntegerField()
+    seconds = models.BinaryField()  # int32 seconds since UTC midnight
+    surface = models.BinaryField()  # float32 degC (C), NaN when not reported
+    ambient = models.BinaryField()  # float32 degC (T), NaN when not reported
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['panel', 'day'], name='unique_telemetry_panel_day'),
+        ]
+        indexes = [models.Index(fields=['day'])]
+
+    def __str__(self):
+        return f"{self.count} readings for panel {self.panel_id} on {self.day}"
+
+    def arrays(self):
+        """(seconds, surface, ambient) as NumPy arrays."""
+        return (
+            np.frombuffer(bytes(self.seconds), dtype=np.int32),
+            np.frombuffer(bytes(self.surface), dtype=np.float32),
+            np.frombuffer(bytes(self.ambient), dtype=np.float32),
+        )
+
+
+class TelemetryHourly(models.Model):
+    """Hourly rollup of a panel's readings, rebuilt whenever its chunk changes."""
+    panel = models.ForeignKey(SolarPanels, on_delete=models.CASCADE, related_name='telemetry_hourly')
+    hour = models.DateTimeField()  # start of the UTC hour
+    count = models.PositiveIntegerField()
+    surface_min = models.FloatField(null=True, blank=True)
+    surface_max = models.FloatField(null=True, blank=True)
+    surface_mean = models.FloatField(null=True, blank=True)
+    ambient_min = models.FloatField(null=True, blank=True)
+    ambient_max = models.FloatField(null=True, blank=True)
+    ambient_mean = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['panel', 'hour'], name='unique_telemetry_panel_hour'),
+        ]
+
+    def __str__(self):
+        return f"Panel {self.panel_id} at {self.hour}"
+
+
+class TelemetryAlert(models.Model):
+    """A damage-type transition found by the streaming telemetry evaluator (routes.streaming)."""
+    panel = models.ForeignKey(SolarPanels, on_delete=models.CASCADE, related_name='telemetry_alerts')
+    at = models.DateTimeField()  # newest reading in the window
+    previous_state = models.CharField(max_length=64)
+    state = models.CharField(max_length=64)
+    c1 = models.FloatField(null=True, blank=True)
+    c2 = models.FloatField(null=True, blank=True)
+    t1 = models.FloatField(null=True, blank=True)
+    t2 = models.FloatField(null=True, blank=True)
+    send_inspection_request = models.BooleanField(default=False)
+    send_reminders = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['panel', 'at']), models.Index(fields=['at', 'id'])]
+
+    def __str__(self):
+        return f"Panel {self.panel_id}: {self.previous_state} -> {self.state}"
+
+
+class TyphoonEvent(models.Model):
+    """
+    A storm track fanned out to every panel it reaches (routes.typhoon).
+    `track` is a list of {lat, lon, speed, radius_km, outer_radius_km} points.
+    """
+    name = models.CharField(max_length=150, blank=True)
+    track = models.JSONField()
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='typhoon_events')
+    speed_threshold = models.FloatField()  # inspection threshold applied (ThresholdProfile.typhoon_speed_threshold)
+    panels_affected = models.PositiveIntegerField(default=0)
+    inspections_requested = models.PositiveIntegerField(default=0)
+    processing_seconds = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'])]
+
+    def __str__(self):
+        return f"{self.name or 'Typhoon'} ({self.panels_affected} panels)"
+
+
+class CachedAssessment(models.Model):
+    key = models.CharField(max_length=64, unique=True)  # routes.storage.assessment_key
+    panel = models.ForeignKey(SolarPanels, on_delete=models.CASCADE, related_name='cached_assessments')
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+
+class DataVersion(models.Model):
+    """
+    Change counter per data set, bumped whenever its rows change, so every
+    worker process can tell that its in-memory copy (search index, caches)
+    is stale with one indexed lookup.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, name):
+        if not cls.objects.filter(name=name).update(version=models.F('version') + 1, updated_at=timezone.now()):
+            try:
+                with transaction.atomic():
+                    cls.objects.create(name=name, version=1)
+            except IntegrityError:
+                cls.objects.filter(name=name).update(version=models.F('version') + 1, updated_at=timezone.now())
+
+
+
+class ManufacturerDeletion(models.Model):
+    """
+    Tombstone of a deleted ManufacturerData row, written by the post_delete
+    signal, so in-memory search indexes can drop deleted rows without
+    rescanning every id. Pruned after routes.search.TOMBSTONE_RETENTION.
+    """
+    manufacturer_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"ManufacturerData {self.manufacturer_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
+class ThresholdProfile(models.Model):
+    version = models.PositiveIntegerField(unique=True, editable=False)
+    name = models.CharField(max_length=150, blank=True)
+    surface_flat_tolerance = models.FloatField(default=DEFAULT_THRESHOLDS.surface_flat_tolerance)
+    ambient_variation = models.FloatField(default=DEFAULT_THRESHOLDS.ambient_variation)
+    overheat_margin = models.FloatField(default=DEFAULT_THRESHOLDS.overheat_margin)
+    underheat_margin = models.FloatField(default=DEFAULT_THRESHOLDS.underheat_margin)
+    typhoon_speed_threshold = models.FloatField(default=DEFAULT_THRESHOLDS.typhoon_speed_threshold)
+    medium_damage_threshold = models.FloatField(default=DEFAULT_THRESHOLDS.medium_damage_threshold)
+    severe_damage_threshold = models.FloatField(default=DEFAULT_THRESHOLDS.severe_damage_threshold)
+    is_active = models.BooleanField(default=False)  # profile used by predict_damage
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-version']
+
+    def __str__(self):
+        return f"v{self.version} {self.name}".strip()
+
+    def as_thresholds(self):
+        return Thresholds(*(getattr(self, field) for field in Thresholds._fields))
+
+    @classmethod
+    def active(cls):
+        """The active profile, or None when the built-in defaults apply."""
+        return cls.objects.filter(is_active=True).first()
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.version is None:
+                latest = ThresholdProfile.objects.select_for_update().order_by('-version').first()
+                self.version = latest.version + 1 if latest else 1
+            if self.is_active:
+                ThresholdProfile.objects.exclude(pk=self.pk).filter(is_active=True).update(is_active=False)
+            super().save(*args, **kwargs)
     
 
 class ManufacturerData(models.Model):
@@ -122,10 +529,47 @@ class ManufacturerData(models.Model):
 
     status = models.CharField(max_length=250, blank=True, null=True) # Default removed for consistency with nullability
     last_updated = models.CharField(max_length=250, blank=True, null=True) # Converted from DateTimeField
+    created_at = models.DateTimeField(default=timezone.now)  # keyset pagination key; existing rows get the migration time
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # incremental search index refresh
+    content_hash = models.CharField(max_length=16, blank=True, null=True, editable=False)  # specs.catalogue_hash, set by save()
+
+    # typed copies of the spec text above (routes.specs), filled in by save()
+    # and backfill_manufacturer_specs so range filters and sorts run in SQL
+    cells_per_module_num = models.IntegerField(blank=True, null=True, editable=False)
+    power_range_min_num = models.FloatField(blank=True, null=True, editable=False)  # W
+    power_range_max_num = models.FloatField(blank=True, null=True, editable=False)  # W
+    pmax_num = models.FloatField(blank=True, null=True, editable=False)  # W
+    efficiency_num = models.FloatField(blank=True, null=True, editable=False)  # %
+    warranty_years_num = models.IntegerField(blank=True, null=True, editable=False)
+    primary_years_num = models.IntegerField(blank=True, null=True, editable=False)
+    output_power_percent_num = models.FloatField(blank=True, null=True, editable=False)
+    max_power_temp_coeff_num = models.FloatField(blank=True, null=True, editable=False)  # %/degC
+    voc_temp_coeff_num = models.FloatField(blank=True, null=True, editable=False)  # %/degC
+    isc_temp_coeff_num = models.FloatField(blank=True, null=True, editable=False)  # %/degC
+    cable_length_mm_num = models.IntegerField(blank=True, null=True, editable=False)
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'], name='manufacturer_created_id')] + [
+            # (value, id) serves both range filters and keyset-paged sorts
+            models.Index(fields=[spec_column(name), 'id'], name=f'mfr_{name}_idx') for name in SPEC_FIELDS
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.model_name}"
 
+    def set_spec_values(self):
+        for column, value in spec_values(self).items():
+            setattr(self, column, value)
+
+    def save(self, *args, **kwargs):
+        self.set_spec_values()
+        self.content_hash = catalogue_hash([getattr(self, field) for field in CATALOGUE_FIELDS])
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'updated_at', 'content_hash',
+                                       *(spec_column(name) for name in SPEC_FIELDS)}
+        super().save(*args, **kwargs)
+
 class Registrations(models.Model):
     name = models.CharField(max_length=150)
     email = models.EmailField()
@@ -136,6 +580,9 @@ class Registrations(models.Model):
     company = models.CharField(max_length=150, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'], name='registration_created_id')]
+
     def __str__(self):
         return f"{self.name} ({self.email})"
 
@@ -148,6 +595,9 @@ class ContactForm(models.Model):
     message = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'], name='contact_created_id')]
+
     def __str__(self):
         return f"Contact from {self.name} ({self.email})"
 
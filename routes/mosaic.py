@@ -0,0 +1,216 @@
+import datetime
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+import tifffile
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+from .assessment import parse_panel_params
+from .features import FEATURE_SIZE, batch_features, classify_features
+from .models import MosaicJob, SiteDefectGrid, SolarPanels
+
+DEFAULT_TILE_SIZE = 512
+TILES_PER_TASK = 16                     # bounds per-worker memory to ~16 tiles of pixels
+HEARTBEAT_SECONDS = 60                  # a running job touches updated_at at least this often
+LEASE_SECONDS = 15 * 60                 # running jobs silent this long are treated as crashed
+MAX_ATTEMPTS = 2                        # a job that stalls this many times is failed, not re-queued
+
+
+def open_raster(path, scratch_dir=None):
+    """
+    Memory-maps the first image of a TIFF/GeoTIFF. Uncompressed, contiguous
+    files are mapped in place; compressed or tiled ones are decoded segment
+    by segment into a scratch memmap on disk, so RAM use never scales with
+    mosaic size. Returns (memmap, scratch path to delete or None).
+    """
+    try:
+        return tifffile.memmap(path, mode='r'), None
+    except ValueError:
+        pass
+    if scratch_dir:
+        os.makedirs(scratch_dir, exist_ok=True)
+    fd, scratch = tempfile.mkstemp(suffix='.raw', dir=scratch_dir)
+    os.close(fd)
+    try:
+        with tifffile.TiffFile(path) as tif:
+            page = tif.pages[0]
+            page.asarray(out=scratch)
+            return np.memmap(scratch, dtype=page.dtype, mode='r', shape=page.shape), scratch
+    except Exception:
+        os.remove(scratch)
+        raise
+
+
+def _to_rgb_uint8(tile):
+    """(H, W[, C]) tile of any TIFF sample type as (H, W, 3) uint8, plus a valid-pixel mask."""
+    if tile.ndim == 2:
+        tile = tile[..., None]
+    valid = None
+    if tile.shape[2] in (2, 4):
+        # trailing alpha band marks nodata outside the surveyed area
+        valid = tile[..., -1] > 0
+        tile = tile[..., :-1]
+    if tile.shape[2] == 1:
+        tile = np.repeat(tile, 3, axis=2)
+    elif tile.shape[2] > 3:
+        tile = tile[..., :3]
+
+    if tile.dtype == np.uint8:
+        rgb = tile
+    elif np.issubdtype(tile.dtype, np.integer):
+        rgb = (tile.astype(np.float32) * (255.0 / np.iinfo(tile.dtype).max)).astype(np.uint8)
+    else:
+        rgb = (np.clip(np.nan_to_num(tile.astype(np.float32)), 0.0, 1.0) * 255.0).astype(np.uint8)
+    if valid is None:
+        valid = rgb.any(axis=2)
+    return np.ascontiguousarray(rgb), valid
+
+
+def score_tiles(source, row, col_start, col_stop, tile_size):
+    """
+    Features and damage scores for one run of tiles in a grid row. Runs in
+    a pool worker; only `source` (path, dtype, offset, shape) crosses the
+    process boundary and the pixels are read from the shared memmap.
+    Returns (row, col_start, scores, label names).
+    """
+    path, dtype, offset, shape = source
+    raster = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+    stack = []
+    empty = []
+    for col in range(col_start, col_stop):
+        tile = raster[row * tile_size:(row + 1) * tile_size, col * tile_size:(col + 1) * tile_size]
+        rgb, valid = _to_rgb_uint8(np.asarray(tile))
+        empty.append(valid.mean() < 0.05)
+        img = Image.fromarray(rgb).resize((FEATURE_SIZE, FEATURE_SIZE), Image.Resampling.BILINEAR)
+        stack.append(np.asarray(img))
+    del raster
+
+    features = batch_features(np.stack(stack))
+    labels, damage_probs, normal_labels = classify_features(features)
+    edge_density = features[:, 11]
+    scores = np.where(
+        np.isnan(damage_probs),
+        np.clip(edge_density * 2.0, 0.0, 1.0),  # no model deployed: edge-density heuristic
+        np.where(normal_labels, 1.0 - damage_probs, damage_probs),
+    )
+    scores = np.where(empty, np.nan, scores).astype(np.float32)
+    labels = [None if is_empty else label for label, is_empty in zip(labels, empty)]
+    return row, col_start, scores, labels
+
+
+def _score_task(task):
+    return score_tiles(*task)
+
+
+def process_mosaic(path, tile_size=DEFAULT_TILE_SIZE, workers=None, heartbeat=None):
+    """
+    Splits a mosaic into tile_size squares and scores them across a process
+    pool. Forks, so call it only from a single-threaded process (the
+    process_mosaic_jobs command), never from a server worker. `heartbeat`,
+    if given, is called in the parent after each finished task. Returns
+    (scores float32 [rows, cols] with NaN for nodata tiles, label code grid
+    uint8, label names, (height, width), seconds).
+    """
+    started = time.perf_counter()
+    raster, scratch = open_raster(path, getattr(settings, 'CHUNKED_UPLOAD_DIR', None))
+    try:
+        height, width = raster.shape[:2]
+        source = (raster.filename, raster.dtype.str, raster.offset, raster.shape)
+        del raster
+        rows = -(-height // tile_size)
+        cols = -(-width // tile_size)
+        tasks = [
+            (source, row, col, min(col + TILES_PER_TASK, cols), tile_size)
+            for row in range(rows)
+            for col in range(0, cols, TILES_PER_TASK)
+        ]
+
+        scores = np.full((rows, cols), np.nan, dtype=np.float32)
+        codes = np.zeros((rows, cols), dtype=np.uint8)
+        label_names = [None]
+        context = multiprocessing.get_context('fork')
+        with context.Pool(processes=workers) as pool:
+            for row, col_start, tile_scores, labels in pool.imap_unordered(_score_task, tasks):
+                scores[row, col_start:col_start + len(tile_scores)] = tile_scores
+                for offset, label in enumerate(labels):
+                    if label not in label_names:
+                        label_names.append(label)
+                    codes[row, col_start + offset] = label_names.index(label)
+                if heartbeat:
+                    heartbeat()
+    finally:
+        if scratch:
+            os.remove(scratch)
+    return scores, codes, label_names, (height, width), time.perf_counter() - started
+
+
+def requeue_stale_jobs(lease_seconds=LEASE_SECONDS):
+    """
+    Hands back running jobs whose runner stopped heartbeating (killed,
+    OOM, host lost). Each goes back to pending unless it has already been
+    claimed MAX_ATTEMPTS times, in which case it is failed so a mosaic that
+    crashes its runner cannot loop forever. Returns (requeued, failed).
+    """
+    now = timezone.now()
+    stale = MosaicJob.objects.filter(status="running", updated_at__lt=now - datetime.timedelta(seconds=lease_seconds))
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status="failed", error=f"Runner stopped responding {MAX_ATTEMPTS} times", updated_at=now)
+    requeued = stale.update(status="pending", updated_at=now)
+    return requeued, failed
+
+
+def _heartbeat(job_id):
+    last = time.monotonic()
+
+    def beat():
+        nonlocal last
+        if time.monotonic() - last >= HEARTBEAT_SECONDS:
+            MosaicJob.objects.filter(id=job_id, status="running").update(updated_at=timezone.now())
+            last = time.monotonic()
+    return beat
+
+
+def run_job(job, workers=None):
+    """
+    Scores a pending MosaicJob and stores the defect grid with a new
+    SolarPanels site record. Returns False when another runner claimed
+    the job first; a mosaic that cannot be read marks the job failed.
+    While scoring, updated_at is refreshed every HEARTBEAT_SECONDS so
+    requeue_stale_jobs can tell a slow job from a dead runner.
+    """
+    if not MosaicJob.objects.filter(id=job.id, status="pending").update(
+            status="running", attempts=F('attempts') + 1, updated_at=timezone.now()):
+        return False
+    # forked workers never touch the DB, but must not inherit a live socket either
+    connections.close_all()
+    try:
+        scores, codes, label_names, (height, width), seconds = process_mosaic(
+            job.upload.blob.file.path, job.tile_size, workers, heartbeat=_heartbeat(job.id))
+    except Exception as e:
+        MosaicJob.objects.filter(id=job.id).update(
+            status="failed", error=f"Could not read mosaic: {e}", updated_at=timezone.now())
+        return True
+
+    params = parse_panel_params(job.inputs)
+    with transaction.atomic():
+        site = SolarPanels.objects.create(
+            user=job.user,
+            companyName=params['company_name'],
+            installationYear=params['installation_year'],
+            image=job.upload.blob.file.name,
+            image_blob=job.upload.blob,
+            latitude=params['latitude'],
+            longitude=params['longitude'],
+        )
+        SiteDefectGrid.objects.create(
+            panel=site, tile_size=job.tile_size, rows=scores.shape[0], cols=scores.shape[1],
+            width=width, height=height, scores=scores.tobytes(), label_codes=codes.tobytes(),
+            label_names=label_names, processing_seconds=seconds,
+        )
+        MosaicJob.objects.filter(id=job.id).update(status="complete", site=site, updated_at=timezone.now())
+    return True
@@ -0,0 +1,118 @@
+import base64
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination on (created_at, id), newest first.
+
+    The cursor carries the last row's created_at and id, and the next page
+    is `WHERE (created_at, id) < (cursor)` read straight off the composite
+    (created_at, id) index, so page 10,000 costs the same as page 1. Unlike
+    DRF's CursorPagination, ties on created_at (bulk imports) are broken by
+    id instead of an OFFSET. Views can page on another non-null column by
+    setting `cursor_ordering` (e.g. 'at' or '-at') or overriding
+    get_cursor_ordering(request). ?page_size= is capped at API_MAX_PAGE_SIZE.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        default = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 100
+        maximum = getattr(settings, 'API_MAX_PAGE_SIZE', 1000)
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, default))
+        except (TypeError, ValueError):
+            size = default
+        return max(1, min(size, maximum))
+
+    def _decode_cursor(self, request, field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk, reverse = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8').rsplit('|', 2)
+            return field.to_python(value), int(pk), reverse == '1'
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _ordering(self, request, view):
+        if hasattr(view, 'get_cursor_ordering'):
+            return view.get_cursor_ordering(request)
+        return getattr(view, 'cursor_ordering', '-created_at')
+
+    def _encode_cursor(self, row, reverse):
+        value = getattr(row, self.field_name)
+        raw = f"{value.isoformat() if hasattr(value, 'isoformat') else value}|{row.pk}|{int(reverse)}"
+        encoded = base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = self._ordering(request, view)
+        descending = ordering.startswith('-')
+        self.field_name = name = ordering.lstrip('-')
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self._decode_cursor(request, queryset.model._meta.get_field(name))
+
+        reverse = bool(cursor and cursor[2])
+        # walking backwards from a cursor is the same seek in the opposite direction
+        seek_down = descending != reverse
+        if seek_down:
+            order, bound, strict, tie = (f'-{name}', '-pk'), 'lte', 'lt', 'pk__lt'
+        else:
+            order, bound, strict, tie = (name, 'pk'), 'gte', 'gt', 'pk__gt'
+        page = queryset.order_by(*order)
+        if cursor is not None:
+            value, pk, _ = cursor
+            # the first condition bounds the index range scan, the second breaks ties
+            page = page.filter(**{f'{name}__{bound}': value}).filter(
+                Q(**{f'{name}__{strict}': value}) | Q(**{tie: pk})
+            )
+
+        rows = list(page[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, more
+        else:
+            self.has_next, self.has_previous = more, cursor is not None
+        self.rows = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.rows:
+            return None
+        return self._encode_cursor(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.rows:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._encode_cursor(self.rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,152 @@
+import re
+import time
+import numpy as np
+from django.db.models import Count
+from .models import ManufacturerData
+from .reference import reference_tables
+
+# mass share of each material in a decommissioned module (IRENA 2016 end-of-life estimates)
+MATERIALS = ('glass', 'aluminium', 'polymer', 'silicon', 'copper', 'silver', 'tellurium')
+PANEL_TYPES = ('crystalline', 'thin_film')
+COMPOSITION = np.array([
+    [0.76, 0.08, 0.10, 0.05, 0.01, 0.001, 0.0],       # crystalline silicon
+    [0.89, 0.06, 0.04, 0.0, 0.01, 0.0, 0.0007],       # thin film (CdTe / CIGS)
+])
+KG_PER_WATT = np.array([0.055, 0.077])  # module mass per nameplate watt, per panel type
+DEFAULT_PANEL_KG = 20.0                 # when the catalogue has no wattage (typical 60-cell module)
+PANEL_KG_RANGE = (3.0, 50.0)            # clip for implausible wattages
+MAX_PANEL_RESULTS = 1000                # per-panel rows returned with a site estimate
+
+# MaterialRecovery.material spellings -> MATERIALS
+_ALIASES = {'aluminum': 'aluminium', 'plastic': 'polymer', 'plastics': 'polymer', 'polymers': 'polymer'}
+_THIN_FILM = re.compile(r'thin|cdte|cigs|cis\b|amorph|a-si', re.IGNORECASE)
+
+
+def panel_type_code(panel_type, cell_type):
+    """PANEL_TYPES index for a catalogue row's panel_type / cell_type text (crystalline when unknown)."""
+    return int(bool(_THIN_FILM.search(f'{panel_type or ""} {cell_type or ""}')))
+
+
+def panel_masses(watts, codes):
+    """Estimated module mass in kg from nameplate watts (NaN when unknown) and panel type codes."""
+    watts = np.asarray(watts, dtype=np.float64)
+    masses = np.where(watts > 0, watts * KG_PER_WATT[codes], DEFAULT_PANEL_KG)
+    return np.clip(masses, *PANEL_KG_RANGE)
+
+
+def recovery_vectors(materials=None):
+    """
+    (recovery rate, min price, max price, priced) per MATERIALS entry from
+    the cached MaterialRecovery table. Materials without a row recover
+    nothing and are reported as unpriced.
+    """
+    if materials is None:
+        materials = reference_tables.get().materials
+    rates, low, high = np.zeros(len(MATERIALS)), np.zeros(len(MATERIALS)), np.zeros(len(MATERIALS))
+    priced = np.zeros(len(MATERIALS), dtype=bool)
+    for row in materials.values():
+        name = ' '.join(str(row.material or '').lower().split())
+        name = _ALIASES.get(name, name)
+        if name not in MATERIALS:
+            continue
+        i = MATERIALS.index(name)
+        rates[i] = row.recovery_rate or 0.0
+        low[i], high[i] = row.min_price or 0.0, row.max_price or 0.0
+        priced[i] = row.max_price is not None
+    return rates, low, high, priced
+
+
+def estimate(masses, codes, vectors=None):
+    """
+    Material mass, recovered mass and value range for n panels at once:
+    (n, materials) arrays 'material_kg' and 'recovered_kg', and (n,)
+    'value_min' / 'value_max' (recovered kg x market price per kg).
+    """
+    rates, low, high, _ = recovery_vectors() if vectors is None else vectors
+    material_kg = np.asarray(masses, dtype=np.float64)[:, None] * COMPOSITION[codes]
+    recovered = material_kg * rates
+    return {'material_kg': material_kg, 'recovered_kg': recovered, 'value_min': recovered @ low,
+            'value_max': recovered @ high}
+
+
+def summarize(masses, codes, counts, vectors=None):
+    """Totals over panel groups (one row per distinct panel, `counts` panels each), per material."""
+    vectors = recovery_vectors() if vectors is None else vectors
+    counts = np.asarray(counts, dtype=np.float64)
+    result = estimate(masses, codes, vectors)
+    material_kg = counts @ result['material_kg'] if len(counts) else np.zeros(len(MATERIALS))
+    recovered = counts @ result['recovered_kg'] if len(counts) else np.zeros(len(MATERIALS))
+    rates, low, high, priced = vectors
+    return {
+        'panels': int(counts.sum()),
+        'mass_kg': round(float(material_kg.sum()), 1),
+        'recovered_kg': round(float(recovered.sum()), 1),
+        'value_min': round(float(recovered @ low), 2),
+        'value_max': round(float(recovered @ high), 2),
+        'materials': [
+            {'material': name, 'mass_kg': round(float(material_kg[i]), 2),
+             'recovered_kg': round(float(recovered[i]), 2), 'recovery_rate': float(rates[i]),
+             'value_min': round(float(recovered[i] * low[i]), 2), 'value_max': round(float(recovered[i] * high[i]), 2),
+             'priced': bool(priced[i])}
+            for i, name in enumerate(MATERIALS)
+        ],
+    }
+
+
+def manufacturer_inputs(ids):
+    """{ManufacturerData id: (nameplate watts or NaN, panel type code)} for the given ids, in one query."""
+    inputs = {}
+    rows = ManufacturerData.objects.filter(id__in=[i for i in set(ids) if i is not None]).values_list(
+        'id', 'pmax_num', 'power_range_max_num', 'panel_type', 'cell_type')
+    for row_id, pmax, power_max, panel_type, cell_type in rows:
+        watts = pmax or power_max
+        inputs[row_id] = (np.nan if watts is None else watts, panel_type_code(panel_type, cell_type))
+    return inputs
+
+
+def _inputs(manufacturer_ids):
+    known = manufacturer_inputs(manufacturer_ids)
+    default = (np.nan, 0)
+    watts, codes = np.array([known.get(i, default) for i in manufacturer_ids], dtype=np.float64).reshape(-1, 2).T
+    codes = codes.astype(np.int64)
+    return panel_masses(watts, codes), codes
+
+
+def panel_recycling(manufacturer_ids):
+    """Recycling payload (mass, recovered mass, value range) per panel, for predict_damage responses."""
+    masses, codes = _inputs(list(manufacturer_ids))
+    result = estimate(masses, codes)
+    return [
+        {'panel_type': PANEL_TYPES[codes[i]], 'mass_kg': round(float(masses[i]), 1),
+         'recovered_kg': round(float(result['recovered_kg'][i].sum()), 2),
+         'value_min': round(float(result['value_min'][i]), 2), 'value_max': round(float(result['value_max'][i]), 2)}
+        for i in range(len(masses))
+    ]
+
+
+def estimate_panels(queryset, detail=0):
+    """
+    Site estimate for every panel in `queryset`: panels are counted per
+    catalogue row in SQL, so the NumPy pass runs over distinct models, not
+    panels. With `detail`, the first `detail` panels (by id) are also
+    priced one by one.
+    """
+    started = time.perf_counter()
+    groups = list(queryset.order_by().values('manufacturer_id').annotate(n=Count('id'))
+                  .values_list('manufacturer_id', 'n'))
+    masses, codes = _inputs([manufacturer_id for manufacturer_id, _ in groups])
+    summary = summarize(masses, codes, [n for _, n in groups])
+    if detail:
+        rows = list(queryset.order_by('id').values_list('id', 'manufacturer_id')[:detail])
+        summary['results'] = [{'id': panel_id, **payload} for (panel_id, _), payload
+                              in zip(rows, panel_recycling([manufacturer_id for _, manufacturer_id in rows]))]
+    summary['seconds'] = round(time.perf_counter() - started, 4)
+    return summary
+
+
+def donation_estimate(donation):
+    """Estimate for a Donation, which records only a panel count: typical crystalline modules."""
+    summary = summarize(panel_masses([np.nan], np.zeros(1, dtype=np.int64)), np.zeros(1, dtype=np.int64),
+                        [donation.panels])
+    summary['donation'] = donation.id
+    return summary
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from django.conf import settings
+from .models import DamageType, DataVersion, InspectionType, MaterialRecovery, ThermalRiskInspection
+from .signals import REFERENCE_DATA
+from .specs import duration_hours, parse_numbers
+
+# parsed rows of the lookup tables; numbers are None where the text has none
+Material = namedtuple('Material', [
+    'id', 'material',
+    'recovery_rate',        # fraction recovered, 0-1 (the column holds a percent)
+    'min_price',            # min_market_price / max_market_price, as numbers
+    'max_price',
+])
+RiskInspection = namedtuple('RiskInspection', [
+    'id', 'risk_type', 'recommended_frequency',
+    'drone_minutes',        # estimated_drone_time per panel
+    'response_hours',       # trigger_response_time; 0 for "Immediate"
+    'probable_defects_max', 'probable_defects_moderate',
+    'inspection_types',     # InspectionType names, pre-joined
+])
+Damage = namedtuple('Damage', ['id', 'name', 'drone_inspection', 'visual_inspection', 'notes'])
+
+# one immutable snapshot of every lookup table; the mappings are keyed by name
+ReferenceTables = namedtuple('ReferenceTables', [
+    'version', 'materials', 'risks', 'damage_types', 'inspection_types',
+])
+
+
+def _first_number(text):
+    numbers = parse_numbers(text)
+    return numbers[0] if numbers else None
+
+
+def material(row):
+    """Material from a MaterialRecovery row: rate as a fraction, prices ordered low to high."""
+    rate = _first_number(row.recovery_rate)
+    if rate is not None and rate > 1:
+        rate /= 100.0
+    low, high = _first_number(row.min_market_price), _first_number(row.max_market_price)
+    low, high = (high, high) if low is None else (low, low) if high is None else sorted((low, high))
+    return Material(row.id, row.material, rate, low, high)
+
+
+def risk_inspection(row):
+    """RiskInspection from a ThermalRiskInspection row whose inspection_type is prefetched."""
+    hours = duration_hours(row.estimated_drone_time)
+    return RiskInspection(
+        row.id, row.risk_type, row.recommended_frequency,
+        None if hours is None else hours * 60.0,
+        duration_hours(row.trigger_response_time),
+        row.probable_defects_max, row.probable_defects_moderate,
+        tuple(sorted(kind.name for kind in row.inspection_type.all())),
+    )
+
+
+def load_tables(version=0):
+    """Reads every lookup table (five queries) into a ReferenceTables snapshot; later rows win a name."""
+    risks = ThermalRiskInspection.objects.order_by('id').prefetch_related('inspection_type')
+    return ReferenceTables(
+        version,
+        MappingProxyType({row.material: material(row) for row in MaterialRecovery.objects.order_by('id')}),
+        MappingProxyType({row.risk_type: risk_inspection(row) for row in risks}),
+        MappingProxyType({row.name: Damage(row.id, row.name, row.drone_inspection, row.visual_inspection, row.notes)
+                          for row in DamageType.objects.order_by('id')}),
+        tuple(InspectionType.objects.order_by('name').values_list('name', flat=True)),
+    )
+
+
+class ReferenceCache:
+    """
+    In-process copy of the small lookup tables (MaterialRecovery,
+    ThermalRiskInspection with its inspection types, DamageType and
+    InspectionType) as one immutable ReferenceTables snapshot. Admin saves
+    and deletes bump the reference_data DataVersion on commit; each process
+    checks it at most every `check_seconds` and reloads whole tables when
+    it moved, so readers never query the tables themselves. The price is
+    bounded staleness: an edit reaches every process within check_seconds
+    of its commit (REFERENCE_CACHE_CHECK_SECONDS, 2 s by default), and
+    until then readers keep getting the previous snapshot.
+    """
+
+    def __init__(self, check_seconds=2.0):
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._tables = None
+        self._checked_at = 0.0
+
+    def get(self):
+        """The current ReferenceTables; treat it as read-only and do not hold it across requests."""
+        now = time.monotonic()
+        tables = self._tables
+        if tables is not None and now - self._checked_at < self.check_seconds:
+            return tables
+        with self._lock:
+            if self._tables is not None and now - self._checked_at < self.check_seconds:
+                return self._tables
+            version = DataVersion.current(REFERENCE_DATA)
+            if self._tables is None or self._tables.version != version:
+                self._tables = load_tables(version)
+            self._checked_at = now
+            return self._tables
+
+
+reference_tables = ReferenceCache(getattr(settings, 'REFERENCE_CACHE_CHECK_SECONDS', 2.0))
@@ -0,0 +1,139 @@
+import datetime
+import json
+import multiprocessing
+import os
+from django.db import connections, transaction
+from .assessment import assess, history_fields, parse_panel_params, stack_params, stored_fields
+from .bulk import update_from_values
+from .rollups import move_aggregates
+from .models import PanelAssessment, SolarPanels
+from .warranty import apply_warranty, warranty_curves
+
+VERDICT_FIELDS = ['damage_type', 'decision', 'S_value', 'damage_score', 'threshold_version']
+
+
+def update_verdicts(rows):
+    """Writes (id, damage_type, decision, S_value, damage_score, threshold_version) tuples."""
+    update_from_values(SolarPanels, VERDICT_FIELDS, rows)
+
+
+def _state(row, decision):
+    # rollups.panel_state() of a rescore_range row
+    return {'geo_cell': row[4], 'decision': decision, 'companyName': row[7], 'installationYear': row[1]}
+
+
+def rescore_range(task):
+    """
+    Re-scores the panels with start <= id < stop against one threshold
+    profile. Runs inside a pool worker; returns (start, rows updated).
+    Panels saved before inputs were recorded have nothing to re-score.
+    Panels linked to a catalogue row use its current warranty terms.
+    Changed verdicts move the panels' map grid and fleet rollup counts and
+    are added to their assessment history in the same commit.
+    """
+    start, stop, version, thresholds, now_year = task
+    rows = list(
+        SolarPanels.objects.filter(id__gte=start, id__lt=stop)
+        .exclude(assessment_inputs={})
+        .values_list('id', 'installationYear', 'assessment_inputs', 'manufacturer_id', 'geo_cell', 'decision',
+                     'damage_type', 'companyName')
+    )
+    if not rows:
+        return start, 0
+
+    curves = warranty_curves.get_many([row[3] for row in rows])
+    params = [
+        apply_warranty(parse_panel_params({**inputs, 'installationYear': installation_year}, now_year),
+                       curves.get(manufacturer_id))
+        for _, installation_year, inputs, manufacturer_id, *_ in rows
+    ]
+    result = assess(stack_params(params), now_year=now_year, thresholds=thresholds)
+    verdicts = []
+    for i, (panel_id, *_) in enumerate(rows):
+        fields = stored_fields(result, i)
+        verdicts.append((panel_id, fields['damage_type'], fields['decision'],
+                         fields['S_value'], fields['damage_score'], version))
+    moved = [(row, verdict[2]) for row, verdict in zip(rows, verdicts) if row[5] != verdict[2]]
+    changed = [i for i, (row, verdict) in enumerate(zip(rows, verdicts)) if row[5:7] != (verdict[2], verdict[1])]
+    with transaction.atomic():
+        update_verdicts(verdicts)
+        move_aggregates(
+            [_state(row, row[5]) for row, _ in moved],
+            [_state(row, decision) for row, decision in moved],
+        )
+        PanelAssessment.objects.bulk_create([
+            PanelAssessment(panel_id=rows[i][0], threshold_version=version, source=PanelAssessment.SOURCE_RESCORE,
+                            **history_fields(result, i))
+            for i in changed
+        ], batch_size=1000)
+    return start, len(verdicts)
+
+
+def _close_connections():
+    # forked workers must not share the parent's DB socket
+    connections.close_all()
+
+
+class Checkpoint:
+    """
+    Completed chunk starts for one re-scoring run, flushed to a JSON file
+    after every chunk so an interrupted run can resume where it stopped.
+    """
+
+    def __init__(self, path, version, chunk_size):
+        self.path = path
+        self.version = version
+        self.chunk_size = chunk_size
+        self.done = set()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            state = json.load(f)
+        if state['version'] != self.version or state['chunk_size'] != self.chunk_size:
+            raise ValueError(
+                f"Checkpoint {self.path} belongs to profile v{state['version']} "
+                f"with chunk size {state['chunk_size']}"
+            )
+        self.done = set(state['done'])
+
+    def mark(self, start):
+        self.done.add(start)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.version, 'chunk_size': self.chunk_size,
+                       'done': sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+
+def rescore_fleet(profile, workers=None, chunk_size=20000, checkpoint=None, progress=None):
+    """
+    Re-scores every stored panel against `profile` across a process pool,
+    one id-range chunk per task. Returns the number of panels updated.
+    """
+    bounds = SolarPanels.objects.order_by('id').values_list('id', flat=True)
+    first, last = bounds.first(), bounds.last()
+    if first is None:
+        return 0
+
+    now_year = datetime.datetime.now().year
+    thresholds = profile.as_thresholds()
+    done = checkpoint.done if checkpoint else set()
+    tasks = [
+        (start, start + chunk_size, profile.version, thresholds, now_year)
+        for start in range(first, last + 1, chunk_size)
+        if start not in done
+    ]
+
+    updated = 0
+    _close_connections()
+    context = multiprocessing.get_context('fork')
+    with context.Pool(processes=workers) as pool:
+        for start, count in pool.imap_unordered(rescore_range, tasks):
+            updated += count
+            if checkpoint:
+                checkpoint.mark(start)
+            if progress:
+                progress(start, count)
+    return updated
@@ -0,0 +1,104 @@
+import re
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count, Sum
+from .assessment import DECISIONS
+from .bulk import increment_counts
+from .geogrid import decision_codes, move_panels as move_grid_panels
+from .models import FleetRollup, SolarPanels
+
+UNKNOWN_YEAR = 0                        # installationYear text with no plausible year in it
+ROLLUP_KEYS = ['company', 'installation_year', 'decision']
+GROUP_FIELDS = {'company': 'company', 'year': 'installation_year', 'decision': 'decision'}
+
+_YEAR = re.compile(r'(?<!\d)(19|20)\d{2}(?!\d)')
+
+
+def installation_year(text):
+    """The year in an installationYear value ('2019', '2019-05', ' 2019 '), or UNKNOWN_YEAR."""
+    match = _YEAR.search(str(text or ''))
+    return int(match.group()) if match else UNKNOWN_YEAR
+
+
+def panel_state(panel):
+    """The SolarPanels.AGGREGATE_FIELDS values of a panel, as the aggregates count it."""
+    return {field: getattr(panel, field) for field in SolarPanels.AGGREGATE_FIELDS}
+
+
+def _key(state):
+    return (state['companyName'] or '', installation_year(state['installationYear']),
+            int(decision_codes([state['decision']])[0]))
+
+
+def move_rollups(removed=(), added=()):
+    """Applies panel state changes (dicts from panel_state) to FleetRollup in one upsert per batch."""
+    counts = Counter()
+    for state in removed:
+        counts[_key(state)] -= 1
+    for state in added:
+        counts[_key(state)] += 1
+    rows = sorted((*key, delta) for key, delta in counts.items() if delta)
+    if rows:
+        increment_counts(FleetRollup, ROLLUP_KEYS, 'panels', rows)
+
+
+def move_aggregates(removed=(), added=()):
+    """
+    Moves panels between every aggregate (map grid and fleet rollups):
+    `removed` and `added` are panel_state() dicts as stored before and
+    after the write (None entries are skipped). Call inside the writing
+    transaction so counts and panels commit together.
+    """
+    removed = [state for state in removed if state is not None]
+    added = [state for state in added if state is not None]
+    move_grid_panels([(s['geo_cell'], s['decision']) for s in removed],
+                     [(s['geo_cell'], s['decision']) for s in added])
+    move_rollups(removed, added)
+
+
+def rebuild():
+    """
+    Recounts FleetRollup from SolarPanels with one GROUP BY on the raw
+    columns (years are parsed per distinct value, not per panel).
+    Returns the number of rollup rows written.
+    """
+    counts = Counter()
+    groups = (SolarPanels.objects.order_by().values('companyName', 'installationYear', 'decision')
+              .annotate(n=Count('id')).values_list('companyName', 'installationYear', 'decision', 'n'))
+    for company, year, decision, n in groups:
+        counts[_key({'companyName': company, 'installationYear': year, 'decision': decision})] += n
+    with transaction.atomic():
+        FleetRollup.objects.all().delete()
+        increment_counts(FleetRollup, ROLLUP_KEYS, 'panels', sorted((*key, n) for key, n in counts.items()))
+    return len(counts)
+
+
+def rollup(group_by, company=None, year_from=None, year_to=None, decisions=None):
+    """
+    Panel counts summed over FleetRollup, grouped by any of 'company',
+    'year' and 'decision' (no grouping gives the fleet total). The table
+    holds one row per distinct combination, so the cost does not grow
+    with the number of panels.
+    """
+    rows = FleetRollup.objects.all()
+    if company is not None:
+        rows = rows.filter(company=company)
+    if year_from is not None:
+        rows = rows.filter(installation_year__gte=year_from)
+    if year_to is not None:
+        rows = rows.filter(installation_year__lte=year_to)
+    if decisions is not None:
+        rows = rows.filter(decision__in=decisions)
+    fields = [GROUP_FIELDS[name] for name in group_by]
+    if not fields:
+        return [{'panels': rows.aggregate(panels=Sum('panels'))['panels'] or 0}]
+    results = []
+    for row in rows.values(*fields).annotate(total=Sum('panels')).filter(total__gt=0).order_by(*fields):
+        result = {name: row[GROUP_FIELDS[name]] for name in group_by}
+        if 'decision' in result:
+            result['decision'] = DECISIONS[result['decision']]
+        if result.get('year') == UNKNOWN_YEAR:
+            result['year'] = None
+        result['panels'] = row['total']
+        results.append(result)
+    return results
@@ -0,0 +1,257 @@
+import bisect
+import datetime
+import re
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from .models import DataVersion, ManufacturerData, ManufacturerDeletion
+from .signals import MANUFACTURER_DATA
+
+# (field, weight): a model-name hit ranks above the same hit in a series or company name
+FIELD_WEIGHTS = (('model_name', 1.0), ('series_name', 0.85), ('name', 0.8))
+COMPACT_WEIGHT = 0.95                   # model name with separators removed: "JKM540M-72HL4" -> "jkm540m72hl4"
+FUZZY_WEIGHT = 0.7
+FUZZY_MIN_SIMILARITY = 0.4              # trigram Jaccard
+FUZZY_MIN_LENGTH = 3
+MAX_FUZZY_TERMS = 50                    # per query token
+DELTA_REBUILD_ROWS = 2000               # changed rows kept in the delta index before a full rebuild
+RESOLVE_MIN_SCORE = 0.75
+CLOCK_SKEW = datetime.timedelta(seconds=5)
+TOMBSTONE_RETENTION = datetime.timedelta(days=7)  # an index not synced for longer is rebuilt
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+_FIELDS = ('id', 'name', 'series_name', 'model_name')
+
+
+def tokenize(text):
+    return _TOKEN.findall((text or '').lower())
+
+
+def trigrams(term):
+    padded = f'${term}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TermIndex:
+    """
+    Immutable search index over (id, name, series_name, model_name) rows.
+
+    The term dictionary is a sorted array, i.e. a flattened prefix trie: all
+    terms under a prefix form one contiguous range found by two bisects, and
+    because postings are stored in term order (CSR layout), all documents
+    under that prefix are one contiguous slice of `post_docs`. Typos are
+    caught through trigram -> term postings.
+    """
+
+    def __init__(self, rows):
+        self.doc_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.labels = [row[1:] for row in rows]
+        self.live = np.ones(len(rows), dtype=bool)
+
+        postings = {}
+        for doc, row in enumerate(rows):
+            fields = dict(zip(_FIELDS, row))
+            for field, weight in FIELD_WEIGHTS:
+                for term in tokenize(fields[field]):
+                    docs = postings.setdefault(term, {})
+                    if docs.get(doc, 0.0) < weight:
+                        docs[doc] = weight
+            compact = ''.join(tokenize(fields['model_name']))
+            if compact:
+                docs = postings.setdefault(compact, {})
+                if docs.get(doc, 0.0) < COMPACT_WEIGHT:
+                    docs[doc] = COMPACT_WEIGHT
+
+        self.terms = sorted(postings)
+        self.term_lengths = np.array([len(term) for term in self.terms], dtype=np.float32)
+        counts = np.array([len(postings[term]) for term in self.terms], dtype=np.int64)
+        self.offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+        self.post_docs = np.fromiter(
+            (doc for term in self.terms for doc in postings[term]), dtype=np.int32, count=int(self.offsets[-1]))
+        self.post_weights = np.fromiter(
+            (w for term in self.terms for w in postings[term].values()), dtype=np.float32, count=int(self.offsets[-1]))
+
+        by_trigram = {}
+        for t, term in enumerate(self.terms):
+            for gram in trigrams(term):
+                by_trigram.setdefault(gram, []).append(t)
+        self.trigram_terms = {gram: np.array(ids, dtype=np.int32) for gram, ids in by_trigram.items()}
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def kill(self, ids):
+        """Hides documents (changed or deleted rows) from results."""
+        if ids:
+            self.live &= ~np.isin(self.doc_ids, np.fromiter(ids, dtype=np.int64, count=len(ids)))
+
+    def _prefix_range(self, token):
+        return bisect.bisect_left(self.terms, token), bisect.bisect_left(self.terms, token + '￿')
+
+    def _add_terms(self, best, term_ids, term_scores):
+        """best[doc] = max(best[doc], term score * field weight) over the terms' postings."""
+        starts, stops = self.offsets[term_ids], self.offsets[term_ids + 1]
+        lengths = stops - starts
+        if not lengths.sum():
+            return
+        index = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        np.maximum.at(best, self.post_docs[index], self.post_weights[index] * np.repeat(term_scores, lengths))
+
+    def _add_range(self, best, lo, hi, term_scores):
+        s, e = self.offsets[lo], self.offsets[hi]
+        lengths = np.diff(self.offsets[lo:hi + 1])
+        np.maximum.at(best, self.post_docs[s:e], self.post_weights[s:e] * np.repeat(term_scores, lengths))
+
+    def _fuzzy_terms(self, token):
+        # the query is scored as a prefix: no end-of-word trigram, and the
+        # term only counts up to the query's length
+        grams = trigrams(token)
+        grams.discard(f'{token[-2:]}$')
+        hits = [self.trigram_terms[g] for g in grams if g in self.trigram_terms]
+        if not hits:
+            return None, None
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.terms))
+        candidates = np.flatnonzero(shared)
+        common = shared[candidates]
+        similarity = common / (len(grams) + np.minimum(self.term_lengths[candidates], len(token)) - common)
+        keep = similarity >= FUZZY_MIN_SIMILARITY
+        candidates, similarity = candidates[keep], similarity[keep]
+        if len(candidates) > MAX_FUZZY_TERMS:
+            top = np.argpartition(-similarity, MAX_FUZZY_TERMS)[:MAX_FUZZY_TERMS]
+            candidates, similarity = candidates[top], similarity[top]
+        return candidates, similarity
+
+    def token_scores(self, token, fuzzy=True):
+        """
+        Best score of every document for one query token. Prefix hits score
+        by how much of the term was typed; only a token that is no term's
+        prefix falls back to trigram near-misses.
+        """
+        best = np.zeros(len(self.doc_ids), dtype=np.float32)
+        lo, hi = self._prefix_range(token)
+        if hi > lo:
+            # an exact term scores 1.0, longer completions less
+            self._add_range(best, lo, hi, 0.5 + 0.5 * len(token) / self.term_lengths[lo:hi])
+        elif fuzzy and len(token) >= FUZZY_MIN_LENGTH:
+            terms, similarity = self._fuzzy_terms(token)
+            if terms is not None and len(terms):
+                self._add_terms(best, terms, FUZZY_WEIGHT * similarity)
+        return best
+
+    def search(self, tokens, limit):
+        """[(score, row id, (name, series_name, model_name))], best first."""
+        if not tokens or not len(self.doc_ids):
+            return []
+        total = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for token in tokens:
+            total += self.token_scores(token)
+        total /= len(tokens)
+        if len(tokens) > 1:
+            # "jkm 540" should also find the compact model term "jkm540m72hl4"
+            total = np.maximum(total, self.token_scores(''.join(tokens), fuzzy=False))
+        total[~self.live] = 0.0
+        hits = np.flatnonzero(total > 0)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-total[hits], limit)[:limit]]
+        hits = hits[np.argsort(-total[hits], kind='stable')]
+        return [(float(total[d]), int(self.doc_ids[d]), self.labels[d]) for d in hits]
+
+
+class ManufacturerSearch:
+    """
+    Process-wide manufacturer/model index. Built on first use (or at startup
+    from wsgi.py, before gunicorn forks). Every `check_seconds` a query looks
+    at the manufacturer_data DataVersion; when it moved, rows updated since
+    the last sync go into a small delta index and their old entries are
+    hidden (deleted rows are found through ManufacturerDeletion
+    tombstones), so edits show up without rebuilding 100k rows. A bulk change
+    past DELTA_REBUILD_ROWS triggers a full rebuild.
+    """
+
+    def __init__(self, check_seconds=2.0):
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._main = None
+        self._delta = None
+        self._delta_ids = set()
+        self._version = None
+        self._synced_at = None
+        self._checked_at = 0.0
+
+    def build(self):
+        version = DataVersion.current(MANUFACTURER_DATA)
+        synced_at = timezone.now()
+        ManufacturerDeletion.objects.filter(deleted_at__lt=synced_at - TOMBSTONE_RETENTION).delete()
+        main = TermIndex(list(ManufacturerData.objects.order_by('id').values_list(*_FIELDS)))
+        self._main, self._delta, self._delta_ids = main, None, set()
+        self._version, self._synced_at = version, synced_at
+
+    def _refresh(self):
+        version = DataVersion.current(MANUFACTURER_DATA)
+        if version == self._version:
+            return
+        synced_at = timezone.now()
+        if synced_at - self._synced_at > TOMBSTONE_RETENTION - CLOCK_SKEW:
+            # older tombstones may be pruned already
+            self.build()
+            return
+        since = self._synced_at - CLOCK_SKEW
+        changed = set(ManufacturerData.objects.filter(updated_at__gte=since).values_list('id', flat=True))
+        deleted = set(ManufacturerDeletion.objects.filter(deleted_at__gte=since)
+                      .values_list('manufacturer_id', flat=True))
+        delta_ids = (self._delta_ids | changed) - deleted
+        if len(delta_ids) > DELTA_REBUILD_ROWS:
+            self.build()
+            return
+        rows = list(ManufacturerData.objects.filter(id__in=delta_ids).order_by('id').values_list(*_FIELDS))
+        self._main.kill(changed | deleted)
+        self._delta, self._delta_ids = TermIndex(rows), delta_ids
+        self._version, self._synced_at = version, synced_at
+
+    def ensure_fresh(self):
+        now = time.monotonic()
+        if self._main is not None and now - self._checked_at < self.check_seconds:
+            return
+        with self._lock:
+            if self._main is None:
+                self.build()
+            elif now - self._checked_at >= self.check_seconds:
+                self._refresh()
+            self._checked_at = now
+
+    def search(self, query, limit=10):
+        """Ranked matches for a free-text query, as dicts with a 0-1 `score`."""
+        self.ensure_fresh()
+        tokens = tokenize(query)
+        main, delta = self._main, self._delta
+        hits = main.search(tokens, limit)
+        if delta is not None:
+            hits = sorted(hits + delta.search(tokens, limit), key=lambda hit: -hit[0])[:limit]
+        return [
+            {'id': row_id, 'name': name, 'series_name': series, 'model_name': model, 'score': round(score, 4)}
+            for score, row_id, (name, series, model) in hits
+        ]
+
+    def resolve(self, company_name, model_name):
+        """
+        ManufacturerData id for a panel's companyName/modelName, or None when
+        no row matches confidently. The company breaks ties between vendors
+        that reuse a model code.
+        """
+        if not model_name:
+            return None
+        company = set(tokenize(company_name)) - {'unknown'}
+        best = None
+        for hit in self.search(model_name, limit=5):
+            if hit['score'] < RESOLVE_MIN_SCORE:
+                break
+            if not company or company & set(tokenize(hit['name'])):
+                return hit['id']
+            best = best or hit['id']
+        return best
+
+
+manufacturer_search = ManufacturerSearch(getattr(settings, 'SEARCH_INDEX_CHECK_SECONDS', 2.0))
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import *
 from django.contrib.auth import authenticate
+from .chunked import resolve_uploads
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -36,4 +37,46 @@ class ContactFormSerializer(serializers.ModelSerializer):
 class ManufacturerDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = ManufacturerData
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__'
+
+class DonationSerializer(serializers.ModelSerializer):
+    # completed chunked uploads can stand in for the image files
+    waste_image_upload = serializers.UUIDField(write_only=True, required=False)
+    site_image_upload = serializers.UUIDField(write_only=True, required=False)
+
+    class Meta:
+        model = Donation
+        fields = '__all__'
+        read_only_fields = ['status']
+
+    def validate(self, data):
+        upload_fields = {'waste_image_upload': 'waste_image', 'site_image_upload': 'site_image'}
+        uploads = resolve_uploads([data.get(field) for field in upload_fields], self.context['request'].user)
+        for field, image_field in upload_fields.items():
+            upload_id = data.pop(field, None)
+            if upload_id is None:
+                continue
+            upload = uploads.get(str(upload_id))
+            if upload is None:
+                raise serializers.ValidationError({field: "Unknown or incomplete upload"})
+            data[image_field] = upload.blob.file.name
+        return data
+
+class TelemetryAlertSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TelemetryAlert
+        fields = '__all__'
+
+class PanelAssessmentSerializer(serializers.ModelSerializer):
+    decision = serializers.CharField(source='get_decision_display')
+    damage_type = serializers.CharField(source='get_damage_type_display')
+    source = serializers.CharField(source='get_source_display')
+
+    class Meta:
+        model = PanelAssessment
+        fields = '__all__'
+
+class TyphoonEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TyphoonEvent
+        fields = '__all__'
@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import (
+    DamageType, DataVersion, InspectionType, ManufacturerData, ManufacturerDeletion, MaterialRecovery, SolarPanels,
+    ThermalRiskInspection,
+)
+
+MANUFACTURER_DATA = 'manufacturer_data'
+PANEL_GRID = 'panel_grid'
+REFERENCE_DATA = 'reference_data'       # lookup tables cached by routes.reference
+
+
+def bump_after_commit(name):
+    """
+    Bumps a DataVersion once the surrounding transaction commits
+    (immediately outside one). An import saving thousands of rows in one
+    transaction queues a single bump, not one per row.
+    """
+    connection = transaction.get_connection()
+    queued = (getattr(func, 'data_version', None) for _, func, _ in connection.run_on_commit)
+    if name in queued:
+        return
+
+    def bump():
+        DataVersion.bump(name)
+    bump.data_version = name
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=ManufacturerData)
+@receiver(post_delete, sender=ManufacturerData)
+def manufacturer_data_changed(sender, **kwargs):
+    bump_after_commit(MANUFACTURER_DATA)
+
+
+@receiver(post_delete, sender=ManufacturerData)
+def manufacturer_data_deleted(sender, instance, **kwargs):
+    ManufacturerDeletion.objects.create(manufacturer_id=instance.pk)
+
+
+@receiver(post_save, sender=MaterialRecovery)
+@receiver(post_delete, sender=MaterialRecovery)
+@receiver(post_save, sender=ThermalRiskInspection)
+@receiver(post_delete, sender=ThermalRiskInspection)
+@receiver(m2m_changed, sender=ThermalRiskInspection.inspection_type.through)
+@receiver(post_save, sender=DamageType)
+@receiver(post_delete, sender=DamageType)
+@receiver(post_save, sender=InspectionType)
+@receiver(post_delete, sender=InspectionType)
+def reference_data_changed(sender, **kwargs):
+    bump_after_commit(REFERENCE_DATA)
+
+
+@receiver(pre_save, sender=SolarPanels)
+def panel_loading(sender, instance, raw=False, **kwargs):
+    # panels not loaded with every aggregate field look up what is stored
+    if not raw and instance.pk is not None and not hasattr(instance, '_stored_state'):
+        instance._stored_state = (SolarPanels.objects.filter(pk=instance.pk)
+                                  .values(*SolarPanels.AGGREGATE_FIELDS).first())
+
+
+@receiver(post_save, sender=SolarPanels)
+def panel_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    from .rollups import move_aggregates, panel_state
+    if raw:
+        return
+    old = None if created else getattr(instance, '_stored_state', None)
+    new = panel_state(instance)
+    if old is not None and update_fields is not None:
+        new = {field: new[field] if field in update_fields else old[field] for field in new}
+    if old != new:
+        move_aggregates([old], [new])
+    instance._stored_state = new
+
+
+@receiver(post_delete, sender=SolarPanels)
+def panel_deleted(sender, instance, **kwargs):
+    from .rollups import move_aggregates, panel_state
+    move_aggregates([getattr(instance, '_stored_state', None) or panel_state(instance)])
@@ -0,0 +1,161 @@
+import hashlib
+import math
+import re
+
+# typed shadows of ManufacturerData's free-text spec columns:
+# API name -> (source field, which number of the text to keep, int/float)
+SPEC_FIELDS = {
+    'cells_per_module': ('cells_per_module', 'first', int),
+    'power_range_min': ('power_range_wp', 'min', float),
+    'power_range_max': ('power_range_wp', 'max', float),
+    'pmax': ('pmax', 'first', float),
+    'efficiency': ('efficiency', 'first', float),
+    'warranty_years': ('warranty_years', 'first', int),
+    'primary_years': ('primary_years', 'first', int),
+    'output_power_percent': ('output_power_percent', 'first', float),
+    'max_power_temp_coeff': ('max_power_temp_coeff', 'first', float),
+    'voc_temp_coeff': ('voc_temp_coeff', 'first', float),
+    'isc_temp_coeff': ('isc_temp_coeff', 'first', float),
+    'cable_length_mm': ('cable_length_mm', 'first', int),
+}
+
+# free-text catalogue columns of ManufacturerData, in import and content-hash order
+CATALOGUE_FIELDS = (
+    'name', 'country', 'series_name', 'model_name', 'panel_type', 'cell_type', 'cells_per_module',
+    'power_range_wp', 'pmax', 'efficiency', 'warranty_years', 'primary_years', 'output_power_percent',
+    'max_power_temp_coeff', 'voc_temp_coeff', 'isc_temp_coeff', 'front_glass', 'frame_type', 'junction_box',
+    'cable_length_mm', 'pdf_download_url', 'product_url', 'contact_url', 'status', 'last_updated',
+)
+
+_NUMBER = re.compile(r'[-+−]?\d+(?:[.,]\d+)*')
+_THOUSANDS = re.compile(r'^[-+]?\d{1,3}(?:,\d{3})+$')
+_UNIT_HOURS = (('week', 168.0), ('day', 24.0), ('hour', 1.0), ('hr', 1.0), ('min', 1 / 60.0))
+
+
+def spec_column(name):
+    """Model field holding the parsed value of SPEC_FIELDS[name]."""
+    return f'{name}_num'
+
+
+def _to_float(token):
+    token = token.replace('−', '-')
+    if _THOUSANDS.match(token):
+        token = token.replace(',', '')    # 1,200 (mm)
+    else:
+        token = token.replace(',', '.')   # 21,3 (%)
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def parse_numbers(text):
+    """Every number in a spec string: '-0.34 %/°C' -> [-0.34], '400-450 W' -> [400.0, 450.0]."""
+    if text is None:
+        return []
+    text = str(text)
+    numbers = []
+    for match in _NUMBER.finditer(text):
+        token = match.group()
+        # the dash in "400-450" or "400 - 450" is a range separator, not a sign
+        if token[0] in '-−' and text[:match.start()].rstrip()[-1:].isdigit():
+            token = token[1:]
+        value = _to_float(token)
+        if value is not None:
+            numbers.append(value)
+    return numbers
+
+
+def duration_hours(text, default=None):
+    """
+    Hours in a free-text duration ("15-20 min", "Within 24 hours",
+    "Immediate"); the largest number counts. None/default when unreadable.
+    """
+    if not text:
+        return default
+    lowered = str(text).lower()
+    if 'immediate' in lowered:
+        return 0.0
+    numbers = parse_numbers(lowered)
+    if not numbers:
+        return default
+    unit = next((hours for name, hours in _UNIT_HOURS if re.search(name, lowered)), 1.0)
+    return max(numbers) * unit
+
+
+def spec_values(instance):
+    """{shadow column: parsed value or None} for a ManufacturerData row."""
+    parsed = {}
+    values = {}
+    for name, (source, part, kind) in SPEC_FIELDS.items():
+        if source not in parsed:
+            parsed[source] = parse_numbers(getattr(instance, source))
+        numbers = parsed[source]
+        if not numbers:
+            value = None
+        elif part == 'min':
+            value = min(numbers)
+        elif part == 'max':
+            value = max(numbers)
+        else:
+            value = numbers[0]
+        if value is not None and name == 'efficiency' and 0 < value <= 1:
+            value *= 100.0                # fractions ("0.213") are stored as percent
+        if value is not None and kind is int:
+            value = int(round(value))
+        values[spec_column(name)] = value
+    return values
+
+
+def catalogue_hash(values):
+    """
+    16 hex digits of blake2b over a row's CATALOGUE_FIELDS values (a
+    sequence in that order). Blank and missing values hash alike.
+    """
+    text = '\x1f'.join('' if value is None else str(value).strip() for value in values)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+TEXT_FILTERS = ('name', 'country', 'panel_type', 'cell_type')
+ORDERING_FIELDS = ('created_at', *SPEC_FIELDS)
+
+
+def filter_specs(queryset, params):
+    """
+    Applies ?<spec>_min= / ?<spec>_max= range filters on the typed columns
+    (any number of them, combined with AND) and case-insensitive exact
+    matches on TEXT_FILTERS. Raises ValueError on a malformed value.
+    """
+    for name, (_, _, kind) in SPEC_FIELDS.items():
+        for suffix, lookup in (('_min', 'gte'), ('_max', 'lte')):
+            raw = params.get(name + suffix)
+            if raw in (None, ''):
+                continue
+            try:
+                value = float(raw)
+            except ValueError:
+                value = math.nan
+            if not math.isfinite(value):
+                # inf would overflow int() and nan matches nothing
+                raise ValueError(f"{name}{suffix} must be a finite number")
+            if kind is int:
+                # integer columns: a fractional bound must not widen the range
+                value = math.ceil(value) if lookup == 'gte' else math.floor(value)
+            queryset = queryset.filter(**{f'{spec_column(name)}__{lookup}': value})
+    for name in TEXT_FILTERS:
+        if params.get(name):
+            queryset = queryset.filter(**{f'{name}__iexact': params[name]})
+    return queryset
+
+
+def spec_ordering(params):
+    """
+    Model ordering for ?ordering=<field> or -<field>, default newest first.
+    Returns (ordering, column that must be non-null for keyset paging).
+    """
+    raw = params.get('ordering') or '-created_at'
+    name = raw.lstrip('-')
+    if name not in ORDERING_FIELDS:
+        raise ValueError(f"ordering must be one of {', '.join(ORDERING_FIELDS)}, optionally prefixed with -")
+    column = name if name == 'created_at' else spec_column(name)
+    return ('-' if raw.startswith('-') else '') + column, column
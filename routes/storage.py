@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from .models import ImageBlob
+
+BLOB_PREFIX = 'solar_panels/cas/'
+
+
+class Sha256UploadMixin:
+    """
+    Hashes each uploaded file while it streams in and exposes the digest as
+    `uploaded_file.sha256`, so nothing has to re-read the bytes afterwards.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # set before super(): the memory handler raises StopFutureHandlers from new_file
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        if remaining is None:
+            # this handler consumed the chunk
+            self.sha256.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        file_obj = super().file_complete(file_size)
+        if file_obj is not None:
+            file_obj.sha256 = self.sha256.hexdigest()
+        return file_obj
+
+
+class HashingMemoryFileUploadHandler(Sha256UploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(Sha256UploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def file_sha256(f):
+    """Digest recorded by the upload handlers, or computed from the file as a fallback."""
+    digest = getattr(f, 'sha256', None)
+    if digest is None:
+        h = hashlib.sha256()
+        for chunk in f.chunks():
+            h.update(chunk)
+        digest = h.hexdigest()
+        f.sha256 = digest
+    return digest
+
+
+def blob_name(digest, file_name):
+    ext = os.path.splitext(file_name or '')[1].lower()
+    return f"{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def store_blobs(files):
+    """
+    Content-addressed storage for uploaded files: identical bytes are written
+    once and every later upload refers to the same ImageBlob. Returns one
+    blob per file, in order (duplicates inside the batch share a blob).
+    """
+    digests = [file_sha256(f) for f in files]
+    blobs = {blob.sha256: blob for blob in ImageBlob.objects.filter(sha256__in=set(digests))}
+
+    for f, digest in zip(files, digests):
+        if digest in blobs:
+            continue
+        name = blob_name(digest, f.name)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, f)
+        try:
+            with transaction.atomic():
+                blobs[digest] = ImageBlob.objects.create(
+                    sha256=digest, file=name, size=f.size,
+                    content_type=getattr(f, 'content_type', '') or '',
+                )
+        except IntegrityError:
+            # another request stored the same bytes first
+            blobs[digest] = ImageBlob.objects.get(sha256=digest)
+    return [blobs[digest] for digest in digests]
+
+
+def assessment_key(user_id, image_sha256, inputs, threshold_version, year, warranty=None):
+    """
+    Identity of one assessment: same user, same image bytes, same inputs,
+    same rules, same catalogue warranty terms and same year (ages are
+    year-relative) give the same result.
+    """
+    identity = [user_id, image_sha256, {k: str(v) for k, v in inputs.items()}, threshold_version, year]
+    if warranty is not None:
+        identity.append(list(warranty))
+    canonical = json.dumps(identity, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
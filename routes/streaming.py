@@ -0,0 +1,273 @@
+import datetime
+from collections import namedtuple
+import numpy as np
+from django.db.models import Max
+from .assessment import DAMAGE_TYPES, DEFAULT_THRESHOLDS, damage_types_from_temps
+from .models import TelemetryAlert, TelemetryChunk
+from .telemetry import chunk_readings
+
+DEFAULT_WINDOW_SECONDS = 900
+DEFAULT_BUCKET_SECONDS = 60
+REPLAY_CHUNKS_PER_BATCH = 2000
+
+UNKNOWN_CODE = DAMAGE_TYPES.index("Unknown")
+INSPECTION_CODES = (
+    DAMAGE_TYPES.index("Sensor or panel unresponsive"),
+    DAMAGE_TYPES.index("Critical overheating"),
+)
+
+Transition = namedtuple('Transition', [
+    'panel', 'at', 'previous', 'current', 'C1', 'C2', 'T1', 'T2',
+    'send_inspection_request', 'send_reminders',
+])
+
+
+class SlidingWindowEvaluator:
+    """
+    Incremental temperature-rule evaluation over a per-panel sliding window.
+
+    Each panel keeps a ring of `window / bucket` time buckets holding the
+    surface and ambient min/max seen in that bucket; a reading only touches
+    its own bucket, and the window's C1/C2/T1/T2 are the min/max over the
+    live buckets. State lives in (panels, buckets) arrays, so a whole batch
+    of readings is applied with a handful of NumPy ufunc calls. The window
+    slides in bucket steps and readings older than a panel's window are
+    dropped as late.
+
+    update() returns only the panels whose damage type changed. A window
+    with no surface reading ("Unknown") keeps the previous state.
+    """
+
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS, bucket_seconds=DEFAULT_BUCKET_SECONDS,
+                 thresholds=DEFAULT_THRESHOLDS, capacity=1024):
+        if bucket_seconds <= 0 or window_seconds < bucket_seconds:
+            raise ValueError("window_seconds must be at least one bucket_seconds")
+        self.bucket_seconds = int(bucket_seconds)
+        self.buckets = -(-int(window_seconds) // self.bucket_seconds)
+        self.thresholds = thresholds
+        self.late = 0
+        self._rows = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        shape = (capacity, self.buckets)
+        self.panel_ids = np.zeros(capacity, dtype=np.int64)
+        self.bucket_id = np.full(shape, np.iinfo(np.int64).min, dtype=np.int64)
+        self.surface_min = np.full(shape, np.nan, dtype=np.float32)
+        self.surface_max = np.full(shape, np.nan, dtype=np.float32)
+        self.ambient_min = np.full(shape, np.nan, dtype=np.float32)
+        self.ambient_max = np.full(shape, np.nan, dtype=np.float32)
+        self.latest = np.full(capacity, np.iinfo(np.int64).min, dtype=np.int64)  # newest bucket seen
+        self.last_at = np.full(capacity, np.iinfo(np.int64).min, dtype=np.int64)  # newest reading, epoch s
+        self.state = np.zeros(capacity, dtype=np.int8)                           # DAMAGE_TYPES code
+
+    def _grow(self, needed):
+        capacity = len(self.panel_ids)
+        if needed <= capacity:
+            return
+        old = {name: getattr(self, name) for name in (
+            'panel_ids', 'bucket_id', 'surface_min', 'surface_max', 'ambient_min',
+            'ambient_max', 'latest', 'last_at', 'state')}
+        self._allocate(max(needed, capacity * 2))
+        for name, values in old.items():
+            getattr(self, name)[:capacity] = values
+
+    def rows_for(self, panel):
+        """State row of every panel id, adding rows for panels not seen before."""
+        unique, inverse = np.unique(panel, return_inverse=True)
+        rows = np.empty(len(unique), dtype=np.int64)
+        new = []
+        for k, panel_id in enumerate(unique.tolist()):
+            row = self._rows.get(panel_id)
+            if row is None:
+                row = self._rows[panel_id] = len(self._rows)
+                new.append((row, panel_id))
+            rows[k] = row
+        if new:
+            self._grow(len(self._rows))
+            for row, panel_id in new:
+                self.panel_ids[row] = panel_id
+        return rows[inverse]
+
+    def seed_states(self, states):
+        """Starts panels from known states ({panel id: DAMAGE_TYPES code}), e.g. their last alert."""
+        if states:
+            panel = np.fromiter(states.keys(), dtype=np.int64, count=len(states))
+            self.state[self.rows_for(panel)] = np.fromiter(states.values(), dtype=np.int8, count=len(states))
+
+    def seen_until(self, panel_id):
+        """Epoch of the newest reading applied for a panel, or None."""
+        row = self._rows.get(panel_id)
+        return None if row is None else int(self.last_at[row])
+
+    def update(self, panel, epoch, surface, ambient):
+        """
+        Applies a batch of readings (parallel arrays; NaN marks a missing
+        surface or ambient value) and re-evaluates the touched panels.
+        Returns the list of Transitions.
+        """
+        if not len(panel):
+            return []
+        rows = self.rows_for(np.asarray(panel, dtype=np.int64))
+        epoch = np.asarray(epoch, dtype=np.int64)
+        bucket = epoch // self.bucket_seconds
+        np.maximum.at(self.latest, rows, bucket)
+        np.maximum.at(self.last_at, rows, epoch)
+
+        live = bucket > self.latest[rows] - self.buckets
+        if not live.all():
+            self.late += int((~live).sum())
+            rows, bucket = rows[live], bucket[live]
+            surface, ambient = np.asarray(surface)[live], np.asarray(ambient)[live]
+        slot = bucket % self.buckets
+
+        # a slot still holding an older bucket is recycled before use
+        stale = self.bucket_id[rows, slot] < bucket
+        if stale.any():
+            r, s = rows[stale], slot[stale]
+            self.bucket_id[r, s] = bucket[stale]
+            for grid in (self.surface_min, self.surface_max, self.ambient_min, self.ambient_max):
+                grid[r, s] = np.nan
+        index = (rows, slot)
+        np.fmin.at(self.surface_min, index, surface)
+        np.fmax.at(self.surface_max, index, surface)
+        np.fmin.at(self.ambient_min, index, ambient)
+        np.fmax.at(self.ambient_max, index, ambient)
+
+        return self._evaluate(np.unique(rows))
+
+    def window(self, rows):
+        """(C1, C2, T1, T2) over the live buckets of the given rows."""
+        live = self.bucket_id[rows] > (self.latest[rows] - self.buckets)[:, None]
+        # fmin/fmax skip NaN and give NaN for an all-empty window, without warnings
+        return tuple(
+            reduce(np.where(live, grid[rows], np.nan), axis=1).astype(np.float64)
+            for reduce, grid in (
+                (np.fmin.reduce, self.surface_min), (np.fmax.reduce, self.surface_max),
+                (np.fmin.reduce, self.ambient_min), (np.fmax.reduce, self.ambient_max),
+            )
+        )
+
+    def _evaluate(self, rows):
+        c1, c2, t1, t2 = self.window(rows)
+        codes, _ = damage_types_from_temps(c1, c2, t1, t2, self.thresholds)
+        previous = self.state[rows]
+        changed = np.flatnonzero((codes != previous) & (codes != UNKNOWN_CODE))
+        if not changed.size:
+            return []
+        self.state[rows[changed]] = codes[changed]
+
+        transitions = []
+        for k in changed.tolist():
+            row, code = rows[k], int(codes[k])
+            transitions.append(Transition(
+                panel=int(self.panel_ids[row]),
+                at=int(self.last_at[row]),
+                previous=DAMAGE_TYPES[previous[k]],
+                current=DAMAGE_TYPES[code],
+                C1=_nullable(c1[k]), C2=_nullable(c2[k]), T1=_nullable(t1[k]), T2=_nullable(t2[k]),
+                send_inspection_request=code in INSPECTION_CODES,
+                send_reminders=code != 0,
+            ))
+        return transitions
+
+
+def _nullable(value):
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+def feed(evaluator, panel, epoch, surface, ambient):
+    """
+    Applies readings in time order, one bucket step at a time, so a replay
+    sees the same windows the live evaluator would have.
+    """
+    if not len(panel):
+        return []
+    order = np.argsort(epoch, kind='stable')
+    panel, epoch, surface, ambient = panel[order], epoch[order], surface[order], ambient[order]
+    bucket = epoch // evaluator.bucket_seconds
+    cuts = np.flatnonzero(np.diff(bucket)) + 1
+    transitions = []
+    for s, e in zip(np.r_[0, cuts], np.r_[cuts, len(epoch)]):
+        transitions.extend(evaluator.update(panel[s:e], epoch[s:e], surface[s:e], ambient[s:e]))
+    return transitions
+
+
+def replay(evaluator, chunks, on_transitions=None, batch_chunks=REPLAY_CHUNKS_PER_BATCH):
+    """
+    Backtests the evaluator against stored telemetry. `chunks` yields
+    (panel, day, epoch, surface, ambient) in (day, panel) order, as
+    routes.telemetry.iter_chunks does. Chunks are fed in groups to bound
+    memory; the ordering keeps every panel's readings in time order.
+    Returns (readings applied, transitions).
+    """
+    readings = 0
+    transitions = []
+    batch = []
+
+    def flush():
+        nonlocal readings
+        panel = np.concatenate([np.full(len(c[2]), c[0], dtype=np.int64) for c in batch])
+        epoch = np.concatenate([c[2] for c in batch])
+        surface = np.concatenate([c[3] for c in batch])
+        ambient = np.concatenate([c[4] for c in batch])
+        found = feed(evaluator, panel, epoch, surface, ambient)
+        readings += len(panel)
+        if on_transitions is not None:
+            on_transitions(found)
+        else:
+            transitions.extend(found)
+        batch.clear()
+
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_chunks:
+            flush()
+    if batch:
+        flush()
+    return readings, transitions
+
+
+def last_states():
+    """{panel id: DAMAGE_TYPES code} from each panel's most recent alert."""
+    latest = TelemetryAlert.objects.values('panel_id').annotate(last=Max('id')).values('last')
+    return {
+        panel_id: DAMAGE_TYPES.index(state)
+        for panel_id, state in TelemetryAlert.objects.filter(id__in=latest).values_list('panel_id', 'state')
+        if state in DAMAGE_TYPES
+    }
+
+
+def record_transitions(transitions):
+    """Saves transitions as TelemetryAlert rows."""
+    TelemetryAlert.objects.bulk_create([
+        TelemetryAlert(
+            panel_id=t.panel,
+            at=datetime.datetime.fromtimestamp(t.at, tz=datetime.timezone.utc),
+            previous_state=t.previous, state=t.current,
+            c1=t.C1, c2=t.C2, t1=t.T1, t2=t.T2,
+            send_inspection_request=t.send_inspection_request,
+            send_reminders=t.send_reminders,
+        )
+        for t in transitions
+    ], batch_size=1000)
+
+
+def poll_updates(evaluator, since, not_before=None):
+    """
+    Live mode: feeds readings from chunks written since `since` that are
+    newer than what the evaluator has already applied for their panel
+    (and not older than `not_before`, an epoch). Returns the transitions.
+    """
+    batch = []
+    for chunk in TelemetryChunk.objects.filter(updated_at__gte=since, count__gt=0).iterator(chunk_size=500):
+        epoch, surface, ambient = chunk_readings(chunk)
+        cutoff = evaluator.seen_until(chunk.panel_id)
+        if not_before is not None:
+            cutoff = not_before if cutoff is None else max(cutoff, not_before)
+        new = epoch > cutoff if cutoff is not None else np.ones(len(epoch), dtype=bool)
+        if new.any():
+            batch.append((chunk.panel_id, chunk.day, epoch[new], surface[new], ambient[new]))
+    if not batch:
+        return []
+    return replay(evaluator, batch)[1]
@@ -0,0 +1,251 @@
+import csv
+import datetime
+import json
+import numpy as np
+from django.db import transaction
+from .models import SolarPanels, TelemetryChunk, TelemetryHourly
+
+MAX_BATCH_READINGS = 1_000_000
+SECONDS_PER_DAY = 86400
+HOURS_PER_DAY = 24
+UPSERT_BATCH_SIZE = 1000
+ROLLUP_FIELDS = ('surface_min', 'surface_max', 'surface_mean', 'ambient_min', 'ambient_max', 'ambient_mean')
+
+_EPOCH_DAY = datetime.date(1970, 1, 1)
+
+
+class TelemetryError(Exception):
+    pass
+
+
+def _epoch_seconds(value):
+    """Unix seconds from a number or an ISO 8601 timestamp (naive means UTC)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    dt = datetime.datetime.fromisoformat(text)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+
+def text_lines(stream):
+    """Decoded lines of a binary stream (a request body or GzipFile), read incrementally."""
+    for line in stream:
+        yield line.decode('utf-8-sig')
+
+
+def _reading(value):
+    return np.nan if value in (None, '', 'None', 'null') else float(value)
+
+
+def parse_readings(lines, fmt='ndjson'):
+    """
+    Parses a telemetry batch. Every reading has `panel` (SolarPanels id),
+    `timestamp` (ISO 8601 or Unix seconds), and `surface` and/or `ambient`
+    temperatures in degC. CSV needs a header row with those names.
+    Returns (panel, epoch, surface, ambient, rejected line count).
+    """
+    csv_format = fmt == 'csv'
+    panels, epochs, surface, ambient = [], [], [], []
+    rejected = 0
+    try:
+        for record in csv.DictReader(lines) if csv_format else lines:
+            if not csv_format:
+                if not record.strip():
+                    continue
+                try:
+                    record = json.loads(record)
+                except ValueError:
+                    rejected += 1
+                    continue
+            try:
+                p, t = int(record['panel']), _epoch_seconds(record['timestamp'])
+                c, a = _reading(record.get('surface')), _reading(record.get('ambient'))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                rejected += 1
+                continue
+            if np.isnan(c) and np.isnan(a):
+                rejected += 1
+                continue
+            panels.append(p)
+            epochs.append(t)
+            surface.append(c)
+            ambient.append(a)
+            if len(panels) > MAX_BATCH_READINGS:
+                raise TelemetryError(f"At most {MAX_BATCH_READINGS} readings per batch")
+    except csv.Error as e:
+        raise TelemetryError(f"Malformed CSV: {e}")
+    return (
+        np.array(panels, dtype=np.int64),
+        np.floor(np.array(epochs, dtype=np.float64)).astype(np.int64),
+        np.array(surface, dtype=np.float32),
+        np.array(ambient, dtype=np.float32),
+        rejected,
+    )
+
+
+def merge_readings(old, new):
+    """
+    Merges two (seconds, surface, ambient) column sets into one sorted by
+    time. A second reported twice keeps the newer reading.
+    """
+    seconds = np.concatenate([old[0], new[0]])
+    surface = np.concatenate([old[1], new[1]])
+    ambient = np.concatenate([old[2], new[2]])
+    order = np.argsort(seconds, kind='stable')
+    seconds, surface, ambient = seconds[order], surface[order], ambient[order]
+    last = np.r_[seconds[1:] != seconds[:-1], True]
+    return seconds[last], surface[last], ambient[last]
+
+
+def hourly_rollups(seconds, surface, ambient):
+    """
+    (24,) arrays of count and surface/ambient min, max and mean for one
+    panel-day; NaN where an hour has no reading of that kind.
+    """
+    hour = seconds // 3600
+    count = np.bincount(hour, minlength=HOURS_PER_DAY)
+    stats = {'count': count}
+    for name, values in (('surface', surface), ('ambient', ambient)):
+        present = ~np.isnan(values)
+        n = np.bincount(hour[present], minlength=HOURS_PER_DAY)
+        total = np.bincount(hour[present], weights=values[present], minlength=HOURS_PER_DAY)
+        lo = np.full(HOURS_PER_DAY, np.nan)
+        hi = np.full(HOURS_PER_DAY, np.nan)
+        np.fmin.at(lo, hour, values)
+        np.fmax.at(hi, hour, values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stats[f'{name}_min'] = lo
+            stats[f'{name}_max'] = hi
+            stats[f'{name}_mean'] = np.where(n > 0, total / np.maximum(n, 1), np.nan)
+    return stats
+
+
+def _nullable(value):
+    return None if np.isnan(value) else float(value)
+
+
+def store_readings(panel, epoch, surface, ambient):
+    """
+    Appends readings to their panel-day chunks and refreshes the hourly
+    rollups of every hour they fall in. Chunk rows are locked while they are
+    merged, so concurrent batches for the same panel-day do not lose data.
+    Returns the number of chunks written.
+    """
+    if not len(panel):
+        return 0
+    day = epoch // SECONDS_PER_DAY
+    seconds = (epoch - day * SECONDS_PER_DAY).astype(np.int32)
+    order = np.lexsort((seconds, day, panel))
+    panel, day, seconds = panel[order], day[order], seconds[order]
+    surface, ambient = surface[order], ambient[order]
+    starts = np.flatnonzero(np.r_[True, (panel[1:] != panel[:-1]) | (day[1:] != day[:-1])])
+    bounds = np.r_[starts, len(panel)]
+    groups = [
+        (int(panel[s]), _EPOCH_DAY + datetime.timedelta(days=int(day[s])), s, e)
+        for s, e in zip(bounds[:-1], bounds[1:])
+    ]
+
+    empty = np.empty(0, dtype=np.float32)
+    with transaction.atomic():
+        # make sure every chunk row exists, then lock them all before merging
+        TelemetryChunk.objects.bulk_create(
+            [TelemetryChunk(panel_id=p, day=d, count=0, seconds=b'', surface=b'', ambient=b'')
+             for p, d, _, _ in groups],
+            ignore_conflicts=True, batch_size=UPSERT_BATCH_SIZE,
+        )
+        keys = {(p, d) for p, d, _, _ in groups}
+        existing = {
+            (chunk.panel_id, chunk.day): chunk
+            for chunk in TelemetryChunk.objects.select_for_update().filter(
+                panel_id__in={p for p, _ in keys}, day__in={d for _, d in keys},
+            ).order_by('pk')
+            if (chunk.panel_id, chunk.day) in keys
+        }
+
+        chunks = []
+        hourly = []
+        for p, d, s, e in groups:
+            chunk = existing[(p, d)]
+            old = chunk.arrays() if chunk.count else (np.empty(0, dtype=np.int32), empty, empty)
+            merged = merge_readings(old, (seconds[s:e], surface[s:e], ambient[s:e]))
+            chunks.append(TelemetryChunk(
+                panel_id=p, day=d, count=len(merged[0]),
+                seconds=merged[0].tobytes(), surface=merged[1].tobytes(), ambient=merged[2].tobytes(),
+            ))
+
+            # only the hours this batch reported into can have changed
+            stats = hourly_rollups(*merged)
+            midnight = datetime.datetime.combine(d, datetime.time(), tzinfo=datetime.timezone.utc)
+            for h in np.unique(seconds[s:e] // 3600):
+                hourly.append(TelemetryHourly(
+                    panel_id=p, hour=midnight + datetime.timedelta(hours=int(h)),
+                    count=int(stats['count'][h]),
+                    **{name: _nullable(stats[name][h]) for name in ROLLUP_FIELDS},
+                ))
+
+        # one upsert per batch instead of an UPDATE per chunk; the rows are locked above
+        TelemetryChunk.objects.bulk_create(
+            chunks, update_conflicts=True, unique_fields=['panel', 'day'],
+            update_fields=['count', 'seconds', 'surface', 'ambient', 'updated_at'],
+            batch_size=UPSERT_BATCH_SIZE,
+        )
+        TelemetryHourly.objects.bulk_create(
+            hourly, update_conflicts=True, unique_fields=['panel', 'hour'],
+            update_fields=['count', *ROLLUP_FIELDS], batch_size=UPSERT_BATCH_SIZE,
+        )
+    return len(chunks)
+
+
+def ingest(lines, fmt, user):
+    """
+    Parses and stores one telemetry batch for `user`'s panels (any panel
+    for staff). Readings for unknown or foreign panels are rejected.
+    Returns a summary dict.
+    """
+    panel, epoch, surface, ambient, rejected = parse_readings(lines, fmt)
+    received = len(panel) + rejected
+    ids = np.unique(panel)
+    allowed = SolarPanels.objects.filter(id__in=ids.tolist())
+    if not user.is_staff:
+        allowed = allowed.filter(user=user)
+    known = np.isin(panel, np.fromiter(allowed.values_list('id', flat=True), dtype=np.int64))
+    rejected += int((~known).sum())
+    panel, epoch, surface, ambient = panel[known], epoch[known], surface[known], ambient[known]
+    chunks = store_readings(panel, epoch, surface, ambient)
+    return {
+        'received': received,
+        'stored': int(len(panel)),
+        'rejected': rejected,
+        'panels': int(len(np.unique(panel))),
+        'chunks': chunks,
+    }
+
+
+def iter_chunks(panel_ids=None, start=None, end=None):
+    """
+    Streams stored chunks in (day, panel) order as
+    (panel_id, day, epoch int64, surface, ambient), with start/end as
+    inclusive UTC dates. Used for replays and exports.
+    """
+    qs = TelemetryChunk.objects.filter(count__gt=0)
+    if panel_ids is not None:
+        qs = qs.filter(panel_id__in=list(panel_ids))
+    if start is not None:
+        qs = qs.filter(day__gte=start)
+    if end is not None:
+        qs = qs.filter(day__lte=end)
+    for chunk in qs.order_by('day', 'panel_id').iterator(chunk_size=500):
+        yield (chunk.panel_id, chunk.day, *chunk_readings(chunk))
+
+
+def chunk_readings(chunk):
+    """(epoch int64, surface, ambient) of a stored chunk."""
+    seconds, surface, ambient = chunk.arrays()
+    midnight = (chunk.day - _EPOCH_DAY).days * SECONDS_PER_DAY
+    return seconds.astype(np.int64) + midnight, surface, ambient
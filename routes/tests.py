@@ -1,3 +1,1522 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+from unittest import mock
+import joblib
+import numpy as np
+import tifffile
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+from skimage.filters import sobel
+from . import chunked, economics, mosaic, recycling, reference
+from .assessment import (DAMAGE_TYPES, DECISIONS, DEFAULT_THRESHOLDS, _safe_float, _safe_int, assess, build_payload,
+                         history_fields, parse_panel_params, stack_params, theoretical_s_values)
+from .bulk import increment_counts, insert_values, update_from_values
+from .catalogue import CatalogueError, CatalogueImport, import_catalogue, read_rows
+from .drone import cluster_stops, plan_inspections, plan_routes
+from .export import export_columns, iter_rows
+from .features import FEATURE_DIM, batch_features, check_classifier, classify_features, extract_features
+from .geo import (CELL_BITS, NEAREST_MAX_KM, bbox_filter, cell_from_indices, cell_ids, cell_indices, geo_cell,
+                  parent_cells, within_radius)
+from .geogrid import MAX_ZOOM, TILE_RECORD, rebuild as rebuild_grid, tile_json
+from .ml_registry import ModelRegistry, registry
+from .models import (CachedAssessment, ChunkedUpload, ContactForm, DataVersion, FleetRollup, ImageBlob, InspectionType,
+                     ManufacturerData, MaterialRecovery, MosaicJob, PanelAssessment, PanelGridCount, SolarPanels,
+                     TelemetryChunk, TelemetryHourly, ThermalRiskInspection, ThresholdProfile, User)
+from .recycling import MATERIALS, estimate, panel_masses, panel_type_code, recovery_vectors, summarize
+from .reference import ReferenceCache
+from .rescoring import Checkpoint, rescore_range
+from .rollups import UNKNOWN_YEAR, installation_year, rebuild as rebuild_rollups, rollup
+from .search import ManufacturerSearch
+from .signals import MANUFACTURER_DATA, PANEL_GRID, REFERENCE_DATA
+from .specs import CATALOGUE_FIELDS, catalogue_hash, filter_specs
+from .storage import BLOB_PREFIX, assessment_key, store_blobs
+from .streaming import SlidingWindowEvaluator, feed
+from .telemetry import chunk_readings, ingest, parse_readings
+from .thermal import analyze_frame, classify_frames, surface_readings
+from .typhoon import KM_PER_DEGREE, TrackError, _candidates, exposure, fan_out, parse_track, track_boxes
+from .warranty import (WarrantyCurveCache, apply_warranty, guaranteed_output, warranty_curve, warranty_summary,
+                       warranty_years)
 
-# Create your tests here.
+NOW_YEAR = 2025
+
+
+def baseline_flowchart(data, now_year=NOW_YEAR, damage_prob=None, label="Unknown"):
+    """
+    The scalar predict_damage flowchart as it stood before routes.assessment
+    vectorized it, kept verbatim (minus the database writes) as the oracle
+    the equivalence tests compare against.
+    """
+    installation_year = _safe_int(data.get('installationYear'), now_year)
+    savings_per_year = _safe_float(data.get('savingsPerYear'), 0.0)
+    maintenance_cost = _safe_float(data.get('maintenanceCost'), 1.0)
+    promised_degradation = _safe_float(data.get('promisedDegradationRate', 0.01), 0.01)
+    current_degradation = _safe_float(data.get('currentDegradationRate', 0.01), 0.01)
+    current_typhoon_speed = _safe_float(data.get('currentTyphoonSpeed', 0.0), 0.0)
+    promised_wind_speed = _safe_float(data.get('promisedWindBearingSpeed', 1.0), 1.0)
+    warranty_age = _safe_int(data.get('warrantyAge', 25), 25)
+    x1 = _safe_int(data.get('sensorAlert', 0), 0)
+    x2 = _safe_int(data.get('typhoonAlert', 0), 0)
+    c1, c2, t1, t2 = (None if data.get(key) in (None, '', 'None') else _safe_float(data.get(key), None)
+                      for key in ('C1', 'C2', 'T1', 'T2'))
+    installed_capacity_kwp = _safe_float(data.get('installedCapacity_kWp', 0.0), 0.0)
+    annual_irradiation = _safe_float(data.get('annualIrradiation', 0.0), 0.0)
+    system_cost = _safe_float(data.get('systemCost', 0.0), 0.0)
+    electricity_rate = _safe_float(data.get('electricityRate', 0.0), 0.0)
+    loss_factor = _safe_float(data.get('lossFactor', 0.10), 0.10)
+    lifetime_years = _safe_int(data.get('lifetimeYears', 25), 25)
+
+    current_age = now_year - installation_year
+
+    if c1 is None or c2 is None:
+        damage_type_temp, temp_notes = "Unknown", "Missing surface temperature readings"
+    elif t1 is not None and t2 is not None and abs(c2 - c1) < 2 and abs(t2 - t1) > 5:
+        damage_type_temp, temp_notes = "Sensor or panel unresponsive", "Surface flat while ambient swings"
+    elif t2 is not None and (c2 - t2) > 25:
+        damage_type_temp, temp_notes = "Critical overheating", "C2-T2 > 25"
+    elif t2 is not None and 0 < (c2 - t2) <= 25:
+        damage_type_temp, temp_notes = "Excessive heating", "Moderate heating vs ambient"
+    elif t1 is not None and (t1 - c1) > 10:
+        damage_type_temp, temp_notes = "Unusual cooling", "T1 - C1 > 10"
+    else:
+        damage_type_temp, temp_notes = "Normal", "Temperatures within expected ranges"
+    if c1 is not None and c2 is not None and c2 < c1:
+        damage_type_temp = "Sensor anomaly (C2 < C1)"
+        temp_notes = "C2 < C1 (max < min) - possible sensor mis-reporting"
+
+    if current_age < 0:
+        current_age = 0
+    if current_age > 25 or current_age > warranty_age:
+        return {
+            'prediction': None,
+            'damage_type': 'End of life / recycle recommended',
+            'decision': 'Recycle Panel',
+            'reason': 'Panel age exceeds lifetime or warranty',
+            'saved_id': None,
+        }
+
+    try:
+        ratio = savings_per_year / max(maintenance_cost, 1e-6)
+        if x1 == 1:
+            S_sensor = ratio * (promised_degradation / (current_degradation * current_age + 1))
+        elif x2 == 1:
+            S_sensor = ratio * ((promised_degradation * promised_wind_speed) /
+                                (current_degradation * current_age * max(1.0, current_typhoon_speed) + 1))
+        else:
+            S_sensor = ratio * (promised_degradation / (current_degradation + current_age + 1))
+    except Exception:
+        S_sensor = None
+
+    S_theoretical = None
+    if installed_capacity_kwp > 0 and annual_irradiation > 0 and lifetime_years > 0 and system_cost > 0:
+        annual_energy = installed_capacity_kwp * annual_irradiation * max(0.0, (1.0 - loss_factor))
+        if annual_energy > 0:
+            cost_per_kwh = system_cost / (annual_energy * lifetime_years)
+            S1 = (electricity_rate - cost_per_kwh)
+            S_theoretical = S1 / (max(1e-6, savings_per_year) / (annual_energy + 1e-6))
+
+    S_candidates = [v for v in (S_sensor, S_theoretical) if v is not None]
+    S_value = float(S_candidates[0] if S_candidates else 0.0)
+
+    if damage_prob is not None:
+        damage_score = 1.0 - damage_prob if label.lower() in ('normal', 'no_damage', 'ok') else damage_prob
+    else:
+        damage_score = float(min(1.0, max(0.0, 2.0 * (1.0 if S_value < 1.0 else 0.5))))
+
+    recommendations = []
+    warranty_active = current_age <= warranty_age
+    if S_value >= 1.0 and damage_score < 0.3 and damage_type_temp == "Normal":
+        decision = "Panel in good condition"
+        recommendations.append("No immediate action required")
+    elif damage_type_temp in ("Critical overheating", "Sensor or panel unresponsive"):
+        if warranty_active:
+            decision = "Replace with warranty"
+            recommendations.append("Issue replacement under warranty; schedule inspection")
+        else:
+            decision = "Replace without warranty"
+            recommendations.append("Recommend replacement; warranty expired")
+        recommendations.append("Schedule urgent inspection (drone or technician)")
+    elif damage_score >= 0.6:
+        if warranty_active:
+            decision = "Replace with warranty"
+            recommendations.append("High damage detected; replace under warranty")
+        else:
+            decision = "Replace without warranty"
+            recommendations.append("High damage detected; recommend replacement")
+    elif 0.3 <= damage_score < 0.6:
+        if warranty_active:
+            decision = "Repair with warranty"
+            recommendations.append("Moderate damage; repair covered under warranty")
+        else:
+            decision = "Repair without warranty"
+            recommendations.append("Moderate damage; repair recommended (out-of-warranty)")
+    else:
+        decision = "Panel in good condition"
+        recommendations.append("Minor / uncertain damage; monitor or request user confirmation")
+
+    typhoon = x2 == 1 or current_typhoon_speed >= 8
+    if typhoon:
+        recommendations.append("Typhoon alert: schedule drone inspection within 48 hours after typhoon")
+    sensor_fault = x1 == 1 and damage_type_temp.startswith("Sensor")
+    if sensor_fault:
+        recommendations.append("Sensor abnormal: request sensor diagnostics and visual inspection")
+
+    return {
+        'prediction_label': label,
+        'damage_probability': damage_prob,
+        'damage_score': damage_score,
+        'damage_type_from_temps': damage_type_temp,
+        'temperature_notes': temp_notes,
+        'S_value': S_value,
+        'S_components': {'sensor_based_S': S_sensor, 'theoretical_S': S_theoretical},
+        'decision': decision,
+        'action_recommendations': recommendations,
+        'send_inspection_request': typhoon,
+        'schedule_drone_inspection': typhoon,
+        'send_reminders': typhoon or sensor_fault,
+        'saved_id': None,
+    }
+
+
+def random_panel(rng):
+    """Raw request parameters covering every flowchart branch, with missing and malformed values mixed in."""
+    def pick(*choices):
+        return rng.choice(choices)
+
+    def number(lo, hi):
+        return str(round(rng.uniform(lo, hi), 2))
+
+    data = {
+        'installationYear': pick(str(rng.randint(NOW_YEAR - 30, NOW_YEAR + 2)), '', 'abc', None),
+        'savingsPerYear': pick(number(0, 2000), '0', None),
+        'maintenanceCost': pick(number(0, 500), '0', None),
+        'promisedDegradationRate': pick(number(0, 0.05), None),
+        'currentDegradationRate': pick(number(0, 0.05), '-1', '0', None),
+        'currentTyphoonSpeed': pick(number(0, 15), '8', None),
+        'promisedWindBearingSpeed': pick(number(0, 3), None),
+        'warrantyAge': pick(str(rng.randint(0, 30)), None),
+        'sensorAlert': pick('0', '1', '2', None),
+        'typhoonAlert': pick('0', '1', None),
+        'C1': pick(number(0, 80), '', 'None', 'x', None),
+        'C2': pick(number(0, 80), '', None),
+        'T1': pick(number(0, 45), '', None),
+        'T2': pick(number(0, 45), None),
+        'installedCapacity_kWp': pick(number(0, 10), '0', None),
+        'annualIrradiation': pick(number(500, 2500), None),
+        'systemCost': pick(number(0, 20000), None),
+        'electricityRate': pick(number(0, 0.4), None),
+        'lossFactor': pick(number(0, 1.2), None),
+        'lifetimeYears': pick(str(rng.randint(0, 40)), None),
+    }
+    return {key: value for key, value in data.items() if value is not None}
+
+
+class AssessmentEquivalenceTests(SimpleTestCase):
+    """routes.assessment must reproduce the scalar flowchart panel for panel."""
+
+    def assertPayloadEqual(self, actual, expected, context):
+        self.assertEqual(actual.keys(), expected.keys(), context)
+        for key, value in expected.items():
+            if isinstance(value, dict):
+                self.assertPayloadEqual(actual[key], value, context)
+            elif isinstance(value, float):
+                self.assertIsNotNone(actual[key], f"{key}: {context}")
+                self.assertTrue(math.isclose(actual[key], value, rel_tol=1e-9, abs_tol=1e-12),
+                                f"{key}: {actual[key]} != {value} for {context}")
+            else:
+                self.assertEqual(actual[key], value, f"{key}: {context}")
+
+    def _compare(self, panels, damage_probs=None, labels=None):
+        n = len(panels)
+        damage_probs = damage_probs or [None] * n
+        labels = labels or ["Unknown"] * n
+        p = stack_params([parse_panel_params(data, NOW_YEAR) for data in panels])
+        result = assess(
+            p, NOW_YEAR,
+            damage_prob=np.array([np.nan if prob is None else prob for prob in damage_probs]),
+            normal_label=np.array([label.lower() in ('normal', 'no_damage', 'ok') for label in labels]),
+        )
+        for i, data in enumerate(panels):
+            expected = baseline_flowchart(data, NOW_YEAR, damage_probs[i], labels[i])
+            actual = build_payload(result, i, labels[i])
+            self.assertPayloadEqual(actual, expected, data)
+
+    def test_random_panels_match_scalar_flowchart(self):
+        rng = random.Random(1)
+        self._compare([random_panel(rng) for _ in range(5000)])
+
+    def test_classifier_scores_match_scalar_flowchart(self):
+        rng = random.Random(2)
+        panels = [random_panel(rng) for _ in range(2000)]
+        probs = [rng.choice([None, rng.random()]) for _ in panels]
+        labels = [rng.choice(["Normal", "Cracked", "Dusty", "ok"]) for _ in panels]
+        self._compare(panels, probs, labels)
+
+    def test_branch_edges(self):
+        base = {'installationYear': str(NOW_YEAR - 5), 'C1': '30', 'C2': '40', 'T1': '30', 'T2': '35'}
+        panels = [
+            base,
+            {**base, 'T2': '15'},                               # C2 - T2 == 25, still excessive heating
+            {**base, 'T2': '14.9'},                             # critical overheating
+            {**base, 'T2': '40'},                               # C2 - T2 == 0
+            {**base, 'C2': '31', 'T1': '20', 'T2': '26'},       # flat surface, swinging ambient
+            {**base, 'C1': '45'},                               # C2 < C1
+            {**base, 'T1': '41', 'T2': None},                   # unusual cooling
+            {**base, 'currentTyphoonSpeed': '8'},
+            {**base, 'sensorAlert': '1', 'C1': '45'},
+            {**base, 'currentDegradationRate': '-1', 'installationYear': str(NOW_YEAR)},  # S_sensor divides by 0
+            {**base, 'installationYear': str(NOW_YEAR - 26)},
+            {**base, 'warrantyAge': '4'},
+            {**base, 'installationYear': str(NOW_YEAR + 3)},
+        ]
+        self._compare([{k: v for k, v in panel.items() if v is not None} for panel in panels])
+
+    def test_thresholds_default_to_flowchart_constants(self):
+        self.assertEqual(DEFAULT_THRESHOLDS.overheat_margin, 25)
+        self.assertEqual(DEFAULT_THRESHOLDS.typhoon_speed_threshold, 8)
+        self.assertEqual((DEFAULT_THRESHOLDS.medium_damage_threshold, DEFAULT_THRESHOLDS.severe_damage_threshold),
+                         (0.3, 0.6))
+
+
+class EconomicsTests(SimpleTestCase):
+    PANEL = {
+        'installationYear': str(NOW_YEAR - 3), 'installedCapacity_kWp': '5', 'annualIrradiation': '1500',
+        'systemCost': '5000', 'electricityRate': '0.15', 'savingsPerYear': '900', 'lifetimeYears': '25',
+        'currentDegradationRate': '0', 'maintenanceCost': '0',
+    }
+
+    def setUp(self):
+        economics._shocks.cache_clear()
+        self.addCleanup(economics._shocks.cache_clear)
+
+    def test_reduces_to_theoretical_s_without_uncertainty(self):
+        constants = dict(PRICE_ESCALATION=0.0, PRICE_VOLATILITY=0.0, IRRADIATION_VARIABILITY=0.0,
+                         DEGRADATION_SPREAD=0.0, LOSS_SPREAD=0.0, DISCOUNT_RATE=0.0)
+        with mock.patch.multiple(economics, **constants):
+            economics._shocks.cache_clear()
+            p = parse_panel_params(self.PANEL, NOW_YEAR)
+            result = economics.simulate(p, 100)
+        expected = theoretical_s_values(stack_params([p]))[0]
+        np.testing.assert_allclose(result['S'], expected, rtol=1e-9)
+
+    def test_summary_percentiles_are_ordered(self):
+        summary = economics.lifetime_economics(parse_panel_params(self.PANEL, NOW_YEAR), 500)
+        self.assertEqual(summary['scenarios'], 500)
+        for name in ('S', 'lcoe', 'npv'):
+            self.assertLessEqual(summary[name]['p10'], summary[name]['p50'])
+            self.assertLessEqual(summary[name]['p50'], summary[name]['p90'])
+        self.assertTrue(0.0 <= summary['probability_S_at_least_1'] <= 1.0)
+
+    def test_incomplete_inputs_have_no_economics(self):
+        self.assertIsNone(economics.lifetime_economics(parse_panel_params({'systemCost': '5000'}, NOW_YEAR)))
+
+
+class RescoreTests(TestCase):
+    INPUTS = {'C1': '30', 'C2': '50', 'T1': '30', 'T2': '30', 'warrantyAge': '25'}
+
+    def setUp(self):
+        self.user = User.objects.create(email='rescore@example.com', name='rescore')
+        self.panels = [
+            SolarPanels.objects.create(user=self.user, companyName='x', installationYear=str(NOW_YEAR - 2),
+                                       assessment_inputs=self.INPUTS, decision='Replace with warranty',
+                                       damage_type='Excessive heating'),
+            SolarPanels.objects.create(user=self.user, companyName='x', installationYear=str(NOW_YEAR - 2)),
+        ]
+
+    def test_profiles_are_numbered_and_one_is_active(self):
+        first = ThresholdProfile.objects.create(name='a', is_active=True)
+        second = ThresholdProfile.objects.create(name='b', is_active=True)
+        first.refresh_from_db()
+        self.assertEqual((first.version, second.version), (1, 2))
+        self.assertFalse(first.is_active)
+        self.assertEqual(ThresholdProfile.active(), second)
+
+    def test_rescore_range_applies_the_profile(self):
+        profile = ThresholdProfile.objects.create(overheat_margin=10, is_active=True)
+        start, count = rescore_range((self.panels[0].id, self.panels[-1].id + 1, profile.version,
+                                      profile.as_thresholds(), NOW_YEAR))
+        self.assertEqual((start, count), (self.panels[0].id, 1))
+        panel = SolarPanels.objects.get(id=self.panels[0].id)
+        self.assertEqual((panel.damage_type, panel.decision, panel.threshold_version),
+                         ('Critical overheating', 'Replace with warranty', profile.version))
+        history = PanelAssessment.objects.get(panel=panel)
+        self.assertEqual((history.source, history.threshold_version), (PanelAssessment.SOURCE_RESCORE, profile.version))
+        # panels saved without inputs are left alone
+        self.assertIsNone(SolarPanels.objects.get(id=self.panels[1].id).threshold_version)
+
+        # an unchanged verdict is rewritten but adds no history row
+        rescore_range((self.panels[0].id, self.panels[0].id + 1, profile.version, profile.as_thresholds(), NOW_YEAR))
+        self.assertEqual(PanelAssessment.objects.filter(panel=panel).count(), 1)
+
+    def test_checkpoint_round_trip(self):
+        path = os.path.join(tempfile.mkdtemp(), 'rescore.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        checkpoint = Checkpoint(path, 3, 100)
+        checkpoint.mark(1)
+        checkpoint.mark(101)
+        resumed = Checkpoint(path, 3, 100)
+        resumed.load()
+        self.assertEqual(resumed.done, {1, 101})
+        with self.assertRaises(ValueError):
+            Checkpoint(path, 4, 100).load()
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, 'model.pkl')
+
+    def dump(self, value, path=None):
+        tmp = os.path.join(self.root, 'new.pkl')
+        joblib.dump({'weights': np.full(1000, value, dtype=np.float64)}, tmp)
+        os.replace(tmp, path or self.path)
+
+    def test_arrays_are_memory_mapped_and_hot_swapped(self):
+        self.dump(1.0)
+        registry = ModelRegistry(reload_check_seconds=0)
+        registry.register('m', self.path)
+        model = registry.get('m')
+        self.assertIsInstance(model['weights'], np.memmap)
+        self.assertEqual(registry.stats()['m']['mapped_array_bytes'], 8000)
+
+        self.dump(2.0)
+        self.assertEqual(registry.get('m')['weights'][0], 2.0)
+
+        # an unreadable replacement keeps the loaded version serving
+        with open(os.path.join(self.root, 'broken.pkl'), 'wb') as f:
+            f.write(b'not a pickle')
+        os.replace(os.path.join(self.root, 'broken.pkl'), self.path)
+        self.assertEqual(registry.get('m')['weights'][0], 2.0)
+
+    def test_missing_models(self):
+        registry = ModelRegistry(reload_check_seconds=0)
+        registry.register('m', self.path)
+        self.assertIsNone(registry.get('m'))
+        self.assertIsNone(registry.get('unregistered'))
+        self.assertFalse(registry.stats()['m']['loaded'])
+
+    def test_reload_checks_are_throttled(self):
+        self.dump(1.0)
+        registry = ModelRegistry(reload_check_seconds=3600)
+        registry.register('m', self.path)
+        registry.warm()
+        self.dump(2.0)
+        self.assertEqual(registry.get('m')['weights'][0], 1.0)
+        registry.swap('m', self.path)
+        self.assertEqual(registry.get('m')['weights'][0], 2.0)
+
+
+class FeatureTests(SimpleTestCase):
+    def baseline_features(self, img):
+        # the commented-out scalar extract_image_features_from_array plus the edge pair from predict_damage
+        flat = img.reshape(-1, 3)
+        lum = img.mean(axis=2)
+        edges = sobel(img.mean(axis=-1))
+        return np.concatenate([
+            flat.mean(axis=0), flat.std(axis=0),
+            [flat.mean(), flat.std(), (lum < 0.1).sum() / lum.size, (lum > 0.9).sum() / lum.size],
+            [edges.mean(), (edges > edges.mean()).sum() / edges.size],
+        ])
+
+    def test_batch_matches_scalar_features(self):
+        rng = np.random.default_rng(5)
+        stack = rng.integers(0, 256, (4, 128, 128, 3), dtype=np.uint8)
+        stack[1] = 0
+        stack[2, :, :64] = 255
+        features = batch_features(stack)
+        self.assertEqual(features.shape, (4, FEATURE_DIM))
+        for i, img in enumerate(stack):
+            np.testing.assert_allclose(features[i], self.baseline_features(img / 255.0), rtol=1e-4, atol=1e-6)
+
+    def test_undecodable_images_get_a_zero_row(self):
+        buffer = io.BytesIO()
+        Image.fromarray(np.full((300, 400, 3), 200, dtype=np.uint8)).save(buffer, 'JPEG')
+        good = SimpleUploadedFile('good.jpg', buffer.getvalue(), content_type='image/jpeg')
+        bad = SimpleUploadedFile('bad.jpg', b'not an image', content_type='image/jpeg')
+        with self.assertLogs('routes.features', 'WARNING'):
+            features, ok = extract_features([good, bad])
+        self.assertEqual(ok.tolist(), [True, False])
+        self.assertAlmostEqual(features[0, 6], 200 / 255.0, places=2)
+        self.assertFalse(features[1].any())
+
+    def test_classifier_must_match_the_feature_layout(self):
+        class Model:
+            n_features_in_ = FEATURE_DIM + 2
+
+        check_classifier(object())
+        with mock.patch.object(registry, 'get', return_value=Model()):
+            with self.assertRaises(ImproperlyConfigured):
+                classify_features(np.zeros((1, FEATURE_DIM)))
+        with mock.patch.object(registry, 'get', return_value=None):
+            labels, probs, normal = classify_features(np.zeros((2, FEATURE_DIM)))
+        self.assertEqual(labels, ['Unknown', 'Unknown'])
+        self.assertTrue(np.isnan(probs).all())
+
+
+def use_temp_media(test):
+    """Points MEDIA_ROOT and CHUNKED_UPLOAD_DIR at a throwaway directory for one test."""
+    root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, root)
+    override = override_settings(MEDIA_ROOT=os.path.join(root, 'media'),
+                                 CHUNKED_UPLOAD_DIR=os.path.join(root, 'chunks'))
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+def api_client(user):
+    return Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+
+def jpeg(value=128, size=(64, 64), name='panel.jpg'):
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((*size, 3), value, dtype=np.uint8)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.user = User.objects.create(email='cas@example.com', name='cas')
+
+    def test_identical_bytes_share_one_blob(self):
+        first = jpeg(name='a.jpg')
+        digest = hashlib.sha256(first.read()).hexdigest()
+        first.seek(0)
+        blobs = store_blobs([first, jpeg(name='b.JPG'), jpeg(value=10)])
+        self.assertEqual(blobs[0].id, blobs[1].id)
+        self.assertNotEqual(blobs[0].id, blobs[2].id)
+        self.assertEqual(blobs[0].sha256, digest)
+        self.assertTrue(blobs[0].file.name.startswith(BLOB_PREFIX))
+        self.assertEqual(store_blobs([jpeg(name='c.png')])[0].id, blobs[0].id)
+        self.assertEqual(ImageBlob.objects.count(), 2)
+
+    def test_assessment_key_covers_every_input(self):
+        key = assessment_key(1, 'abc', {'C1': 30}, 2, NOW_YEAR)
+        self.assertEqual(key, assessment_key(1, 'abc', {'C1': '30'}, 2, NOW_YEAR))
+        for changed in (assessment_key(2, 'abc', {'C1': 30}, 2, NOW_YEAR),
+                        assessment_key(1, 'abd', {'C1': 30}, 2, NOW_YEAR),
+                        assessment_key(1, 'abc', {'C1': 31}, 2, NOW_YEAR),
+                        assessment_key(1, 'abc', {'C1': 30}, 3, NOW_YEAR),
+                        assessment_key(1, 'abc', {'C1': 30}, 2, NOW_YEAR + 1),
+                        assessment_key(1, 'abc', {'C1': 30}, 2, NOW_YEAR, (25, 0.8))):
+            self.assertNotEqual(changed, key)
+
+    def test_repeated_assessment_is_reused(self):
+        client = api_client(self.user)
+        data = {'companyName': 'Acme', 'installationYear': '2020', 'C1': '30', 'C2': '40', 'T1': '30', 'T2': '35'}
+        first = client.post('/api/predict/', {**data, 'image': jpeg()}).json()
+        again = client.post('/api/predict/', {**data, 'image': jpeg(name='renamed.jpg')}).json()
+        self.assertIsNotNone(first['saved_id'])
+        self.assertEqual(again, first)
+        changed = client.post('/api/predict/', {**data, 'C2': '70', 'image': jpeg()}).json()
+        self.assertNotEqual(changed['saved_id'], first['saved_id'])
+        self.assertEqual(SolarPanels.objects.count(), 2)
+        self.assertEqual(ImageBlob.objects.count(), 1)
+        self.assertEqual(CachedAssessment.objects.count(), 2)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.user = User.objects.create(email='up@example.com', name='up')
+
+    def upload(self, data, chunk_size, sha256='', user=None):
+        upload = chunked.start_upload(user or self.user, 'panel.jpg', len(data), chunk_size, 'image/jpeg', sha256)
+        chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        return upload, chunks
+
+    def test_out_of_order_chunks_assemble(self):
+        data = os.urandom(10_000)
+        upload, chunks = self.upload(data, 4096, hashlib.sha256(data).hexdigest())
+        for index in (2, 0):
+            chunked.write_chunk(upload, index, io.BytesIO(chunks[index]), hashlib.sha256(chunks[index]).hexdigest())
+        with self.assertRaisesMessage(chunked.ChunkError, '1 chunks missing, first is 1'):
+            chunked.complete_upload(upload)
+        chunked.write_chunk(upload, 1, io.BytesIO(chunks[1]), hashlib.sha256(chunks[1]).hexdigest())
+
+        chunked.complete_upload(upload)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'complete')
+        self.assertEqual(upload.blob.sha256, hashlib.sha256(data).hexdigest())
+        with upload.blob.file.open('rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertFalse(os.path.exists(chunked.staging_path(upload)))
+        self.assertEqual(chunked.complete_upload(upload).blob_id, upload.blob_id)
+
+    def test_bad_chunks_are_not_recorded(self):
+        upload, chunks = self.upload(b'abcdefgh', 4)
+        with self.assertRaisesMessage(chunked.ChunkError, 'SHA-256 mismatch'):
+            chunked.write_chunk(upload, 0, io.BytesIO(chunks[0]), '0' * 64)
+        with self.assertRaises(chunked.ChunkError):
+            chunked.write_chunk(upload, 1, io.BytesIO(b'abc'), hashlib.sha256(b'abc').hexdigest())
+        with self.assertRaises(chunked.ChunkError):
+            chunked.write_chunk(upload, 2, io.BytesIO(b'abcd'), hashlib.sha256(b'abcd').hexdigest())
+        self.assertEqual(chunked.missing_chunks(upload), [0, 1])
+
+    def test_file_digest_is_checked(self):
+        upload, chunks = self.upload(b'abcdefgh', 8, '0' * 64)
+        chunked.write_chunk(upload, 0, io.BytesIO(chunks[0]), hashlib.sha256(chunks[0]).hexdigest())
+        with self.assertRaisesMessage(chunked.ChunkError, 'File SHA-256 mismatch'):
+            chunked.complete_upload(upload)
+
+    def test_uploads_resolve_for_their_owner_only(self):
+        upload, chunks = self.upload(b'abcdefgh', 8)
+        chunked.write_chunk(upload, 0, io.BytesIO(chunks[0]), hashlib.sha256(chunks[0]).hexdigest())
+        chunked.complete_upload(upload)
+        other = User.objects.create(email='other@example.com', name='other')
+        self.assertIn(str(upload.id), chunked.resolve_uploads([upload.id, 'not-a-uuid'], self.user))
+        self.assertEqual(chunked.resolve_uploads([upload.id], other), {})
+
+    def test_open_upload_quota_and_stale_purge(self):
+        for _ in range(chunked.MAX_OPEN_UPLOADS):
+            self.upload(b'x', 1)
+        with self.assertRaisesMessage(chunked.ChunkError, 'unfinished uploads'):
+            self.upload(b'x', 1)
+        ChunkedUpload.objects.update(updated_at=timezone.now() - datetime.timedelta(hours=chunked.STALE_HOURS + 1))
+        upload, _ = self.upload(b'x', 1)
+        self.assertEqual(list(ChunkedUpload.objects.values_list('id', flat=True)), [upload.id])
+        with mock.patch.object(chunked, 'MAX_OPEN_BYTES', 10):
+            with self.assertRaisesMessage(chunked.ChunkError, 'at most 10 bytes'):
+                self.upload(b'x' * 10, 10)
+
+    def test_upload_api(self):
+        client = api_client(self.user)
+        data = b'0123456789'
+        response = client.post('/api/uploads/', {'fileName': 'a.jpg', 'totalSize': len(data), 'chunkSize': 4})
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.json()['uploadId']
+        self.assertEqual(self.client.post('/api/uploads/', {'totalSize': 1}).status_code, 401)
+        response = client.get(f'/api/uploads/{upload_id}/')
+        self.assertEqual(response.json()['missingChunks'], [0, 1, 2])
+
+
+class MosaicJobTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.user = User.objects.create(email='site@example.com', name='site')
+        buffer = io.BytesIO()
+        tifffile.imwrite(buffer, np.random.default_rng(0).integers(0, 255, (100, 130, 3), dtype=np.uint8))
+        data = buffer.getvalue()
+        upload = chunked.start_upload(self.user, 'site.tif', len(data), len(data))
+        chunked.write_chunk(upload, 0, io.BytesIO(data), hashlib.sha256(data).hexdigest())
+        self.upload = chunked.complete_upload(upload)
+        # run_job drops DB connections before forking; that would end the test transaction
+        patcher = mock.patch.object(mosaic.connections, 'close_all')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_queued_job_is_scored_once(self):
+        client = api_client(self.user)
+        response = client.post('/api/sites/mosaic/', {'uploadId': str(self.upload.id), 'tileSize': 64,
+                                                      'companyName': 'Acme', 'installationYear': '2019'})
+        self.assertEqual(response.status_code, 202)
+        job = MosaicJob.objects.get(id=response.json()['job_id'])
+        self.assertEqual(job.status, 'pending')
+
+        self.assertTrue(mosaic.run_job(job, workers=1))
+        self.assertFalse(mosaic.run_job(job, workers=1))
+        payload = client.get(f'/api/sites/mosaic/{job.id}/').json()
+        self.assertEqual(payload['status'], 'complete')
+        grid = payload['defect_grid']
+        self.assertEqual((grid['rows'], grid['cols']), (2, 3))
+        self.assertEqual(MosaicJob.objects.get(id=job.id).attempts, 1)
+        self.assertEqual(SolarPanels.objects.get().companyName, 'Acme')
+
+    def test_unreadable_mosaic_fails_the_job(self):
+        job = MosaicJob.objects.create(user=self.user, upload=self.upload, tile_size=64)
+        with mock.patch.object(mosaic, 'process_mosaic', side_effect=ValueError('not a TIFF')):
+            mosaic.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('failed', 'Could not read mosaic: not a TIFF'))
+
+    def test_stalled_jobs_are_requeued_then_failed(self):
+        job = MosaicJob.objects.create(user=self.user, upload=self.upload, tile_size=64)
+        fresh = MosaicJob.objects.create(user=self.user, upload=self.upload, tile_size=64, status='running')
+        silent = timezone.now() - datetime.timedelta(seconds=mosaic.LEASE_SECONDS + 1)
+        for attempt in range(1, mosaic.MAX_ATTEMPTS + 1):
+            MosaicJob.objects.filter(id=job.id).update(status='running', attempts=attempt, updated_at=silent)
+            requeued = attempt < mosaic.MAX_ATTEMPTS
+            self.assertEqual(mosaic.requeue_stale_jobs(), (int(requeued), int(not requeued)))
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'pending' if requeued else 'failed')
+        self.assertEqual(MosaicJob.objects.get(id=fresh.id).status, 'running')
+
+    def test_heartbeat_is_throttled(self):
+        job = MosaicJob.objects.create(user=self.user, upload=self.upload, tile_size=64, status='running')
+        silent = timezone.now() - datetime.timedelta(hours=1)
+        MosaicJob.objects.filter(id=job.id).update(updated_at=silent)
+        with mock.patch.object(mosaic.time, 'monotonic', side_effect=[0.0, 1.0, mosaic.HEARTBEAT_SECONDS, 0.0]):
+            beat = mosaic._heartbeat(job.id)
+            beat()
+            self.assertEqual(MosaicJob.objects.get(id=job.id).updated_at, silent)
+            beat()
+        self.assertGreater(MosaicJob.objects.get(id=job.id).updated_at, silent)
+
+
+class ThermalTests(SimpleTestCase):
+    def test_readings_and_hotspots_per_panel(self):
+        frame = np.full((40, 80), 30.0, dtype=np.float32)
+        frame[0, 0] = 25.0
+        # one hot strip straddling the vertical border between panels 0 and 1
+        frame[10:14, 36:44] = 55.0
+        [panels] = classify_frames([frame], t1=20.0, t2=35.0, rows=1, cols=2)
+        self.assertEqual([(p['C1'], p['C2'], p['median_c']) for p in panels], [(25.0, 55.0, 30.0), (30.0, 55.0, 30.0)])
+        self.assertEqual([p['hotspot_count'] for p in panels], [1, 1])
+        self.assertEqual([h['bbox'] for p in panels for h in p['hotspots']], [[36, 10, 40, 14], [40, 10, 44, 14]])
+        self.assertEqual(panels[0]['hotspots'][0]['delta_c'], 25.0)
+
+    def test_small_blobs_are_ignored(self):
+        frame = np.full((20, 20), 30.0, dtype=np.float32)
+        frame[5:6, 5:8] = 60.0
+        self.assertEqual(analyze_frame(frame)['hotspots'], [])
+
+    def test_nodata_panels_read_as_missing(self):
+        frame = np.full((10, 20), 30.0, dtype=np.float32)
+        frame[:, 10:] = np.nan
+        frame[2, 2] = np.nan
+        [panels] = classify_frames([frame], t1=20.0, t2=35.0, cols=2)
+        json.dumps(panels, allow_nan=False)
+        self.assertEqual((panels[0]['C1'], panels[0]['C2']), (30.0, 30.0))
+        self.assertEqual((panels[1]['C1'], panels[1]['C2'], panels[1]['median_c']), (None, None, None))
+        self.assertEqual(panels[1]['damage_type'], DAMAGE_TYPES[1])
+
+    def test_radiometric_counts_convert_to_celsius(self):
+        buffer = io.BytesIO()
+        tifffile.imwrite(buffer, np.full((8, 8), 30315, dtype=np.uint16))
+        c1, c2, summary = surface_readings(buffer)
+        self.assertEqual((c1, c2, summary['hotspot_count']), (30.0, 30.0, 0))
+
+
+class TelemetryIngestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='sensor@example.com', name='sensor')
+        self.panel = SolarPanels.objects.create(user=self.user, companyName='Acme', installationYear='2020')
+        other = User.objects.create(email='else@example.com', name='else')
+        self.foreign = SolarPanels.objects.create(user=other, companyName='Acme', installationYear='2020')
+
+    def lines(self, *readings):
+        return [json.dumps(r) + '\n' for r in readings]
+
+    def test_parse_rejects_bad_lines(self):
+        lines = ['{"panel": 1, "timestamp": "1970-01-01T00:00:10", "surface": 30.5}\n', 'not json\n', '\n',
+                 '{"panel": 1, "timestamp": 20}\n', '{"timestamp": 20, "surface": 1}\n']
+        panel, epoch, surface, ambient, rejected = parse_readings(lines)
+        self.assertEqual((panel.tolist(), epoch.tolist(), rejected), ([1], [10], 3))
+        self.assertEqual(surface.tolist(), [30.5])
+        self.assertTrue(np.isnan(ambient[0]))
+        csv_lines = ['panel,timestamp,surface,ambient\n', '1,5,31,\n']
+        self.assertEqual(parse_readings(csv_lines, 'csv')[0].tolist(), [1])
+
+    def test_batches_merge_into_chunks_and_rollups(self):
+        day = 20_000 * 86400
+        ingest(self.lines({'panel': self.panel.id, 'timestamp': day + 60, 'surface': 30, 'ambient': 20},
+                          {'panel': self.panel.id, 'timestamp': day + 3700, 'surface': 40}), 'ndjson', self.user)
+        summary = ingest(self.lines({'panel': self.panel.id, 'timestamp': day + 60, 'surface': 34, 'ambient': 22},
+                                    {'panel': self.panel.id, 'timestamp': day + 10, 'surface': 28},
+                                    {'panel': self.foreign.id, 'timestamp': day, 'surface': 1}), 'ndjson', self.user)
+        self.assertEqual(summary, {'received': 3, 'stored': 2, 'rejected': 1, 'panels': 1, 'chunks': 1})
+
+        chunk = TelemetryChunk.objects.get(panel=self.panel)
+        epoch, surface, ambient = chunk_readings(chunk)
+        self.assertEqual((epoch - day).tolist(), [10, 60, 3700])
+        self.assertEqual(surface.tolist(), [28, 34, 40])
+        first = TelemetryHourly.objects.filter(panel=self.panel).order_by('hour').first()
+        self.assertEqual((first.count, first.surface_min, first.surface_max, first.surface_mean), (2, 28, 34, 31))
+        self.assertEqual((first.ambient_min, first.ambient_max), (22, 22))
+        self.assertFalse(TelemetryChunk.objects.filter(panel=self.foreign).exists())
+
+    def test_gzip_csv_api(self):
+        body = gzip.compress(f'panel,timestamp,surface,ambient\n{self.panel.id},2024-05-01T10:00:00,45,30\n'.encode())
+        response = api_client(self.user).post('/api/telemetry/', body, content_type='text/csv',
+                                              HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.json()['stored'], 1)
+        self.assertEqual(api_client(self.user).post('/api/telemetry/', b'\x1f\x8bbad', content_type='text/csv',
+                                                    HTTP_CONTENT_ENCODING='gzip').status_code, 400)
+
+
+class SlidingWindowTests(SimpleTestCase):
+    def update(self, evaluator, *readings):
+        panel, epoch, surface, ambient = zip(*readings)
+        return evaluator.update(np.array(panel), np.array(epoch), np.array(surface, dtype=np.float32),
+                                np.array(ambient, dtype=np.float32))
+
+    def test_only_changes_are_reported(self):
+        evaluator = SlidingWindowEvaluator(window_seconds=300, bucket_seconds=60)
+        self.assertEqual(self.update(evaluator, (1, 0, 25, 28)), [])
+        [transition] = self.update(evaluator, (1, 70, 60, 28))
+        self.assertEqual((transition.previous, transition.current), ('Normal', 'Critical overheating'))
+        self.assertEqual((transition.at, transition.C1, transition.C2), (70, 25.0, 60.0))
+        self.assertTrue(transition.send_inspection_request)
+        self.assertEqual(self.update(evaluator, (1, 80, 59, 28)), [])
+        # a window with no surface reading is "Unknown" and keeps the previous state
+        self.assertEqual(self.update(evaluator, (1, 1000, np.nan, 28)), [])
+        self.assertEqual(DAMAGE_TYPES[evaluator.state[evaluator.rows_for(np.array([1]))[0]]], 'Critical overheating')
+
+    def test_update_with_mixed_buckets(self):
+        evaluator = SlidingWindowEvaluator(window_seconds=300, bucket_seconds=60)
+        [transition] = self.update(evaluator, (1, 0, 90, 28))
+        self.assertEqual(transition.current, 'Critical overheating')
+        # bucket 5 reuses bucket 0's slot, bucket 4 fills another, bucket 0 is now late
+        transitions = self.update(evaluator, (1, 300, 25, 28), (1, 30, 95, 28), (1, 240, 26, 28),
+                                  (2, 0, 25, 28), (2, 60, 60, 28))
+        self.assertEqual([(t.panel, t.previous, t.current) for t in transitions],
+                         [(1, 'Critical overheating', 'Normal'), (2, 'Normal', 'Critical overheating')])
+        self.assertEqual((transitions[0].C1, transitions[0].C2), (25.0, 26.0))
+        self.assertEqual(evaluator.late, 1)
+        self.assertEqual(evaluator.seen_until(1), 300)
+
+    def test_feed_matches_bucket_by_bucket_updates(self):
+        rng = np.random.default_rng(7)
+        panel = rng.integers(1, 4, 400)
+        epoch = np.sort(rng.integers(0, 4000, 400))
+        surface = rng.uniform(10, 70, 400).astype(np.float32)
+        ambient = rng.uniform(15, 35, 400).astype(np.float32)
+        fed = feed(SlidingWindowEvaluator(600, 60, capacity=1), panel, epoch, surface, ambient)
+        evaluator = SlidingWindowEvaluator(600, 60)
+        expected = []
+        for bucket in np.unique(epoch // 60):
+            at = epoch // 60 == bucket
+            expected.extend(evaluator.update(panel[at], epoch[at], surface[at], ambient[at]))
+        self.assertEqual(fed, expected)
+        self.assertTrue(fed)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        stamp = timezone.now()
+        for i in range(7):
+            ManufacturerData.objects.create(name=f'M{i}', pmax=f'{400 + 10 * (i % 3)} W', created_at=stamp)
+
+    def walk(self, url, params=None, key='next'):
+        ids = []
+        response = self.client.get(url, params or {})
+        while True:
+            body = response.json()
+            ids.append([row['id'] for row in body['results']])
+            if not body[key]:
+                return ids, body
+            response = self.client.get(body[key])
+
+    def test_ties_on_created_at_are_broken_by_id(self):
+        pages, last = self.walk('/api/company/all/', {'page_size': 3})
+        expected = list(ManufacturerData.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), expected)
+        back = self.client.get(last['previous']).json()
+        self.assertEqual([row['id'] for row in back['results']], expected[3:6])
+        self.assertEqual([row['id'] for row in self.client.get(back['previous']).json()['results']], expected[:3])
+
+    def test_spec_ordering_pages_through_ties(self):
+        pages, _ = self.walk('/api/company/all/', {'page_size': 2, 'ordering': 'pmax'})
+        rows = ManufacturerData.objects.order_by('pmax_num', 'id').values_list('id', flat=True)
+        self.assertEqual(sum(pages, []), list(rows))
+
+    def test_bad_cursor_and_page_size(self):
+        self.assertEqual(self.client.get('/api/company/all/', {'cursor': 'garbage'}).status_code, 404)
+        body = self.client.get('/api/company/all/', {'page_size': 'x'}).json()
+        self.assertEqual(len(body['results']), 7)
+        self.assertIsNone(body['previous'])
+
+    def test_contact_forms_page_newest_first(self):
+        stamp = timezone.now()
+        for i in range(5):
+            ContactForm.objects.create(name=f'C{i}', email='c@example.com', phone='1')
+        ContactForm.objects.filter(name__in=['C1', 'C2', 'C3']).update(created_at=stamp)
+        pages, _ = self.walk('/api/contact/list/', {'page_size': 2})
+        expected = ContactForm.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual(sum(pages, []), list(expected))
+
+
+class SpecFilterTests(TestCase):
+    def setUp(self):
+        for name, pmax, cells, country in (('A', '400 W', '60', 'China'), ('B', '450-460 W', '72', 'china'),
+                                           ('C', '500 W', '144', 'Japan'), ('D', 'n/a', '', 'Japan')):
+            ManufacturerData.objects.create(name=name, pmax=pmax, cells_per_module=cells, country=country)
+
+    def names(self, params):
+        return sorted(filter_specs(ManufacturerData.objects.all(), params).values_list('name', flat=True))
+
+    def test_range_and_text_filters(self):
+        self.assertEqual(self.names({'pmax_min': '420'}), ['B', 'C'])
+        self.assertEqual(self.names({'pmax_min': '420', 'pmax_max': '480'}), ['B'])
+        self.assertEqual(self.names({'cells_per_module_max': '72.0', 'country': 'CHINA'}), ['A', 'B'])
+        self.assertEqual(self.names({'pmax_min': ''}), ['A', 'B', 'C', 'D'])
+
+    def test_fractional_bounds_on_integer_columns(self):
+        self.assertEqual(self.names({'cells_per_module_min': '60.5'}), ['B', 'C'])
+        self.assertEqual(self.names({'cells_per_module_max': '71.9'}), ['A'])
+        self.assertEqual(self.names({'cells_per_module_min': '72.4', 'cells_per_module_max': '72.6'}), [])
+
+    def test_non_finite_and_malformed_values_raise(self):
+        for raw in ('inf', '-Infinity', 'nan', 'abc', '1e400'):
+            with self.assertRaises(ValueError, msg=raw):
+                self.names({'cells_per_module_min': raw})
+
+    def test_api_rejects_bad_filters(self):
+        response = self.client.get('/api/company/all/', {'pmax_min': 'inf'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('finite', response.json()['error'])
+
+    def test_backfill_parses_hashes_and_bumps(self):
+        ManufacturerData.objects.update(pmax_num=None, cells_per_module_num=None, content_hash=None)
+        with mock.patch('routes.management.commands.backfill_manufacturer_specs.bump_after_commit') as bump:
+            call_command('backfill_manufacturer_specs', batch_size=3, stdout=io.StringIO())
+        bump.assert_called_once_with(MANUFACTURER_DATA)
+        self.assertEqual(self.names({'pmax_min': '420', 'cells_per_module_min': '70'}), ['B', 'C'])
+        for row in ManufacturerData.objects.all():
+            self.assertEqual(row.content_hash, catalogue_hash([getattr(row, f) for f in CATALOGUE_FIELDS]))
+
+
+class BulkTests(TestCase):
+    def test_update_from_values(self):
+        ids = [ManufacturerData.objects.create(name='A', model_name=f'M{i}', cells_per_module='60').id
+               for i in range(5)]
+        update_from_values(ManufacturerData, ['cells_per_module_num', 'pmax_num'],
+                           [(ids[0], None, 410.5), (ids[3], 72, None)], batch_size=1)
+        rows = dict(ManufacturerData.objects.values_list('id', 'cells_per_module_num'))
+        self.assertEqual([rows[i] for i in ids], [None, 60, 60, 72, 60])
+        self.assertEqual(ManufacturerData.objects.get(id=ids[0]).pmax_num, 410.5)
+
+
+class ManufacturerSearchTests(TestCase):
+    def setUp(self):
+        self.jinko = ManufacturerData.objects.create(name='Jinko Solar', series_name='Tiger Neo',
+                                                     model_name='JKM540M-72HL4')
+        self.longi = ManufacturerData.objects.create(name='LONGi', series_name='Hi-MO 5', model_name='LR5-72HPH-540M')
+        self.trina = ManufacturerData.objects.create(name='Trina Solar', series_name='Vertex',
+                                                     model_name='TSM-DE19')
+        self.search = ManufacturerSearch(check_seconds=0)
+
+    def top(self, query):
+        return [hit['id'] for hit in self.search.search(query)]
+
+    def test_ranking(self):
+        hits = self.search.search('JKM540M-72HL4')
+        self.assertEqual(hits[0]['id'], self.jinko.id)
+        self.assertEqual(hits[0]['score'], 1.0)
+        self.assertEqual(self.top('jkm 540')[0], self.jinko.id)          # compact model term
+        self.assertEqual(self.top('vertx'), [self.trina.id])             # trigram typo match
+        self.assertEqual(self.top('solar')[:2], sorted([self.jinko.id, self.trina.id]))
+        self.assertEqual(self.top('zzzz'), [])
+
+    def test_resolve(self):
+        self.assertEqual(self.search.resolve('Jinko', 'JKM540M-72HL4'), self.jinko.id)
+        self.assertEqual(self.search.resolve('Unknown', 'LR5-72HPH-540M'), self.longi.id)
+        self.assertIsNone(self.search.resolve('Jinko', 'nothing like it'))
+        self.assertIsNone(self.search.resolve('Jinko', None))
+
+    def test_edits_and_deletes_reach_the_index(self):
+        self.search.ensure_fresh()
+        deleted_id = self.longi.id
+        self.longi.delete()
+        self.trina.model_name = 'TSM-NEG21'
+        self.trina.save()
+        # the test transaction never commits, so bump_after_commit's bump never runs
+        DataVersion.bump(MANUFACTURER_DATA)
+        self.assertNotIn(deleted_id, self.top('LR5-72HPH-540M'))
+        self.assertEqual(self.top('TSM-NEG21'), [self.trina.id])
+        self.assertLess(max(hit['score'] for hit in self.search.search('TSM-DE19')), 1.0)
+
+
+class WarrantyCurveTests(TestCase):
+    def test_curve_from_spec_columns(self):
+        curve = warranty_curve(12, 25, 84.8, -0.35)
+        self.assertAlmostEqual(curve.end_output, 0.848)
+        self.assertAlmostEqual(curve.annual_degradation, 0.00608)
+        self.assertEqual(warranty_years(curve), 25)
+        self.assertAlmostEqual(guaranteed_output(curve, 10), 0.9392)
+        self.assertAlmostEqual(guaranteed_output(curve, 40), 0.848)
+        self.assertEqual(warranty_years(warranty_curve(12, 80, None, None)), 12)   # implausible term dropped
+        self.assertIsNone(warranty_curve(None, 0, 120, None))
+
+    def test_apply_and_summarize(self):
+        curve = warranty_curve(12, 25, 80, -0.4)
+        params = apply_warranty({'promised_degradation': 0.5, 'warranty_age': 3}, curve)
+        self.assertAlmostEqual(params['promised_degradation'], 0.008)
+        self.assertEqual(params['warranty_age'], 25)
+        summary = warranty_summary(curve, 5, surface_max=65.0)
+        self.assertEqual(summary['guaranteed_output'], 0.96)
+        self.assertEqual(summary['thermal_power_loss_percent'], 16.0)
+        self.assertEqual(apply_warranty({'warranty_age': 3}, None), {'warranty_age': 3})
+
+    def test_cache_reads_once_until_the_version_moves(self):
+        row = ManufacturerData.objects.create(name='Acme', primary_years='25 years', output_power_percent='80%')
+        cache = WarrantyCurveCache(check_seconds=60)
+        with self.assertNumQueries(2):
+            curves = cache.get_many([row.id, None, row.id + 1])
+        self.assertEqual(curves[row.id].performance_years, 25)
+        self.assertIsNone(curves[row.id + 1])
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_many([row.id, row.id + 1]), curves)
+
+        cache = WarrantyCurveCache(check_seconds=0)
+        cache.get(row.id)
+        row.primary_years = '30'
+        row.save()
+        self.assertEqual(cache.get(row.id).performance_years, 25)
+        DataVersion.bump(MANUFACTURER_DATA)
+        self.assertEqual(cache.get(row.id).performance_years, 30)
+
+
+class GeoCellTests(SimpleTestCase):
+    def test_indices_round_trip(self):
+        rng = np.random.default_rng(3)
+        lat, lon = rng.uniform(-90, 90, 1000), rng.uniform(-180, 180, 1000)
+        cells = cell_ids(lat, lon)
+        rows, columns = cell_indices(cells)
+        np.testing.assert_array_equal(cell_from_indices(rows, columns), cells)
+        np.testing.assert_array_equal(rows, np.floor((lat + 90.0) / 180.0 * (1 << CELL_BITS)))
+
+    def test_parent_cell_is_a_contiguous_range(self):
+        cells = cell_ids([14.5995, 14.5996, -33.8688], [120.9842, 120.9843, 151.2093])
+        parents = parent_cells(cells, 10)
+        self.assertEqual(parents[0], parents[1])
+        self.assertNotEqual(parents[0], parents[2])
+        shift = 2 * (CELL_BITS - 10)
+        self.assertTrue(parents[0] << shift <= cells[0] < (parents[0] + 1) << shift)
+
+    def test_corners_and_missing_coordinates(self):
+        self.assertEqual(geo_cell(-90.0, -180.0), 0)
+        self.assertEqual(geo_cell(90.0, 180.0), geo_cell(90.0, -180.0))  # longitude wraps
+        self.assertEqual(cell_ids([np.nan], [10.0])[0], -1)
+        self.assertIsNone(geo_cell(None, 10.0))
+
+
+class GeoQueryTests(TestCase):
+    def test_bbox_filter_matches_brute_force(self):
+        user = User.objects.create(email='geo@example.com', name='geo')
+        rng = random.Random(4)
+        points = [(rng.uniform(-10, 10), rng.uniform(170, 190) % 360 - 180) for _ in range(300)]
+        for lat, lon in points:
+            SolarPanels(user=user, companyName='x', installationYear='2020', latitude=lat, longitude=lon).save()
+        for south, west, north, east in ((-5, 175, 5, 179), (-2, 178, -178, 2), (0, -179, 9, -171)):
+            expected = sum(
+                south <= lat <= north and (west <= lon <= east if west <= east else (lon >= west or lon <= east))
+                for lat, lon in points
+            )
+            self.assertEqual(SolarPanels.objects.filter(bbox_filter(south, west, north, east)).count(), expected)
+
+    def test_radius_search_and_cap(self):
+        user = User.objects.create(email='near@example.com', name='near')
+        for lat in (14.60, 14.61, 14.70, 15.60):
+            SolarPanels(user=user, companyName='x', installationYear='2020', latitude=lat, longitude=121.0).save()
+        panels = SolarPanels.objects.all()
+        ids, distances, total = within_radius(panels, 14.60, 121.0, 20.0, 2)
+        self.assertEqual(total, 3)
+        near = panels.filter(latitude__lt=14.65).order_by('latitude')
+        self.assertEqual(list(ids), list(near.values_list('id', flat=True)))
+        self.assertAlmostEqual(distances[1], 1.112, places=2)
+        with self.assertRaises(ValueError):
+            within_radius(panels, 14.60, 121.0, NEAREST_MAX_KM + 1, 10)
+
+        client = api_client(user)
+        params = {'lat': 14.60, 'lon': 121.0}
+        response = client.get('/api/panels/within/radius/', {**params, 'radius_km': NEAREST_MAX_KM})
+        self.assertEqual(response.json()['count'], 4)
+        response = client.get('/api/panels/within/radius/', {**params, 'radius_km': NEAREST_MAX_KM + 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(client.get('/api/panels/nearest/', {**params, 'k': 2}).json()['count'], 2)
+
+
+def track_points(track, t, offset_km):
+    """Points `offset_km` left or right of fraction `t` along a track's first segment, in exposure()'s frame."""
+    scale = math.cos(math.radians((track['lat'][0] + track['lat'][1]) / 2))
+    dlon = (track['lon'][1] - track['lon'][0] + 180.0) % 360.0 - 180.0
+    bx, by = dlon * scale * KM_PER_DEGREE, (track['lat'][1] - track['lat'][0]) * KM_PER_DEGREE
+    ux, uy = np.array([bx, by]) / math.hypot(bx, by)
+    x = t * bx - offset_km * uy
+    y = t * by + offset_km * ux
+    lat = track['lat'][0] + y / KM_PER_DEGREE
+    lon = (track['lon'][0] + x / (KM_PER_DEGREE * scale) + 180.0) % 360.0 - 180.0
+    return lat, lon
+
+
+def in_boxes(boxes, lat, lon):
+    inside = np.zeros(len(lat), dtype=bool)
+    for south, west, north, east in boxes:
+        lon_in = (lon >= west) & (lon <= east) if west <= east else (lon >= west) | (lon <= east)
+        inside |= (lat >= south) & (lat <= north) & lon_in
+    return inside
+
+
+class TyphoonTests(TestCase):
+    TRACKS = (
+        [{'lat': 10, 'lon': 120, 'speed': 9, 'radius_km': 60, 'outer_radius_km': 100},      # diagonal
+         {'lat': 14, 'lon': 124, 'speed': 7, 'radius_km': 60, 'outer_radius_km': 100}],
+        [{'lat': 40, 'lon': 178, 'speed': 9, 'radius_km': 30, 'outer_radius_km': 50},       # antimeridian
+         {'lat': 44, 'lon': -176, 'speed': 9, 'radius_km': 80, 'outer_radius_km': 150}],
+        [{'lat': -20, 'lon': 150, 'speed': 9, 'radius_km': 40, 'outer_radius_km': 40},      # due east
+         {'lat': -20, 'lon': 160, 'speed': 9, 'radius_km': 40, 'outer_radius_km': 40}],
+    )
+
+    def edge_points(self, track):
+        t = np.linspace(-0.3, 1.3, 800)
+        offsets = track['outer_radius_km'].max() * np.array([-0.99, -0.6, 0.3, 0.8, 0.99])
+        lats, lons = zip(*(track_points(track, t, offset) for offset in offsets))
+        return np.concatenate(lats), np.concatenate(lons)
+
+    def test_boxes_cover_every_affected_point(self):
+        for points in self.TRACKS:
+            track = parse_track(points)
+            lat, lon = self.edge_points(track)
+            affected, _ = exposure(track, lat, lon)
+            self.assertGreater(affected.sum(), 100)
+            self.assertTrue(in_boxes(track_boxes(track), lat[affected], lon[affected]).all(), points)
+
+    def test_candidates_hold_every_affected_panel(self):
+        user = User.objects.create(email='storm@example.com', name='storm')
+        track = parse_track(self.TRACKS[0])
+        lat, lon = self.edge_points(track)
+        for la, lo in zip(lat[::5], lon[::5]):
+            SolarPanels(user=user, companyName='x', installationYear='2020', latitude=la, longitude=lo).save()
+        panels = SolarPanels.objects.order_by('id')
+        stored = np.array(panels.values_list('latitude', 'longitude'))
+        affected, _ = exposure(track, stored[:, 0], stored[:, 1])
+        ids = np.array(panels.values_list('id', flat=True))
+        self.assertLessEqual(set(ids[affected]), set(_candidates(track, panels)[0].tolist()))
+
+    def test_fan_out_flags_panels(self):
+        user = User.objects.create(email='fleet@example.com', name='fleet')
+        track = parse_track(self.TRACKS[0])
+        for t, offset in ((0.1, 0), (0.5, 80), (0.5, 150), (0.9, -20)):
+            la, lo = track_points(track, t, offset)
+            SolarPanels(user=user, companyName='x', installationYear='2020', latitude=la, longitude=lo).save()
+        core, band, outside, late = SolarPanels.objects.order_by('id')
+        _, summary = fan_out(self.TRACKS[0], 8.0, dry_run=True)
+        self.assertEqual((summary['event'], summary['panels_affected'], summary['inspections_requested']), (None, 3, 1))
+        self.assertFalse(SolarPanels.objects.filter(send_reminders=True).exists())
+
+        event, summary = fan_out(self.TRACKS[0], 8.0, name='Test storm')
+        self.assertEqual((event.panels_affected, event.inspections_requested), (3, 1))
+        flags = {p.id: p for p in SolarPanels.objects.all()}
+        self.assertTrue(flags[core.id].send_inspection_request and flags[core.id].schedule_drone_inspection)
+        self.assertAlmostEqual(flags[core.id].typhoon_speed, 8.8)
+        self.assertEqual((flags[band.id].send_reminders, flags[band.id].typhoon_speed), (True, None))
+        self.assertFalse(flags[late.id].send_inspection_request)
+        self.assertIsNone(flags[outside.id].typhoon_event_id)
+        with self.assertRaises(TrackError):
+            fan_out([{'lat': 10, 'lon': 120, 'speed': 9, 'radius_km': 90, 'outer_radius_km': 50}], 8.0)
+
+
+class DronePlannerTests(TestCase):
+    def test_clusters_never_exceed_max_stops(self):
+        rng = np.random.default_rng(5)
+        # one dense site and a thin scatter: plain k-means puts most of the site in one cluster
+        lat = np.r_[14.5 + rng.normal(0, 0.01, 900), rng.uniform(5, 20, 100)]
+        lon = np.r_[121.0 + rng.normal(0, 0.01, 900), rng.uniform(115, 127, 100)]
+        labels = cluster_stops(lat, lon, max_stops=100)
+        counts = np.bincount(labels)
+        self.assertLessEqual(counts.max(), 100)
+        self.assertEqual(counts.sum(), 1000)
+        self.assertTrue((counts > 0).all())
+        # stops at one spot cannot be told apart by k-means and are split in runs
+        self.assertEqual(np.bincount(cluster_stops(np.full(25, 14.5), np.full(25, 121.0), max_stops=10)).tolist(),
+                         [9, 8, 8])
+        self.assertEqual(cluster_stops(lat[:5], lon[:5], max_stops=10).tolist(), [0] * 5)
+
+    def test_routes_visit_every_stop_within_the_battery(self):
+        rng = np.random.default_rng(6)
+        lat, lon = 14.5 + rng.uniform(0, 0.05, 60), 121.0 + rng.uniform(0, 0.05, 60)
+        deadline = np.where(np.arange(60) < 10, 24.0, 72.0)
+        clusters = plan_routes(lat, lon, np.full(60, 2.0), deadline, budget_minutes=25.0, max_stops=25)
+        visited = np.concatenate([s['stops'] for c in clusters for s in c['sorties']])
+        self.assertEqual(sorted(visited.tolist()), list(range(60)))
+        self.assertLessEqual(max(len(c['members']) for c in clusters), 25)
+        for cluster in clusters:
+            order = np.concatenate([s['stops'] for s in cluster['sorties']])
+            # urgent stops are flown before the rest of their cluster
+            self.assertEqual(deadline[order].tolist(), sorted(deadline[order].tolist()))
+            for sortie in cluster['sorties']:
+                self.assertTrue(len(sortie['stops']) == 1 or sortie['flight_minutes'] <= 25.0 + 1e-9)
+                self.assertTrue(np.all(np.diff(sortie['eta_minutes']) > 0))
+
+    def test_plan_inspections(self):
+        user = User.objects.create(email='crew@example.com', name='crew')
+        for k in range(4):
+            SolarPanels(user=user, companyName='x', installationYear='2020', latitude=14.5 + k / 100,
+                        longitude=121.0, schedule_drone_inspection=k < 3).save()
+        plan = plan_inspections(SolarPanels.objects.all(), max_stops=2)
+        self.assertEqual((plan['stops'], plan['clusters']), (3, 2))
+        self.assertEqual(sorted(stop['id'] for route in plan['routes'] for sortie in route['sorties']
+                                for stop in sortie['stops']),
+                         list(SolarPanels.objects.filter(schedule_drone_inspection=True).values_list('id', flat=True)))
+
+
+class PanelGridTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create(email='map@example.com', name='map', is_staff=True)
+        self.panels = []
+        for lat, lon, decision in ((14.60, 121.00, 'Recycle Panel'), (14.61, 121.01, 'Recycle Panel'),
+                                   (14.60, 121.00, 'Panel in good condition'), (-33.87, 151.21, None)):
+            panel = SolarPanels(user=self.staff, companyName='x', installationYear='2020', latitude=lat,
+                                longitude=lon, decision=decision)
+            panel.save()
+            self.panels.append(panel)
+
+    def cells(self, z, x, y):
+        return {(row, col): counts for row, col, _, *counts in tile_json(z, x, y)['cells']}
+
+    def test_tiles_follow_panel_writes(self):
+        # zoom 0: one tile of 32 x 32 cells, 5.625 x 11.25 degrees each, row 0 at the north edge
+        manila = (int((90 - 14.6) // 5.625), int((121.0 + 180) // 11.25))
+        sydney = (int((90 + 33.87) // 5.625), int((151.21 + 180) // 11.25))
+        recycle, good = DECISIONS.index('Recycle Panel'), DECISIONS.index('Panel in good condition')
+        cells = self.cells(0, 0, 0)
+        self.assertEqual(set(cells), {manila, sydney})
+        self.assertEqual((cells[manila][recycle], cells[manila][good], cells[sydney][0]), (2, 1, 1))
+
+        self.panels[0].decision = 'Panel in good condition'
+        self.panels[0].save()
+        self.panels[3].delete()
+        cells = self.cells(0, 0, 0)
+        self.assertEqual(set(cells), {manila})
+        self.assertEqual((cells[manila][recycle], cells[manila][good]), (1, 2))
+
+        before = set(PanelGridCount.objects.filter(panels__gt=0).values_list('level', 'cell', 'decision', 'panels'))
+        rebuild_grid()
+        self.assertEqual(set(PanelGridCount.objects.values_list('level', 'cell', 'decision', 'panels')), before)
+
+    def test_tile_api_etag_and_binary(self):
+        client = api_client(self.staff)
+        response = client.get('/api/panels/grid/0/0/0/')
+        etag = response['ETag']
+        self.assertEqual(sum(cell[2] for cell in response.json()['cells']), 4)
+        self.assertEqual(client.get('/api/panels/grid/0/0/0/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        binary = client.get('/api/panels/grid/0/0/0/', {'encoding': 'binary'})
+        self.assertNotEqual(binary['ETag'], etag)
+        records = np.frombuffer(binary.content, dtype=TILE_RECORD)
+        self.assertEqual(int(records['counts'].sum()), 4)
+
+        DataVersion.bump(PANEL_GRID)
+        self.assertEqual(client.get('/api/panels/grid/0/0/0/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(client.get(f'/api/panels/grid/{MAX_ZOOM + 1}/0/0/').status_code, 404)
+        self.assertEqual(api_client(User.objects.create(email='u@example.com', name='u'))
+                         .get('/api/panels/grid/0/0/0/').status_code, 403)
+
+
+class PanelAssessmentTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.user = User.objects.create(email='owner@example.com', name='owner')
+
+    def test_predict_records_history(self):
+        client = api_client(self.user)
+        payload = client.post('/api/predict/', {'companyName': 'Acme', 'installationYear': '2020', 'C1': '30',
+                                                'C2': '80', 'T1': '30', 'T2': '35', 'image': jpeg()}).json()
+        panel = SolarPanels.objects.get(id=payload['saved_id'])
+        history = PanelAssessment.objects.get(panel=panel)
+        self.assertEqual(history.get_source_display(), 'predict')
+        self.assertEqual((history.get_decision_display(), history.get_damage_type_display()),
+                         (panel.decision, panel.damage_type))
+        self.assertAlmostEqual(history.S_value, panel.S_value, places=4)
+
+    def test_end_of_life_history_fields(self):
+        fields = history_fields({'end_of_life': [True], 'damage_probability': [np.nan]}, 0)
+        self.assertEqual((DECISIONS[fields['decision']], fields['S_value'], fields['damage_probability']),
+                         ('Recycle Panel', 0.0, None))
+
+    def test_history_filters(self):
+        panel = SolarPanels.objects.create(user=self.user, companyName='Acme', installationYear='2020')
+        other = SolarPanels.objects.create(user=User.objects.create(email='x@example.com', name='x'),
+                                           companyName='Acme', installationYear='2020')
+        now = timezone.now()
+        for target, decision, days in ((panel, 'Replace with warranty', 0), (panel, 'Replace without warranty', 10),
+                                       (panel, 'Panel in good condition', 1), (other, 'Replace with warranty', 0)):
+            PanelAssessment.objects.create(panel=target, decision=DECISIONS.index(decision), damage_type=0,
+                                           assessed_at=now - datetime.timedelta(days=days))
+        client = api_client(self.user)
+
+        def decisions(params):
+            return [row['decision'] for row in client.get('/api/assessments/', params).json()['results']]
+        self.assertEqual(decisions({}), ['Replace with warranty', 'Panel in good condition',
+                                         'Replace without warranty'])
+        self.assertEqual(decisions({'decision': 'replace'}), ['Replace with warranty', 'Replace without warranty'])
+        self.assertEqual(decisions({'decision': 'replace', 'days': 5}), ['Replace with warranty'])
+        self.assertEqual(decisions({'panel': other.id}), [])
+        self.assertEqual(decisions({'since': 'not a date'}), [])
+
+
+class FleetRollupTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create(email='fleet-admin@example.com', name='admin', is_staff=True)
+        for company, year, decision in (('Acme', '2019', 'Recycle Panel'), ('Acme', '2019-05', 'Recycle Panel'),
+                                        ('Acme', 'unknown', None), ('Bolt', ' 2021 ', 'Repair with warranty')):
+            SolarPanels.objects.create(user=self.staff, companyName=company, installationYear=year, decision=decision)
+
+    def test_installation_year(self):
+        self.assertEqual([installation_year(v) for v in ('2019', '2019-05', 'May 2020', '12019', None)],
+                         [2019, 2019, 2020, UNKNOWN_YEAR, UNKNOWN_YEAR])
+
+    def test_rollups_follow_panel_writes(self):
+        self.assertEqual(rollup(['company', 'year', 'decision']), [
+            {'company': 'Acme', 'year': None, 'decision': 'Undetermined', 'panels': 1},
+            {'company': 'Acme', 'year': 2019, 'decision': 'Recycle Panel', 'panels': 2},
+            {'company': 'Bolt', 'year': 2021, 'decision': 'Repair with warranty', 'panels': 1},
+        ])
+        panel = SolarPanels.objects.get(companyName='Bolt')
+        panel.companyName = 'Acme'
+        panel.save()
+        SolarPanels.objects.filter(installationYear='unknown').get().delete()
+        self.assertEqual(rollup(['company']), [{'company': 'Acme', 'panels': 3}])
+        self.assertEqual(rollup([], year_from=2020), [{'panels': 1}])
+        before = set(FleetRollup.objects.filter(panels__gt=0).values_list('company', 'installation_year',
+                                                                          'decision', 'panels'))
+        rebuild_rollups()
+        self.assertEqual(set(FleetRollup.objects.values_list('company', 'installation_year', 'decision', 'panels')),
+                         before)
+
+    def test_rollup_api(self):
+        client = api_client(self.staff)
+        body = client.get('/api/fleet/rollups/', {'groupBy': 'decision', 'decision': 'recycle,repair'}).json()
+        self.assertEqual(body['results'], [{'decision': 'Repair with warranty', 'panels': 1},
+                                           {'decision': 'Recycle Panel', 'panels': 2}])
+        self.assertEqual(client.get('/api/fleet/rollups/', {'groupBy': 'colour'}).status_code, 400)
+
+    def test_increment_counts(self):
+        increment_counts(PanelGridCount, ['level', 'cell', 'decision'], 'panels', [(4, 10, 1, 2), (4, 11, 1, 1)])
+        increment_counts(PanelGridCount, ['level', 'cell', 'decision'], 'panels', [(4, 10, 1, -1), (4, 10, 2, 3)],
+                         batch_size=1)
+        counts = {(row.cell, row.decision): row.panels for row in PanelGridCount.objects.filter(level=4)}
+        self.assertEqual(counts, {(10, 1): 1, (11, 1): 1, (10, 2): 3})
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='exporter@example.com', name='exporter')
+        other = User.objects.create(email='other-exporter@example.com', name='other')
+        self.mine = [SolarPanels.objects.create(user=self.user, companyName=f'Acme {i}', installationYear='2020',
+                                                latitude=14.5 + i) for i in range(5)]
+        SolarPanels.objects.create(user=other, companyName='Theirs', installationYear='2020')
+
+    def read(self, response):
+        body = b''.join(response.streaming_content)
+        return gzip.decompress(body) if response['Content-Type'] == 'application/gzip' else body
+
+    def test_keyset_batches_cover_every_row_once(self):
+        names, _ = export_columns(SolarPanels)
+        rows = list(iter_rows(SolarPanels.objects.all(), names, chunk_size=2))
+        self.assertEqual([row[names.index('id')] for row in rows],
+                         list(SolarPanels.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_ndjson_and_csv_streams(self):
+        client = api_client(self.user)
+        lines = self.read(client.get('/api/export/panels.ndjson')).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [panel.id for panel in self.mine])
+        self.assertEqual(rows[0]['user_id'], self.user.id)
+        self.assertIsInstance(rows[0]['created_at'], str)
+
+        response = client.get('/api/export/panels.csv', {'gzip': '1', 'after': self.mine[2].id})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="panels.csv.gz"')
+        table = list(csv.DictReader(io.StringIO(self.read(response).decode())))
+        self.assertEqual([row['companyName'] for row in table], ['Acme 3', 'Acme 4'])
+
+    def test_access(self):
+        client = api_client(self.user)
+        self.assertEqual(client.get('/api/export/donations.csv').status_code, 403)
+        self.assertEqual(client.get('/api/export/secrets.csv').status_code, 404)
+        self.assertEqual(client.get('/api/export/panels.xml').status_code, 404)
+        staff = User.objects.create(email='staff-exporter@example.com', name='staff', is_staff=True)
+        lines = self.read(api_client(staff).get('/api/export/panels.ndjson')).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+
+
+def catalogue_csv(*rows, header=('id', 'name', 'series_name', 'model_name', 'pmax', 'efficiency')):
+    lines = [','.join(header)] + [','.join(row) for row in rows]
+    return io.BytesIO(('\n'.join(lines) + '\n').encode('utf-8'))
+
+
+class CatalogueImportTests(TestCase):
+    def test_insert_then_unchanged_then_changed(self):
+        rows = [('', 'Jinko', 'Tiger Neo', 'JKM540M', '540 W', '21.3 %'),
+                ('', 'LONGi', 'Hi-MO 5', 'LR5-72HPH', '545 W', '21,1 %')]
+        summary = import_catalogue(catalogue_csv(*rows))
+        self.assertEqual((summary['rows'], summary['inserted'], summary['invalid']), (2, 2, 0))
+        jinko = ManufacturerData.objects.get(model_name='JKM540M')
+        self.assertEqual((jinko.pmax_num, jinko.efficiency_num), (540.0, 21.3))
+        self.assertIsNotNone(jinko.content_hash)
+
+        summary = import_catalogue(catalogue_csv(*rows))
+        self.assertEqual((summary['inserted'], summary['changed'], summary['unchanged']), (0, 0, 2))
+
+        # matched by company, series and model name regardless of case and spacing
+        summary = import_catalogue(catalogue_csv(('', 'jinko', 'Tiger  Neo', 'jkm540m', '550 W', '21.3 %')))
+        self.assertEqual((summary['inserted'], summary['changed']), (0, 1))
+        self.assertEqual(ManufacturerData.objects.count(), 2)
+        jinko.refresh_from_db()
+        self.assertEqual(jinko.pmax_num, 550.0)
+
+    def test_match_by_id_and_repeats_within_a_file(self):
+        existing = ManufacturerData.objects.create(name='Trina', model_name='TSM-DE19', pmax='550 W')
+        summary = import_catalogue(catalogue_csv(
+            (str(existing.id), 'Trina', '', 'TSM-DE19R', '560 W', ''),
+            ('', 'New', '', 'N1', '400 W', ''),
+            ('', 'New', '', 'N1', '405 W', ''),
+        ))
+        self.assertEqual((summary['changed'], summary['inserted']), (2, 1))
+        existing.refresh_from_db()
+        self.assertEqual((existing.model_name, existing.pmax_num), ('TSM-DE19R', 560.0))
+        self.assertEqual(ManufacturerData.objects.get(name='New').pmax_num, 405.0)
+
+    def test_dry_run_writes_nothing(self):
+        summary = import_catalogue(catalogue_csv(('', 'A', '', 'M1', '', ''), ('', 'A', '', 'M1', '1 W', '')),
+                                   dry_run=True)
+        self.assertEqual((summary['inserted'], summary['changed'], summary['dry_run']), (1, 1, True))
+        self.assertFalse(ManufacturerData.objects.exists())
+
+    def test_invalid_rows_are_reported(self):
+        summary = import_catalogue(catalogue_csv(('', '', '', '', '1 W', ''), ('', 'A' * 251, '', 'M', '', ''),
+                                                 ('', 'B', '', 'M', '', '')))
+        self.assertEqual((summary['invalid'], summary['inserted']), (2, 1))
+        self.assertTrue(summary['errors'][0].startswith('Line 2:'))
+
+    def test_chunks_share_state(self):
+        rows = [('', 'C', '', f'M{i}', '', '') for i in range(7)]
+        summary = CatalogueImport(chunk_size=3).run(read_rows(catalogue_csv(*rows, *rows)))
+        self.assertEqual((summary['inserted'], summary['unchanged']), (7, 7))
+
+    def test_ndjson_and_malformed_files(self):
+        stream = io.BytesIO(b'{"name": "D", "model_name": "M"}\n\n[1, 2]\n')
+        with self.assertRaisesMessage(CatalogueError, 'Line 3: expected a JSON object'):
+            import_catalogue(stream, 'ndjson')
+        with self.assertRaises(CatalogueError):
+            import_catalogue(io.BytesIO(b'name\n"' + b'x' * (1 << 20) + b'"\n'))
+        with self.assertRaises(CatalogueError):
+            import_catalogue(io.BytesIO(b''), 'xml')
+
+    def test_backfilled_rows_import_as_unchanged(self):
+        ManufacturerData.objects.create(name='Jinko', series_name='Tiger Neo', model_name='JKM540M', pmax='540 W')
+        ManufacturerData.objects.update(content_hash=None)
+        call_command('backfill_manufacturer_specs', stdout=io.StringIO())
+        summary = import_catalogue(catalogue_csv(('', 'Jinko', 'Tiger Neo', 'JKM540M', '540 W', '')))
+        self.assertEqual((summary['unchanged'], summary['changed']), (1, 0))
+
+    def test_insert_values_returns_ids_in_order(self):
+        now = timezone.now()
+        fields = ['name', 'model_name', 'cells_per_module_num', 'created_at', 'updated_at']
+        ids = insert_values(ManufacturerData, fields, [('A', f'M{i}', 60, now, now) for i in range(5)], batch_size=2)
+        self.assertEqual(ids, list(ManufacturerData.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual([ManufacturerData.objects.get(id=i).model_name for i in ids], [f'M{i}' for i in range(5)])
+
+
+class ReferenceCacheTests(TestCase):
+    def setUp(self):
+        MaterialRecovery.objects.create(material='Silver', recovery_rate='95', min_market_price='$800',
+                                        max_market_price='$600')
+        risk = ThermalRiskInspection.objects.create(
+            risk_type='Critical Overheating', recommended_frequency='Weekly', estimated_drone_time='15 min',
+            trigger_response_time='Within 24 hours')
+        risk.inspection_type.add(InspectionType.objects.create(name='Thermal'),
+                                 InspectionType.objects.create(name='Aerial'))
+
+    def test_rows_are_parsed_once(self):
+        tables = ReferenceCache(check_seconds=60).get()
+        silver = tables.materials['Silver']
+        self.assertEqual((silver.recovery_rate, silver.min_price, silver.max_price), (0.95, 600.0, 800.0))
+        risk = tables.risks['Critical Overheating']
+        self.assertEqual((risk.drone_minutes, risk.response_hours), (15.0, 24.0))
+        self.assertEqual(risk.inspection_types, ('Aerial', 'Thermal'))
+        self.assertEqual(tables.inspection_types, ('Aerial', 'Thermal'))
+
+    def test_edits_show_within_check_seconds(self):
+        clock = mock.patch.object(reference.time, 'monotonic', return_value=1000.0)
+        monotonic = clock.start()
+        self.addCleanup(clock.stop)
+        cache = ReferenceCache(check_seconds=2.0)
+        first = cache.get()
+        MaterialRecovery.objects.filter(material='Silver').update(recovery_rate='50')
+        DataVersion.bump(REFERENCE_DATA)
+        # inside the window readers keep the old snapshot without a query
+        monotonic.return_value = 1001.9
+        with self.assertNumQueries(0):
+            self.assertIs(cache.get(), first)
+        # the first read after it checks the version and reloads
+        monotonic.return_value = 1002.0
+        self.assertEqual(cache.get().materials['Silver'].recovery_rate, 0.5)
+        with self.assertNumQueries(0):
+            cache.get()
+        monotonic.return_value = 1004.0
+        with self.assertNumQueries(1):          # version unchanged: no reload
+            cache.get()
+
+
+class RecyclingTests(TestCase):
+    def setUp(self):
+        MaterialRecovery.objects.create(material='Glass', recovery_rate='90', min_market_price='$1',
+                                        max_market_price='$2')
+        MaterialRecovery.objects.create(material='Aluminum', recovery_rate='50', min_market_price='$2',
+                                        max_market_price='$4')
+        DataVersion.bump(REFERENCE_DATA)
+        cache = mock.patch.object(recycling, 'reference_tables', ReferenceCache(check_seconds=0))
+        cache.start()
+        self.addCleanup(cache.stop)
+        self.user = User.objects.create(email='recycler@example.com', name='recycler')
+        other = User.objects.create(email='other-recycler@example.com', name='other')
+        self.model = ManufacturerData.objects.create(name='Acme', pmax='400 W', cell_type='Mono PERC')
+        self.recycle = [SolarPanels.objects.create(user=self.user, companyName='Acme', installationYear='2015',
+                                                   manufacturer=self.model, decision='Recycle Panel')
+                        for _ in range(3)]
+        SolarPanels.objects.create(user=self.user, companyName='Unknown', installationYear='2015',
+                                   decision='Recycle Panel')
+        SolarPanels.objects.create(user=self.user, companyName='Acme', installationYear='2023',
+                                   manufacturer=self.model, decision='Monitor')
+        SolarPanels.objects.create(user=other, companyName='Acme', installationYear='2015', manufacturer=self.model,
+                                   decision='Recycle Panel')
+
+    def test_panel_types_and_masses(self):
+        self.assertEqual(panel_type_code('Thin Film', None), 1)
+        self.assertEqual(panel_type_code(None, 'CdTe'), 1)
+        self.assertEqual(panel_type_code('Monocrystalline', 'Mono PERC'), 0)
+        self.assertEqual(panel_type_code(None, None), 0)
+        # 400 W crystalline, unknown wattage, 100 W thin film, then a typo'd 20 kW clipped to the range
+        masses = panel_masses([400, np.nan, 100, 20000], np.array([0, 0, 1, 0]))
+        np.testing.assert_allclose(masses, [22.0, 20.0, 7.7, 50.0])
+
+    def test_vectors_use_aliases_and_flag_unpriced(self):
+        rates, low, high, priced = recovery_vectors()
+        glass, aluminium = MATERIALS.index('glass'), MATERIALS.index('aluminium')
+        self.assertEqual((rates[glass], low[glass], high[glass]), (0.9, 1.0, 2.0))
+        self.assertEqual((rates[aluminium], high[aluminium]), (0.5, 4.0))
+        self.assertEqual(priced.sum(), 2)
+        self.assertEqual(rates[MATERIALS.index('silver')], 0.0)
+
+    def test_summary_weights_groups_by_count(self):
+        masses, codes = panel_masses([400, np.nan], np.array([0, 1])), np.array([0, 1])
+        per_panel = estimate(masses, codes)
+        summary = summarize(masses, codes, [3, 2])
+        self.assertEqual(summary['panels'], 5)
+        recovered = 3 * per_panel['recovered_kg'][0].sum() + 2 * per_panel['recovered_kg'][1].sum()
+        self.assertAlmostEqual(summary['recovered_kg'], round(recovered, 1))
+        self.assertAlmostEqual(summary['value_max'], round(3 * per_panel['value_max'][0]
+                                                           + 2 * per_panel['value_max'][1], 2))
+        empty = summarize(masses[:0], codes[:0], [])
+        self.assertEqual((empty['panels'], empty['mass_kg'], empty['value_max']), (0, 0.0, 0.0))
+
+    def test_site_estimate_counts_own_recycle_panels(self):
+        client = api_client(self.user)
+        body = client.get('/api/recycling/estimate/').json()
+        self.assertEqual(body['panels'], 4)
+        expected = summarize(panel_masses([400, np.nan], np.zeros(2, dtype=np.int64)), np.zeros(2, dtype=np.int64),
+                             [3, 1])
+        self.assertEqual(body['recovered_kg'], expected['recovered_kg'])
+        self.assertEqual(body['value_min'], expected['value_min'])
+        self.assertNotIn('results', body)
+        self.assertEqual(client.get('/api/recycling/estimate/?decision=any').json()['panels'], 5)
+        detail = client.get('/api/recycling/estimate/?detail=2').json()['results']
+        self.assertEqual([row['id'] for row in detail], [panel.id for panel in self.recycle[:2]])
+        self.assertEqual(detail[0]['mass_kg'], 22.0)
+        self.assertEqual(client.get('/api/recycling/estimate/?decision=Scrap').status_code, 400)
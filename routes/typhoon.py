@@ -0,0 +1,189 @@
+import math
+import time
+import numpy as np
+from django.utils import timezone
+from .bulk import update_from_values
+from .geo import EARTH_RADIUS_KM, cell_filter, radius_box
+from .models import SolarPanels, TyphoonEvent
+
+MAX_TRACK_POINTS = 500
+MAX_RADIUS_KM = 2000
+UPDATE_CHUNK_SIZE = 5000                # panels per UPDATE; each chunk commits on its own
+BOXES_PER_QUERY = 8                     # track boxes per candidate query: at most 8 x 16 geo_cell ranges
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+PROJECTION_SLACK = 0.01                 # exposure()'s equirectangular distances are within 1% at storm scales
+
+
+class TrackError(ValueError):
+    pass
+
+
+def parse_track(points):
+    """
+    Validates a storm track: a list of {lat, lon, speed, radius_km} points
+    in time order, with an optional outer_radius_km (gale band, defaults to
+    radius_km). `speed` uses the currentTyphoonSpeed scale. Returns a dict
+    of float arrays.
+    """
+    if not isinstance(points, list) or not points:
+        raise TrackError("'track' must be a non-empty list of points")
+    if len(points) > MAX_TRACK_POINTS:
+        raise TrackError(f"At most {MAX_TRACK_POINTS} track points")
+    columns = {name: [] for name in ('lat', 'lon', 'speed', 'radius_km', 'outer_radius_km')}
+    for k, point in enumerate(points):
+        try:
+            lat, lon = float(point['lat']), float(point['lon'])
+            speed, radius = float(point['speed']), float(point['radius_km'])
+            outer = float(point.get('outer_radius_km') or radius)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise TrackError(f"Point {k}: lat, lon, speed and radius_km must be numbers")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise TrackError(f"Point {k}: coordinates out of range")
+        if not 0 < radius <= outer <= MAX_RADIUS_KM:
+            raise TrackError(f"Point {k}: need 0 < radius_km <= outer_radius_km <= {MAX_RADIUS_KM}")
+        for name, value in zip(columns, (lat, lon, speed, radius, outer)):
+            columns[name].append(value)
+    return {name: np.array(values, dtype=np.float64) for name, values in columns.items()}
+
+
+def _segments(track):
+    n = len(track['lat'])
+    starts = np.arange(max(n - 1, 1))
+    return starts, np.minimum(starts + 1, n - 1)
+
+
+def track_boxes(track):
+    """
+    (south, west, north, east) boxes that together cover every point within
+    reach of the track. Each segment is sampled at points no further apart
+    than its smaller outer radius; a box spans the segment's larger outer
+    radius plus half that spacing, so a point within reach of anywhere on
+    the segment is within a box radius of the nearest sample, whatever the
+    track's heading. PROJECTION_SLACK absorbs the difference between
+    exposure()'s flat projection and the great-circle boxes.
+    """
+    boxes = []
+    for a, b in zip(*_segments(track)):
+        reach = min(track['outer_radius_km'][a], track['outer_radius_km'][b])
+        widest = max(track['outer_radius_km'][a], track['outer_radius_km'][b])
+        dlon = (track['lon'][b] - track['lon'][a] + 180.0) % 360.0 - 180.0
+        dlat = track['lat'][b] - track['lat'][a]
+        # measured the way exposure() projects the segment, from its mid-latitude
+        scale = math.cos(math.radians((track['lat'][a] + track['lat'][b]) / 2))
+        length = math.hypot(dlon * scale, dlat) * KM_PER_DEGREE
+        steps = int(math.ceil(length / reach))
+        radius = (widest + length / max(steps, 1) / 2) * (1.0 + PROJECTION_SLACK)
+        for t in np.linspace(0.0, 1.0, steps + 1):
+            lon = (track['lon'][a] + t * dlon + 180.0) % 360.0 - 180.0
+            boxes.append(radius_box(track['lat'][a] + t * dlat, lon, radius))
+    return boxes
+
+
+def _candidates(track, queryset):
+    """
+    (ids, lat, lon) of panels that may lie within reach of the track: those
+    in the geo_cell ranges covering track_boxes() (antimeridian included).
+    Boxes are queried in runs of BOXES_PER_QUERY consecutive ones, so each
+    statement holds a bounded number of geo_cell index ranges over a
+    compact stretch of track; panels found by overlapping runs are kept once.
+    """
+    boxes = track_boxes(track)
+    rows = []
+    for start in range(0, len(boxes), BOXES_PER_QUERY):
+        rows.extend(queryset.filter(cell_filter(boxes[start:start + BOXES_PER_QUERY]))
+                    .values_list('id', 'latitude', 'longitude'))
+    rows = np.array(rows, dtype=np.float64).reshape(-1, 3)
+    _, first = np.unique(rows[:, 0], return_index=True)
+    rows = rows[first]
+    return rows[:, 0].astype(np.int64), rows[:, 1], rows[:, 2]
+
+
+def exposure(track, lat, lon):
+    """
+    Per-panel exposure to a track: (affected, speed). A panel is affected
+    within the outer radius of the track, interpolated along each segment;
+    inside the core radius it gets the interpolated storm speed (NaN
+    elsewhere). Distances use a local equirectangular projection per
+    segment, accurate to well under 1% at storm scales.
+    """
+    affected = np.zeros(len(lat), dtype=bool)
+    speed = np.full(len(lat), -np.inf)
+    for a, b in zip(*_segments(track)):
+        lat0 = (track['lat'][a] + track['lat'][b]) / 2
+        scale = math.cos(math.radians(lat0))
+
+        def project(la, lo):
+            dlon = (lo - track['lon'][a] + 180.0) % 360.0 - 180.0
+            return dlon * scale * KM_PER_DEGREE, (la - track['lat'][a]) * KM_PER_DEGREE
+
+        bx, by = project(track['lat'][b], track['lon'][b])
+        px, py = project(lat, lon)
+        length2 = bx * bx + by * by
+        t = np.clip((px * bx + py * by) / length2, 0.0, 1.0) if length2 > 0 else np.zeros(len(lat))
+        distance = np.hypot(px - t * bx, py - t * by)
+
+        def along(name):
+            return track[name][a] + t * (track[name][b] - track[name][a])
+
+        affected |= distance <= along('outer_radius_km')
+        core = distance <= along('radius_km')
+        speed[core] = np.maximum(speed[core], along('speed')[core])
+    return affected, np.where(np.isfinite(speed), speed, np.nan)
+
+
+def apply_flags(event, ids, speed, threshold):
+    """
+    Writes the event's flags to its panels in chunks of UPDATE_CHUNK_SIZE,
+    each its own short transaction. Every affected panel gets reminders;
+    panels whose storm speed reaches `threshold` also get an inspection
+    request and a drone inspection. Flags are only ever raised here, never
+    cleared. Returns the number of inspection requests.
+    """
+    inspect = ~np.isnan(speed) & (speed >= threshold)
+    for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+        chunk = slice(start, start + UPDATE_CHUNK_SIZE)
+        update_from_values(SolarPanels, ['typhoon_event', 'typhoon_speed', 'send_reminders'], [
+            (panel_id, event.id, None if np.isnan(s) else float(s), True)
+            for panel_id, s in zip(ids[chunk].tolist(), speed[chunk].tolist())
+        ])
+        flagged = ids[chunk][inspect[chunk]]
+        if len(flagged):
+            SolarPanels.objects.filter(id__in=flagged.tolist()).update(
+                send_inspection_request=True, schedule_drone_inspection=True)
+    return int(inspect.sum())
+
+
+def fan_out(points, threshold, name='', user=None, queryset=None, dry_run=False):
+    """
+    Finds every panel a storm track reaches and flags it. Candidates come
+    from the geo_cell index (one query per BOXES_PER_QUERY boxes along the
+    track); the exact distance test and the flags are computed for all of
+    them at once.
+    With dry_run nothing is written. Returns (event or None, summary).
+    """
+    started = time.perf_counter()
+    track = parse_track(points)
+    if queryset is None:
+        queryset = SolarPanels.objects.all()
+    ids, lat, lon = _candidates(track, queryset)
+    affected, speed = exposure(track, lat, lon)
+    ids, speed = ids[affected], speed[affected]
+    inspections = int((~np.isnan(speed) & (speed >= threshold)).sum())
+
+    event = None
+    if not dry_run:
+        event = TyphoonEvent.objects.create(name=name, track=points, created_by=user, speed_threshold=threshold)
+        inspections = apply_flags(event, ids, speed, threshold)
+        event.panels_affected = len(ids)
+        event.inspections_requested = inspections
+        event.processing_seconds = time.perf_counter() - started
+        event.completed_at = timezone.now()
+        event.save(update_fields=['panels_affected', 'inspections_requested', 'processing_seconds', 'completed_at'])
+    return event, {
+        'event': event.id if event else None,
+        'candidates': int(len(affected)),
+        'panels_affected': int(len(ids)),
+        'inspections_requested': inspections,
+        'reminders': int(len(ids)),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
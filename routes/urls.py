@@ -10,13 +10,40 @@ urlpatterns = [
     path("register/", RegisterView.as_view(), name='register'),
     path("login/", LoginView.as_view(), name='login'),
     path("predict/", predict_damage, name="predict_damage"),
+    path("predict/batch/", predict_damage_batch, name="predict_damage_batch"),
+    path("ml/models/", ModelRegistryStatsView.as_view(), name='ml_model_stats'),
+    path("thermal/hotspots/", detect_thermal_hotspots, name='detect_thermal_hotspots'),
+    path("telemetry/", TelemetryIngestView.as_view(), name='telemetry_ingest'),
+    path("telemetry/alerts/", TelemetryAlertListView.as_view(), name='telemetry_alerts'),
+    path("telemetry/<int:panel_id>/hourly/", TelemetryHourlyView.as_view(), name='telemetry_hourly'),
+    path("panels/within/bbox/", PanelBBoxView.as_view(), name='panels_within_bbox'),
+    path("panels/within/radius/", PanelRadiusView.as_view(), name='panels_within_radius'),
+    path("panels/nearest/", PanelNearestView.as_view(), name='panels_nearest'),
+    path("panels/grid/<int:z>/<int:x>/<int:y>/", PanelGridTileView.as_view(), name='panel_grid_tile'),
+    path("assessments/", PanelAssessmentListView.as_view(), name='panel_assessments'),
+    path("fleet/rollups/", FleetRollupView.as_view(), name='fleet_rollups'),
+    path("export/<slug:name>.<slug:fmt>", ExportView.as_view(), name='export'),
+    path("typhoons/", TyphoonEventView.as_view(), name='typhoon_events'),
+    path("drone/routes/", DroneRouteView.as_view(), name='drone_routes'),
+    path("recycling/estimate/", RecyclingEstimateView.as_view(), name='recycling_estimate'),
+    path("sites/mosaic/", process_site_mosaic, name='process_site_mosaic'),
+    path("sites/mosaic/<uuid:job_id>/", MosaicJobView.as_view(), name='mosaic_job'),
+    path("sites/<int:panel_id>/defect-grid/", SiteDefectGridView.as_view(), name='site_defect_grid'),
+    path("uploads/", ChunkedUploadCreateView.as_view(), name='chunked_upload_create'),
+    path("uploads/<uuid:upload_id>/", ChunkedUploadDetailView.as_view(), name='chunked_upload_detail'),
+    path("uploads/<uuid:upload_id>/chunks/<int:index>/", ChunkedUploadChunkView.as_view(), name='chunked_upload_chunk'),
+    path("uploads/<uuid:upload_id>/complete/", ChunkedUploadCompleteView.as_view(), name='chunked_upload_complete'),
     path("token/", TokenVerifyView.as_view(), name='token_verify_view'),
     path("token/refresh/", TokenRefreshView.as_view(), name='token_refresh'),
     path("registrations/create/", RegistrationCreateView.as_view(), name='registration_create'),
     path("registrations/list/", RegistrationListView.as_view(), name='registration_list'),
     path("contact/create/", ContactFormCreateView.as_view(), name='contact_create'),
     path("contact/list/", ContactFormListView.as_view(), name='contact_list'),
+    path("donations/create/", DonationCreateView.as_view(), name='donation_create'),
+    path("donations/<int:pk>/recycling/", DonationRecyclingView.as_view(), name='donation_recycling'),
     path("company/all/", ManufacturerDataListView.as_view(), name='manufacturer_list'),
+    path("company/search/", ManufacturerSearchView.as_view(), name='manufacturer_search'),
+    path("company/import/", ManufacturerImportView.as_view(), name='manufacturer_import'),
 ]
 
 if settings.DEBUG:
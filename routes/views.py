@@ -1,122 +1,138 @@
 import os
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from skimage.io import imread
-from skimage.transform import resize
-from skimage.filters import sobel
-import joblib
+from .features import FEATURE_DIM, classify_features, extract_features
+from .ml_registry import registry
+from .chunked import ChunkError, complete_upload, missing_chunks, resolve_uploads, start_upload, upload_file, write_chunk
+from .mosaic import DEFAULT_TILE_SIZE
+from .geo import NEAREST_MAX_KM, bbox_filter, geo_cell, nearest, within_radius
+from .geogrid import MAX_ZOOM, tile_binary, tile_json
+from .export import ExportError, stream_export
+from .catalogue import FORMATS as CATALOGUE_FORMATS, CatalogueError, import_catalogue
+from .rollups import GROUP_FIELDS, move_aggregates, panel_state, rollup
+from .search import manufacturer_search
+from .signals import PANEL_GRID
+from .warranty import apply_warranty, warranty_curves, warranty_summary
+from .typhoon import TrackError, fan_out as fan_out_typhoon
+from .economics import BATCH_SCENARIOS, SCENARIOS, lifetime_economics
+from .recycling import MAX_PANEL_RESULTS, donation_estimate, estimate_panels, panel_recycling
+from .drone import DRONE_SPEED_KMH, FLIGHT_BUDGET_MINUTES, plan_inspections
+from .telemetry import TelemetryError, ingest as ingest_telemetry, text_lines
+from .thermal import HOTSPOT_DELTA, MAX_PANEL_GRID, classify_frames, read_frame, surface_readings
+from .specs import filter_specs, spec_ordering
+from .storage import assessment_key, file_sha256, store_blobs
 from .serializers import *
 from .models import *
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
 from rest_framework import generics, status
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
+import csv
 import datetime
-from django.db import transaction
-
-# MODEL_PATH = os.path.join(os.path.dirname(__file__), 'ml_models', 'model_pipeline.pkl')
-# ENCODER_PATH = os.path.join(os.path.dirname(__file__), 'ml_models', 'label_encoder.pkl')
-
-# model = joblib.load(MODEL_PATH)
-# label_encoder = joblib.load(ENCODER_PATH)
-
-TEMP_SURFACE_FLAT_TOLERANCE = 2         # minimal surface fluctuation
-TEMP_AMBIENT_VARIATION = 5              # significant ambient swing
-TEMP_OVERHEAT_MARGIN = 25               # excess heat above ambient
-TEMP_UNDERHEAT_MARGIN = 10              # unusual cooling below ambient
-TYPHOON_SPEED_THRESHOLD = 8             # typhoon threshold from flowchart "T8"
-
-def _safe_float(val, default=0.0):
-    try:
-        return float(val)
-    except (TypeError, ValueError):
-        return default
-
-def _safe_int(val, default=0):
-    try:
-        return int(val)
-    except (TypeError, ValueError):
-        return default
-
-# def extract_image_features_from_array(img_resized):
-#     """
-#     Build a compact, robust feature vector for image-based classifier:
-#     - mean & std per channel
-#     - overall mean & std
-#     - dark / bright pixel fractions
-#     - edge mean & density
-#     """
-#     if img_resized is None:
-#         return np.zeros((1, 12), dtype=float)
-#     H, W, C = img_resized.shape
-#     flat = img_resized.reshape(-1, 3)
-#     means = flat.mean(axis=0)        
-#     stds = flat.std(axis=0)          
-#     overall_mean = flat.mean()       
-#     overall_std = flat.std()          
-#     lum = img_resized.mean(axis=2)   
-#     dark_frac = float((lum < 0.1).sum()) / lum.size
-#     bright_frac = float((lum > 0.9).sum()) / lum.size
-
-#     vec = np.concatenate([
-#         means.flatten(),
-#         stds.flatten(),
-#         np.array([overall_mean, overall_std, dark_frac, bright_frac])
-#     ])
-#     return vec.reshape(1, -1)  # shape (1, 12)
-
-def compute_damage_type_from_temps(c1, c2, t1, t2):
-    """
-    Implements flowchart temperature branching and returns:
-      (damage_type: str, notes: str)
-    """
-    if c1 is None or c2 is None:
-        return "Unknown", "Missing surface temperature readings"
-
-    # if ambient readings exist, check unresponsive sensors or abnormal behavior
-    if t1 is not None and t2 is not None:
-        # flat surface but ambient swings -> sensor/panel unresponsive
-        if abs(c2 - c1) < TEMP_SURFACE_FLAT_TOLERANCE and abs(t2 - t1) > TEMP_AMBIENT_VARIATION:
-            return "Sensor or panel unresponsive", "Surface flat while ambient swings"
-    # overheating checks relative to ambient if ambient available
-    if t2 is not None:
-        if (c2 - t2) > TEMP_OVERHEAT_MARGIN:
-            return "Critical overheating", f"C2-T2 > {TEMP_OVERHEAT_MARGIN}"
-        if (c2 - t2) > 0 and (c2 - t2) <= TEMP_OVERHEAT_MARGIN:
-            return "Excessive heating", "Moderate heating vs ambient"
-    # underheat check: surface significantly lower than ambient min
-    if t1 is not None:
-        if (t1 - c1) > TEMP_UNDERHEAT_MARGIN:
-            return "Unusual cooling", f"T1 - C1 > {TEMP_UNDERHEAT_MARGIN}"
-    return "Normal", "Temperatures within expected ranges"
-
-def compute_economic_S(system_cost, installed_capacity_kwp, annual_irradiation,
-                       lifetime_years, electricity_rate, savings_per_year, maintenance_cost):
-    """
-    Rough implementation of flowchart economic S:
-      - compute annual_energy = installed_capacity_kWp * annual_irradiation * (1 - loss_factor)
-      - compute cost_per_kwh = system_cost / (annual_energy * lifetime_years)
-      - compute S1 = (electricity_rate - cost_per_kwh) (theoretical saving per kWh)
-      - normalize S1 by expected annual savings to get a dimensionless indicator S_theoretical
-    Note: We do not attempt to implement PVGIS in-host; the caller should pass a loss_factor
-    if available. We'll defensively handle zero / missing values.
+import gzip
+import io
+import json
+import time
+import numpy as np
+from django.db import IntegrityError, transaction
+from .assessment import (
+    DEFAULT_THRESHOLDS, _optional_float, _safe_int,
+    DECISIONS, assess, build_payload, history_fields, parse_panel_params, raw_inputs,
+    stack_params, stored_fields,
+)
+
+MAX_BATCH_PANELS = 2500                 # panels per predict/batch/ request
+MAX_HOURLY_ROWS = 24 * 366              # one year of hourly telemetry rollups per query
+MAX_GEO_RESULTS = 1000                  # panels per bbox/radius/nearest query
+GEO_PANEL_FIELDS = ('id', 'companyName', 'latitude', 'longitude', 'damage_type', 'decision', 'S_value')
+
+def _classify_images(image_files):
     """
-    try:
-        if installed_capacity_kwp is None or annual_irradiation is None:
-            return None, None
-
-        # Loss factor placeholder: if caller provided a loss factor key, use it; else assume small loss
-        # caller may pass 'lossFactor' in request.POST; we'll fetch it above in the main handler
-    except Exception:
-        return None, None
-
-    # The main function will call this with proper values.
-    return None, None  # placeholder - main function uses a small local implementation
+    Runs the image classifier over a list of uploads. Returns (labels,
+    damage_probs, normal_labels); labels are "Unknown" and probabilities NaN
+    when no model is deployed.
+    """
+    if registry.get('damage_classifier') is None or not image_files:
+        return classify_features(np.zeros((len(image_files), FEATURE_DIM)))
+    image_feat, _ = extract_features(image_files)  # undecodable images score as all-zero rows
+    return classify_features(image_feat)
+
+def _build_panel(user, params, inputs, blob, result, i, profile):
+    """Unsaved SolarPanels row holding panel i's inputs and verdict."""
+    return SolarPanels(
+        user=user,
+        companyName=params['company_name'],
+        manufacturer_id=params.get('manufacturer_id'),
+        installationYear=params['installation_year'],
+        image=blob.file.name,
+        image_blob=blob,
+        latitude=params['latitude'],
+        longitude=params['longitude'],
+        geo_cell=geo_cell(params['latitude'], params['longitude']),  # bulk_create skips save()
+        assessment_inputs=inputs,
+        threshold_version=profile.version if profile else None,
+        **stored_fields(result, i),
+    )
+
+def _build_assessment(panel, result, i, profile, source):
+    """Unsaved PanelAssessment history row for panel i's verdict."""
+    return PanelAssessment(
+        panel=panel,
+        threshold_version=profile.version if profile else None,
+        source=source,
+        **history_fields(result, i),
+    )
+
+def _with_thermal_readings(data, thermal_file):
+    """
+    Fills C1/C2 from a radiometric thermal frame when the caller did not
+    type them in. Returns (data, thermal summary for the response).
+    """
+    c1, c2, summary = surface_readings(thermal_file)
+    data = data.copy()
+    if c1 is not None and data.get('C1') in (None, ''):
+        data['C1'] = str(c1)
+    if c2 is not None and data.get('C2') in (None, ''):
+        data['C2'] = str(c2)
+    return data, summary
+
+def _resolve_manufacturers(params):
+    """
+    Links each parse_panel_params() dict to the ManufacturerData row matching
+    its companyName/modelName and swaps in that row's warranty terms.
+    Returns the WarrantyCurve (or None) of every panel.
+    """
+    for p in params:
+        p['manufacturer_id'] = manufacturer_search.resolve(p['company_name'], p['model_name'])
+    by_id = warranty_curves.get_many([p['manufacturer_id'] for p in params])
+    curves = []
+    for p in params:
+        curves.append(by_id.get(p['manufacturer_id']))
+        apply_warranty(p, curves[-1])
+    return curves
+
+def _with_manufacturer(payload, params, curve, now_year):
+    payload['manufacturer_id'] = params['manufacturer_id']
+    payload['warranty'] = warranty_summary(curve, max(now_year - params['installation_year'], 0), params['c2'])
+    return payload
+
+def _with_economics(payloads, params, scenarios):
+    """Adds the Monte Carlo lifetime economics (None without economic inputs) to every payload."""
+    for payload, p in zip(payloads, params):
+        payload['economics'] = lifetime_economics(p, scenarios)
+
+def _with_recycling(payloads, params):
+    """Adds the recycling value estimate to every payload whose decision is "Recycle Panel"."""
+    recycle = [i for i, payload in enumerate(payloads) if payload.get('decision') == 'Recycle Panel']
+    for i, estimate in zip(recycle, panel_recycling([params[i]['manufacturer_id'] for i in recycle])):
+        payloads[i]['recycling'] = estimate
 
 @api_view(['POST'])
 @authentication_classes([JWTAuthentication])
@@ -130,272 +146,558 @@ def predict_damage(request):
       - damage_type from temperature checks
       - recommended action (repair/replace/recycle/no-action) with rationale
       - action flags (send_inspection_request, send_reminders, schedule_drone_inspection)
+    A retry with the same image bytes and parameters returns the stored
+    assessment instead of recomputing and saving it again. Large images can
+    be sent through the chunked upload API and referenced by `uploadId`.
+    A radiometric `thermalImage` TIFF supplies C1/C2 when they are not posted.
+    `modelName` is matched against the manufacturer catalogue (typos and
+    missing separators tolerated) and the match is returned as `manufacturer_id`;
+    its warranty terms replace promisedDegradationRate and warrantyAge.
+    A "Recycle Panel" decision carries a `recycling` estimate: module mass,
+    recoverable material mass and value range from MaterialRecovery prices.
+    `economics` holds P10/P50/P90 of S, LCOE and NPV over simulated
+    degradation, price, irradiation and loss scenarios (routes.economics).
     """
-    if not request.FILES.get('image'):
+    if request.POST.get('uploadId'):
+        upload = resolve_uploads([request.POST['uploadId']], request.user).get(request.POST['uploadId'])
+        if upload is None:
+            return JsonResponse({'error': 'Unknown or incomplete upload'}, status=400)
+        image_file = upload_file(upload)
+    elif request.FILES.get('image'):
+        image_file = request.FILES['image']
+    else:
         return JsonResponse({'error': 'POST an image'}, status=400)
 
-    image_file = request.FILES['image']
-
-    company_name = request.POST.get('companyName', 'Unknown')
-    model_name = request.POST.get('modelName', None)
-    installation_year = _safe_int(request.POST.get('installationYear'), datetime.datetime.now().year)
-    savings_per_year = _safe_float(request.POST.get('savingsPerYear'), 0.0)
-    maintenance_cost = _safe_float(request.POST.get('maintenanceCost'), 1.0)  # avoid /0
-    kwh_generated = _safe_float(request.POST.get('kwhGenerated', 0.0), 0.0)
-
-    promised_degradation = _safe_float(request.POST.get('promisedDegradationRate', 0.01), 0.01)
-    current_degradation = _safe_float(request.POST.get('currentDegradationRate', 0.01), 0.01)
-    current_typhoon_speed = _safe_float(request.POST.get('currentTyphoonSpeed', 0.0), 0.0)
-    promised_wind_speed = _safe_float(request.POST.get('promisedWindBearingSpeed', 1.0), 1.0)
-    warranty_age = _safe_int(request.POST.get('warrantyAge', 25), 25)
-    x1 = _safe_int(request.POST.get('sensorAlert', 0), 0)
-    x2 = _safe_int(request.POST.get('typhoonAlert', 0), 0)
-    c1 = request.POST.get('C1')
-    c2 = request.POST.get('C2')
-    t1 = request.POST.get('T1')
-    t2 = request.POST.get('T2') 
-
-    c1 = None if c1 in (None, '', 'None') else _safe_float(c1, None)
-    c2 = None if c2 in (None, '', 'None') else _safe_float(c2, None)
-    t1 = None if t1 in (None, '', 'None') else _safe_float(t1, None)
-    t2 = None if t2 in (None, '', 'None') else _safe_float(t2, None)
-
-    installed_capacity_kwp = _safe_float(request.POST.get('installedCapacity_kWp', 0.0), 0.0)
-    annual_irradiation = _safe_float(request.POST.get('annualIrradiation', 0.0), 0.0)  # kWh/m^2
-    system_cost = _safe_float(request.POST.get('systemCost', 0.0), 0.0)
-    electricity_rate = _safe_float(request.POST.get('electricityRate', 0.0), 0.0)
-    loss_factor = _safe_float(request.POST.get('lossFactor', 0.10), 0.10)  # default 10% loss
-    lifetime_years = _safe_int(request.POST.get('lifetimeYears', 25), 25)
-
-    current_age = datetime.datetime.now().year - installation_year
-
-    damage_type_temp, temp_notes = compute_damage_type_from_temps(c1, c2, t1, t2)
-
-    if c1 is not None and c2 is not None and c2 < c1:
-        damage_type_temp = "Sensor anomaly (C2 < C1)"
-        temp_notes = "C2 < C1 (max < min) - possible sensor mis-reporting"
-
-    if current_age < 0:
-        current_age = 0  # defensive
-
-    if current_age > 25 or current_age > warranty_age:
+    data, thermal = request.POST, None
+    if request.FILES.get('thermalImage'):
         try:
-            solar_panel = SolarPanels.objects.create(
-                user=request.user,
-                companyName=company_name,
-                installationYear=installation_year,
-                image=image_file,
-                latitude=request.POST.get('latitude'),
-                longitude=request.POST.get('longitude'),
-            )
+            data, thermal = _with_thermal_readings(request.POST, request.FILES['thermalImage'])
+        except Exception as e:
+            return JsonResponse({'error': f'Could not read thermal image: {e}'}, status=400)
+
+    now_year = datetime.datetime.now().year
+    params = parse_panel_params(data, now_year)
+    inputs = raw_inputs(data)
+    profile = ThresholdProfile.active()
+    curve = _resolve_manufacturers([params])[0]
+
+    key = assessment_key(request.user.id, file_sha256(image_file), inputs,
+                         profile.version if profile else None, now_year, curve)
+    cached = CachedAssessment.objects.filter(key=key).values_list('payload', flat=True).first()
+    if cached is not None:
+        return JsonResponse(cached)
+
+    labels, damage_probs, normal_labels = _classify_images([image_file])
+    label = labels[0]
+
+    result = assess(
+        stack_params([params]),
+        now_year=now_year,
+        damage_prob=damage_probs,
+        normal_label=normal_labels,
+        thresholds=profile.as_thresholds() if profile else DEFAULT_THRESHOLDS,
+    )
+    response_payload = _with_manufacturer(build_payload(result, 0, label), params, curve, now_year)
+    _with_economics([response_payload], [params], SCENARIOS)
+    _with_recycling([response_payload], [params])
+    if thermal is not None:
+        response_payload['thermal'] = thermal
 
-            if hasattr(solar_panel, 'damage_type'):
-                setattr(solar_panel, 'damage_type', 'End of life / recycle recommended')
-            if hasattr(solar_panel, 'S_value'):
-                setattr(solar_panel, 'S_value', 0.0)
-            solar_panel.save()
-        except Exception:
-            pass
-
-        return JsonResponse({
-            'prediction': None,
-            'damage_type': 'End of life / recycle recommended',
-            'decision': 'Recycle Panel',
-            'reason': 'Panel age exceeds lifetime or warranty',
-            'saved_id': getattr(solar_panel, 'id', None)
-        })
-
-    S_sensor = None
+    saved_id = None
     try:
-        if x1 == 1:
-            S_sensor = (savings_per_year / max(maintenance_cost, 1e-6)) * (
-                promised_degradation / (current_degradation * current_age + 1)
-            )
-        elif x2 == 1:
-            S_sensor = (savings_per_year / max(maintenance_cost, 1e-6)) * (
-                (promised_degradation * promised_wind_speed) /
-                (current_degradation * current_age * max(1.0, current_typhoon_speed) + 1)
-            )
-        else:
-            S_sensor = (savings_per_year / max(maintenance_cost, 1e-6)) * (
-                promised_degradation / (current_degradation + current_age + 1)
-            )
+        with transaction.atomic():
+            blob = store_blobs([image_file])[0]
+            solar_panel = _build_panel(request.user, params, inputs, blob, result, 0, profile)
+            solar_panel.save()
+            _build_assessment(solar_panel, result, 0, profile, PanelAssessment.SOURCE_PREDICT).save()
+            saved_id = solar_panel.id
+            response_payload['saved_id'] = saved_id
+            CachedAssessment.objects.create(key=key, panel=solar_panel, payload=response_payload)
+    except IntegrityError:
+        # a concurrent retry of the same upload won the race; answer with its result
+        cached = CachedAssessment.objects.filter(key=key).values_list('payload', flat=True).first()
+        if cached is not None:
+            return JsonResponse(cached)
+        saved_id = None
     except Exception:
-        S_sensor = None
+        saved_id = None
 
-    S_theoretical = None
-    try:
-        if installed_capacity_kwp > 0 and annual_irradiation > 0 and lifetime_years > 0 and system_cost > 0:
-            annual_energy = installed_capacity_kwp * annual_irradiation * max(0.0, (1.0 - loss_factor))
-            if annual_energy > 0:
-                cost_per_kwh = system_cost / (annual_energy * lifetime_years)
-                S1 = (electricity_rate - cost_per_kwh)
-                denom = max(1e-6, savings_per_year)
-                S_theoretical = S1 / (denom / (annual_energy + 1e-6))  # normalized indicator
-    except Exception:
-        S_theoretical = None
+    response_payload['saved_id'] = saved_id
+    return JsonResponse(response_payload)
 
-    S_candidates = [v for v in (S_sensor, S_theoretical) if v is not None]
-    S_value = S_candidates[0] if S_candidates else 0.0
+def _batch_rows(request):
+    """
+    Reads the batch parameter table: a JSON array in the `panels` field, or
+    CSV either uploaded as the `parameters` file or posted as a text field.
+    """
+    if request.POST.get('panels'):
+        rows = json.loads(request.POST['panels'])
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("'panels' must be a JSON array of objects")
+        return rows
+    if request.FILES.get('parameters'):
+        text = io.TextIOWrapper(request.FILES['parameters'].file, encoding='utf-8-sig')
+        return list(csv.DictReader(text))
+    if request.POST.get('parameters'):
+        return list(csv.DictReader(io.StringIO(request.POST['parameters'])))
+    raise ValueError("POST a parameter table as 'panels' (JSON) or 'parameters' (CSV)")
 
+@api_view(['POST'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def predict_damage_batch(request):
+    """
+    Batch variant of predict_damage for whole site visits.
+    Takes a parameter table (one row per panel, same keys as predict_damage)
+    plus multipart images. A row names its image with an `image` key holding
+    the multipart field name or an `uploadId` from the chunked upload API;
+    otherwise the i-th file of `images` is used. A `thermalImage` key names
+    a radiometric TIFF field that supplies the row's C1/C2.
+    All panels are scored in one vectorized pass and saved with a single
+    bulk_create. `results` holds one predict_damage-shaped payload per row.
+    Rows already assessed (same image bytes and parameters) reuse the stored
+    result, as do repeated rows within the batch.
+    """
     try:
-        S_value_float = float(S_value)
-    except Exception:
-        S_value_float = 0.0
-
-    # try:
-    #     img = imread(image_file)
-    #     if img.ndim == 2:
-    #         img = np.stack((img,) * 3, axis=-1)
-    #     elif img.shape[2] == 4:
-    #         img = img[..., :3]
-    #     img_resized = resize(img, (128, 128), anti_aliasing=True)
-    #     grey = img_resized.mean(axis=-1)
-    #     edges = sobel(grey)
-    #     edge_mean = float(edges.mean())
-    #     edge_density = float((edges > edges.mean()).sum()) / edges.size
-    #     image_feat = extract_image_features_from_array(img_resized)  # shape (1, n)
-    #     image_feat = np.concatenate([image_feat, np.array([[edge_mean, edge_density]])], axis=1)
-    # except Exception as e:
-    #     # fallback if image read fails
-    #     image_feat = np.zeros((1, 14), dtype=float)
-    #     edge_mean = 0.0
-    #     edge_density = 0.0
-
-    label = "Unknown"
-    damage_prob = None
-    # try:
-    #     pred = model.predict(image_feat)
-    #     if hasattr(label_encoder, 'inverse_transform'):
-    #         try:
-    #             label = label_encoder.inverse_transform([pred[0]])[0]
-    #         except Exception:
-    #             label = str(pred[0])
-    #     else:
-    #         label = str(pred[0])
-    #     if hasattr(model, 'predict_proba'):
-    #         try:
-    #             probs = model.predict_proba(image_feat)[0]
-    #             if hasattr(model, 'classes_'):
-    #                 idx = list(model.classes_).index(pred[0])
-    #                 damage_prob = float(probs[idx])
-    #             else:
-    #                 damage_prob = float(max(probs))
-    #         except Exception:
-    #             damage_prob = None
-    # except Exception:
-    #     label = "Prediction failed"
-    #     damage_prob = None
-
-    damage_score = None
-    if damage_prob is not None:
-        if label and label.lower() in ('normal', 'no_damage', 'ok'):
-            damage_score = 1.0 - damage_prob  # lower damage
-        else:
-            damage_score = damage_prob       # higher prob => more damaged
-    else:
-        # damage_score = float(min(1.0, max(0.0, edge_density * 2.0 * (1.0 if S_value_float < 1.0 else 0.5))))
-        damage_score = float(min(1.0, max(0.0, 2.0 * (1.0 if S_value_float < 1.0 else 0.5))))
-
-    decision = "Undetermined"
-    action_recommendations = []
-    warranty_active = (current_age <= warranty_age)
-    severe_threshold = 0.6
-    medium_threshold = 0.3
-
-    if S_value_float >= 1.0 and damage_score < medium_threshold and damage_type_temp == "Normal":
-        decision = "Panel in good condition"
-        action_recommendations.append("No immediate action required")
-    else:
-        if damage_type_temp in ("Critical overheating", "Sensor or panel unresponsive"):
-            if warranty_active:
-                decision = "Replace with warranty"
-                action_recommendations.append("Issue replacement under warranty; schedule inspection")
-            else:
-                decision = "Replace without warranty"
-                action_recommendations.append("Recommend replacement; warranty expired")
-            action_recommendations.append("Schedule urgent inspection (drone or technician)")
+        rows = _batch_rows(request)
+    except (ValueError, csv.Error) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not rows:
+        return JsonResponse({'error': 'No panels submitted'}, status=400)
+    if len(rows) > MAX_BATCH_PANELS:
+        return JsonResponse({'error': f'At most {MAX_BATCH_PANELS} panels per batch'}, status=400)
+
+    thermal = {}
+    for i, row in enumerate(rows):
+        if row.get('thermalImage'):
+            thermal_file = request.FILES.get(row['thermalImage'])
+            if thermal_file is None:
+                return JsonResponse({'error': f"Row {i}: no file named {row['thermalImage']!r}"}, status=400)
+            try:
+                rows[i], thermal[i] = _with_thermal_readings(row, thermal_file)
+            except Exception as e:
+                return JsonResponse({'error': f'Row {i}: could not read thermal image: {e}'}, status=400)
+
+    images = request.FILES.getlist('images')
+    uploads = resolve_uploads([row.get('uploadId') for row in rows], request.user)
+    image_files = []
+    for i, row in enumerate(rows):
+        if row.get('uploadId'):
+            upload = uploads.get(str(row['uploadId']))
+            image_files.append(upload_file(upload) if upload else None)
+        elif row.get('image'):
+            image_files.append(request.FILES.get(row['image']))
         else:
-            if damage_score >= severe_threshold:
-                if warranty_active:
-                    decision = "Replace with warranty"
-                    action_recommendations.append("High damage detected; replace under warranty")
-                else:
-                    decision = "Replace without warranty"
-                    action_recommendations.append("High damage detected; recommend replacement")
-            elif medium_threshold <= damage_score < severe_threshold:
-                if warranty_active:
-                    decision = "Repair with warranty"
-                    action_recommendations.append("Moderate damage; repair covered under warranty")
-                else:
-                    decision = "Repair without warranty"
-                    action_recommendations.append("Moderate damage; repair recommended (out-of-warranty)")
-            else:
-                decision = "Panel in good condition"
-                action_recommendations.append("Minor / uncertain damage; monitor or request user confirmation")
-
-    send_reminders = False
-    schedule_drone_inspection = False
-    send_inspection_request = False
-    if x2 == 1 or current_typhoon_speed >= TYPHOON_SPEED_THRESHOLD:
-        send_inspection_request = True
-        schedule_drone_inspection = True
-        send_reminders = True
-        action_recommendations.append("Typhoon alert: schedule drone inspection within 48 hours after typhoon")
-    if x1 == 1 and damage_type_temp.startswith("Sensor"):
-        send_reminders = True
-        action_recommendations.append("Sensor abnormal: request sensor diagnostics and visual inspection")
+            image_files.append(images[i] if i < len(images) else None)
+
+    now_year = datetime.datetime.now().year
+    profile = ThresholdProfile.active()
+    version = profile.version if profile else None
+    inputs = [raw_inputs(row) for row in rows]
+    params = [parse_panel_params(row, now_year) for row in rows]
+    curves = _resolve_manufacturers(params)
+    keys = [
+        assessment_key(request.user.id, file_sha256(image_file), inputs[i], version, now_year, curves[i])
+        if image_file is not None else None
+        for i, image_file in enumerate(image_files)
+    ]
+    cached = dict(CachedAssessment.objects.filter(key__in=[k for k in keys if k]).values_list('key', 'payload'))
+
+    first_seen = {}
+    fresh = []
+    for i, key in enumerate(keys):
+        if key is not None and key not in cached and key not in first_seen:
+            first_seen[key] = i
+            fresh.append(i)
+
+    params = [params[i] for i in fresh]
+    labels, damage_probs, normal_labels = _classify_images([image_files[i] for i in fresh])
+    result = assess(stack_params(params), now_year=now_year,
+                    damage_prob=damage_probs, normal_label=normal_labels,
+                    thresholds=profile.as_thresholds() if profile else DEFAULT_THRESHOLDS) if fresh else None
+
+    payloads = {}
+    for j, i in enumerate(fresh):
+        payloads[keys[i]] = _with_manufacturer(build_payload(result, j, labels[j]), params[j], curves[i], now_year)
+        if i in thermal:
+            payloads[keys[i]]['thermal'] = thermal[i]
+    _with_economics([payloads[keys[i]] for i in fresh], params, BATCH_SCENARIOS)
+    _with_recycling([payloads[keys[i]] for i in fresh], params)
 
-    saved_id = None
     try:
         with transaction.atomic():
-            solar_panel = SolarPanels.objects.create(
-                user=request.user,
-                companyName=company_name,
-                installationYear=installation_year,
-                image=image_file,
-                latitude=request.POST.get('latitude'),
-                longitude=request.POST.get('longitude')
-            )
-            optional_updates = {
-                'damage_type': damage_type_temp,
-                'damage_label': label,
-                'damage_probability': damage_prob,
-                'S_value': S_value_float,
-                'decision': decision,
-                'damage_score': damage_score,
-            }
-            for k, v in optional_updates.items():
-                if hasattr(solar_panel, k):
-                    try:
-                        setattr(solar_panel, k, v)
-                    except Exception:
-                        pass
-            solar_panel.save()
-            saved_id = solar_panel.id
+            blobs = store_blobs([image_files[i] for i in fresh])
+            created = SolarPanels.objects.bulk_create([
+                _build_panel(request.user, params[j], inputs[i], blobs[j], result, j, profile)
+                for j, i in enumerate(fresh)
+            ])
+            for i, solar_panel in zip(fresh, created):
+                payloads[keys[i]]['saved_id'] = solar_panel.id
+            move_aggregates(added=[panel_state(solar_panel) for solar_panel in created])
+            PanelAssessment.objects.bulk_create([
+                _build_assessment(solar_panel, result, j, profile, PanelAssessment.SOURCE_BATCH)
+                for j, solar_panel in enumerate(created)
+            ])
+            CachedAssessment.objects.bulk_create([
+                CachedAssessment(key=keys[i], panel=solar_panel, payload=payloads[keys[i]])
+                for i, solar_panel in zip(fresh, created)
+            ], ignore_conflicts=True)
     except Exception:
-        saved_id = None
+        for payload in payloads.values():
+            payload['saved_id'] = None
 
-    response_payload = {
-        'prediction_label': label,
-        'damage_probability': damage_prob,
-        'damage_score': damage_score,
-        'damage_type_from_temps': damage_type_temp,
-        'temperature_notes': temp_notes,
-        'S_value': S_value_float,
-        'S_components': {
-            'sensor_based_S': S_sensor,
-            'theoretical_S': S_theoretical
-        },
-        'decision': decision,
-        'action_recommendations': action_recommendations,
-        'send_inspection_request': send_inspection_request,
-        'schedule_drone_inspection': schedule_drone_inspection,
-        'send_reminders': send_reminders,
-        'saved_id': saved_id,
+    results = []
+    for key in keys:
+        if key is None:
+            results.append({'error': 'POST an image'})
+        else:
+            results.append(cached.get(key) or payloads[key])
+
+    return JsonResponse({'count': len(results), 'results': results})
+
+def _upload_status(upload):
+    return {
+        'uploadId': str(upload.id),
+        'fileName': upload.file_name,
+        'totalSize': upload.total_size,
+        'chunkSize': upload.chunk_size,
+        'chunkCount': upload.chunk_count,
+        'status': upload.status,
+        'sha256': upload.sha256 or None,
     }
 
-    return JsonResponse(response_payload)
+class ChunkedUploadCreateView(APIView):
+    """Starts a resumable upload; chunks are then PUT to uploads/<id>/chunks/<index>/."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            upload = start_upload(
+                request.user,
+                request.data.get('fileName', 'upload'),
+                int(request.data.get('totalSize', 0)),
+                chunk_size=int(request.data['chunkSize']) if request.data.get('chunkSize') else None,
+                content_type=request.data.get('contentType', ''),
+                sha256=request.data.get('sha256', ''),
+            )
+        except (ChunkError, TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(_upload_status(upload), status=status.HTTP_201_CREATED)
+
+class ChunkedUploadDetailView(APIView):
+    """Upload status, including the chunk indexes still missing (for resuming)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, upload_id):
+        upload = ChunkedUpload.objects.filter(id=upload_id, user=request.user).first()
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({**_upload_status(upload), 'missingChunks': missing_chunks(upload)})
+
+class ChunkedUploadChunkView(APIView):
+    """Raw chunk bytes in the request body, verified against X-Chunk-SHA256."""
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, upload_id, index):
+        upload = ChunkedUpload.objects.filter(id=upload_id, user=request.user).first()
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            received = write_chunk(upload, index, request.stream, request.headers.get('X-Chunk-SHA256', ''))
+        except ChunkError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'index': index, 'received': received, 'chunkCount': upload.chunk_count})
+
+class ChunkedUploadCompleteView(APIView):
+    """Assembles the upload; its uploadId can then replace an image file field."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id):
+        upload = ChunkedUpload.objects.filter(id=upload_id, user=request.user).first()
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            upload = complete_upload(upload)
+        except ChunkError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(_upload_status(upload))
+
+def _defect_grid_payload(grid):
+    profile = ThresholdProfile.active()
+    thresholds = profile.as_thresholds() if profile else DEFAULT_THRESHOLDS
+    scores = grid.scores_array()
+    valid = scores[~np.isnan(scores)]
+    return {
+        'saved_id': grid.panel_id,
+        'tile_size': grid.tile_size,
+        'rows': grid.rows,
+        'cols': grid.cols,
+        'width': grid.width,
+        'height': grid.height,
+        'tiles_scored': int(valid.size),
+        'mean_damage_score': float(valid.mean()) if valid.size else None,
+        'severe_tiles': int((valid >= thresholds.severe_damage_threshold).sum()),
+        'labels': grid.label_names,
+        'label_codes': grid.label_codes_array().tolist(),
+        'scores': [[None if np.isnan(v) else round(float(v), 4) for v in row] for row in scores],
+        'processing_seconds': grid.processing_seconds,
+    }
+
+@api_view(['POST'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def process_site_mosaic(request):
+    """
+    Queues a whole-site orthomosaic (a GeoTIFF sent through the chunked
+    upload API, referenced by `uploadId`) for tile-by-tile scoring. The
+    process_mosaic_jobs command scores it off the request path and stores
+    the defect grid with a SolarPanels site record; poll the returned job.
+    """
+    upload = resolve_uploads([request.POST.get('uploadId')], request.user).get(request.POST.get('uploadId'))
+    if upload is None:
+        return JsonResponse({'error': 'POST the uploadId of a completed upload'}, status=400)
+    tile_size = _safe_int(request.POST.get('tileSize'), DEFAULT_TILE_SIZE)
+    if not 64 <= tile_size <= 4096:
+        return JsonResponse({'error': 'tileSize must be between 64 and 4096'}, status=400)
+    try:
+        upload.blob.file.path
+    except NotImplementedError:
+        return JsonResponse({'error': 'Mosaic processing needs local media storage'}, status=400)
+
+    job = MosaicJob.objects.create(user=request.user, upload=upload, tile_size=tile_size,
+                                   inputs=raw_inputs(request.POST))
+    return JsonResponse(_mosaic_job_payload(job), status=202)
+
+def _mosaic_job_payload(job):
+    payload = {'job_id': str(job.id), 'status': job.status}
+    if job.status == "failed":
+        payload['error'] = job.error
+    elif job.status == "complete" and job.site_id is not None:
+        payload['defect_grid'] = _defect_grid_payload(job.site.defect_grid)
+    return payload
+
+class MosaicJobView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = MosaicJob.objects.filter(id=job_id, user=request.user).select_related('site__defect_grid').first()
+        if job is None:
+            return Response({'error': 'No such mosaic job'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(_mosaic_job_payload(job))
+
+class SiteDefectGridView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, panel_id):
+        grid = SiteDefectGrid.objects.filter(panel_id=panel_id, panel__user=request.user).first()
+        if grid is None:
+            return Response({'error': 'No defect grid for this site'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(_defect_grid_payload(grid))
+
+@api_view(['POST'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def detect_thermal_hotspots(request):
+    """
+    Triage for a drone batch of radiometric thermal frames (`frames`, 16-bit
+    or float TIFFs). Each frame shows a panelRows x panelCols grid of panels;
+    every panel gets C1/C2, its hotspots and the temperature-rule damage
+    type, using the visit's ambient T1/T2 when posted. Nothing is saved.
+    """
+    frames = request.FILES.getlist('frames')
+    if not frames:
+        return JsonResponse({'error': 'POST one or more thermal frames as `frames`'}, status=400)
+    if len(frames) > MAX_BATCH_PANELS:
+        return JsonResponse({'error': f'At most {MAX_BATCH_PANELS} frames per request'}, status=400)
+    rows = _safe_int(request.POST.get('panelRows'), 1)
+    cols = _safe_int(request.POST.get('panelCols'), 1)
+    if not (1 <= rows <= MAX_PANEL_GRID and 1 <= cols <= MAX_PANEL_GRID):
+        return JsonResponse({'error': f'panelRows and panelCols must be between 1 and {MAX_PANEL_GRID}'}, status=400)
+    params = parse_panel_params(request.POST)
+    hotspot_delta = _optional_float(request.POST.get('hotspotDelta'))
+    if hotspot_delta is None or hotspot_delta <= 0:
+        hotspot_delta = HOTSPOT_DELTA
+
+    decoded = []
+    for frame_file in frames:
+        try:
+            decoded.append(read_frame(frame_file))
+        except Exception as e:
+            return JsonResponse({'error': f'Could not read {frame_file.name}: {e}'}, status=400)
+
+    profile = ThresholdProfile.active()
+    started = time.perf_counter()
+    try:
+        results = classify_frames(decoded, params['t1'], params['t2'], rows, cols, hotspot_delta,
+                                  profile.as_thresholds() if profile else DEFAULT_THRESHOLDS)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'count': len(results),
+        'hotspot_delta_c': hotspot_delta,
+        'processing_seconds': time.perf_counter() - started,
+        'frames': [{'name': f.name, 'panels': panels} for f, panels in zip(frames, results)],
+    })
+
+class TelemetryIngestView(APIView):
+    """
+    Bulk sensor telemetry. The request body is NDJSON (default) or CSV
+    (Content-Type text/csv), optionally gzip-compressed
+    (Content-Encoding: gzip), one reading per line with panel, timestamp,
+    surface and ambient. The body is streamed, not buffered.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        stream = request.stream
+        if stream is None:
+            return Response({'error': 'Empty telemetry batch'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+            stream = gzip.GzipFile(fileobj=stream)
+        fmt = 'csv' if request.content_type in ('text/csv', 'application/csv') else 'ndjson'
+        try:
+            summary = ingest_telemetry(text_lines(stream), fmt, request.user)
+        except (TelemetryError, UnicodeDecodeError, OSError, EOFError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary)
+
+class TelemetryHourlyView(APIView):
+    """Hourly min/max/mean rollups of one panel between ?start= and ?end= (ISO 8601)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, panel_id):
+        panels = SolarPanels.objects.filter(id=panel_id)
+        if not request.user.is_staff:
+            panels = panels.filter(user=request.user)
+        if not panels.exists():
+            return Response({'error': 'Panel not found'}, status=status.HTTP_404_NOT_FOUND)
+        rollups = TelemetryHourly.objects.filter(panel_id=panel_id)
+        try:
+            if request.GET.get('start'):
+                rollups = rollups.filter(hour__gte=_parse_utc(request.GET['start']))
+            if request.GET.get('end'):
+                rollups = rollups.filter(hour__lt=_parse_utc(request.GET['end']))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = list(rollups.order_by('hour').values(
+            'hour', 'count', 'surface_min', 'surface_max', 'surface_mean',
+            'ambient_min', 'ambient_max', 'ambient_mean',
+        )[:MAX_HOURLY_ROWS])
+        return Response({'panel': panel_id, 'count': len(rows), 'results': rows})
+
+class TelemetryAlertListView(generics.ListAPIView):
+    """Damage-type transitions from the streaming evaluator, newest first; ?panel= and ?since= filter."""
+    permission_classes = [IsAuthenticated]
+    serializer_class = TelemetryAlertSerializer
+    cursor_ordering = '-at'
+
+    def get_queryset(self):
+        alerts = TelemetryAlert.objects.all()
+        if not self.request.user.is_staff:
+            alerts = alerts.filter(panel__user=self.request.user)
+        if self.request.GET.get('panel'):
+            alerts = alerts.filter(panel_id=_safe_int(self.request.GET['panel'], -1))
+        if self.request.GET.get('since'):
+            try:
+                alerts = alerts.filter(at__gte=_parse_utc(self.request.GET['since']))
+            except ValueError:
+                alerts = alerts.none()
+        return alerts
+
+class PanelAssessmentListView(generics.ListAPIView):
+    """
+    Assessment history, newest first. ?panel= narrows to one panel;
+    ?decision= takes comma-separated decision names or prefixes
+    (case-insensitive, so 'replace' matches both Replace decisions);
+    ?since= (ISO time) or ?days= bounds the window.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = PanelAssessmentSerializer
+    cursor_ordering = '-assessed_at'
+
+    def get_queryset(self):
+        assessments = PanelAssessment.objects.all()
+        if not self.request.user.is_staff:
+            assessments = assessments.filter(panel__user=self.request.user)
+        if self.request.GET.get('panel'):
+            assessments = assessments.filter(panel_id=_safe_int(self.request.GET['panel'], -1))
+        if self.request.GET.get('decision'):
+            assessments = assessments.filter(decision__in=_decision_codes(self.request.GET['decision']))
+        if self.request.GET.get('since'):
+            try:
+                assessments = assessments.filter(assessed_at__gte=_parse_utc(self.request.GET['since']))
+            except ValueError:
+                assessments = assessments.none()
+        elif self.request.GET.get('days'):
+            days = max(0, _safe_int(self.request.GET['days'], 0))
+            assessments = assessments.filter(assessed_at__gte=timezone.now() - datetime.timedelta(days=days))
+        return assessments
+
+def _decision_codes(text):
+    """DECISIONS codes matching comma-separated names or prefixes, case-insensitive."""
+    wanted = [name.strip().lower() for name in text.split(',') if name.strip()]
+    return [code for code, name in enumerate(DECISIONS) if any(name.lower().startswith(w) for w in wanted)]
+
+class FleetRollupView(APIView):
+    """
+    Staff only. Panel counts by company, installation year and decision
+    from the incrementally maintained rollups. ?groupBy= picks dimensions
+    (comma-separated from company, year, decision; default all three,
+    empty for the fleet total); ?company=, ?yearFrom=, ?yearTo= and
+    ?decision= (names or prefixes) filter.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        group_by = [name.strip() for name in request.query_params.get('groupBy', 'company,year,decision').split(',')
+                    if name.strip()]
+        unknown = [name for name in group_by if name not in GROUP_FIELDS]
+        if unknown:
+            raise ValidationError({'error': f"Unknown groupBy dimension(s): {', '.join(unknown)}"})
+        params = request.query_params
+        results = rollup(
+            group_by,
+            company=params.get('company') or None,
+            year_from=_safe_int(params['yearFrom'], None) if params.get('yearFrom') else None,
+            year_to=_safe_int(params['yearTo'], None) if params.get('yearTo') else None,
+            decisions=_decision_codes(params['decision']) if params.get('decision') else None,
+        )
+        return Response({'group_by': group_by, 'results': results})
+
+class ExportView(APIView):
+    """
+    Streams a whole table: export/<panels|donations|registrations|
+    manufacturers>.<ndjson|csv>, ?gzip=1 for a compressed download and
+    ?after=<id> to resume. Rows are read in fixed-size keyset batches, so
+    memory stays flat at any table size. Donations
+    and registrations are staff only; non-staff users get their own panels.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, name, fmt):
+        after = request.query_params.get('after')
+        try:
+            pieces, content_type, filename = stream_export(
+                name, request.user, fmt,
+                compress=str(request.query_params.get('gzip', '')).lower() in ('1', 'true'),
+                after=_safe_int(after, 0) if after else None,
+            )
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        response = StreamingHttpResponse(pieces, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+def _parse_utc(text):
+    dt = datetime.datetime.fromisoformat(text)
+    return dt if dt.tzinfo else dt.replace(tzinfo=datetime.timezone.utc)
+
+class ModelRegistryStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        # per-worker view: load time and array sizes of the models this process holds
+        return Response({'pid': os.getpid(), 'models': registry.stats()})
 
 class TokenVerifyView(APIView):
     permission_classes = [IsAuthenticated]
@@ -439,7 +741,7 @@ class RegistrationCreateView(generics.CreateAPIView):
 
 
 class RegistrationListView(generics.ListAPIView):
-    queryset = Registrations.objects.all().order_by('-created_at')
+    queryset = Registrations.objects.all()
     serializer_class = RegistrationSerializer
 
 
@@ -450,9 +752,262 @@ class ContactFormCreateView(generics.CreateAPIView):
 
 
 class ContactFormListView(generics.ListAPIView):
-    queryset = ContactForm.objects.all().order_by('-created_at')
+    queryset = ContactForm.objects.all()
     serializer_class = ContactFormSerializer
 
+@method_decorator(csrf_exempt, name='dispatch')
+class DonationCreateView(generics.CreateAPIView):
+    permission_classes = [IsAuthenticated]
+    queryset = Donation.objects.all()
+    serializer_class = DonationSerializer
+
 class ManufacturerDataListView(generics.ListAPIView):
-    queryset = ManufacturerData.objects.all()
-    serializer_class = ManufacturerDataSerializer
\ No newline at end of file
+    """
+    Manufacturer spec sheets. Filters and sorting run in SQL on the typed
+    spec columns: ?pmax_min=400&efficiency_min=21&ordering=-pmax. Sorting by
+    a spec leaves out rows where it could not be parsed.
+    """
+    serializer_class = ManufacturerDataSerializer
+
+    def get_cursor_ordering(self, request):
+        return self._ordering[0]
+
+    def get_queryset(self):
+        try:
+            self._ordering = spec_ordering(self.request.query_params)
+            queryset = filter_specs(ManufacturerData.objects.all(), self.request.query_params)
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
+        return queryset.filter(**{f'{self._ordering[1]}__isnull': False})
+
+class ManufacturerSearchView(APIView):
+    """
+    Type-ahead search over manufacturer, series and model names:
+    ?q=jinko tiger 54&limit=10. Prefixes match as you type and small typos
+    ("JKM540M-72HL" vs "jkm 540m72hl4") still find the row. Served from an
+    in-memory index (routes.search) that picks up catalogue edits within
+    SEARCH_INDEX_CHECK_SECONDS.
+    """
+    max_limit = 50
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'error': "Pass a search query as 'q'"})
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), self.max_limit))
+        except ValueError:
+            raise ValidationError({'error': "'limit' must be an integer"})
+        return Response({'query': query, 'results': manufacturer_search.search(query, limit)})
+
+class ManufacturerImportView(APIView):
+    """
+    Bulk catalogue import: POST a CSV or NDJSON `file` of ManufacturerData
+    rows (format from the file name, or `fileFormat`), `dryRun=true` to only
+    count what would change. Rows with an unchanged content hash are
+    skipped; the response is the import summary.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': "Upload the catalogue as 'file'"}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('fileFormat') or (
+            'ndjson' if upload.name.lower().endswith(('.ndjson', '.jsonl')) else 'csv')
+        if fmt not in CATALOGUE_FORMATS:
+            return Response({'error': f"'fileFormat' must be one of {', '.join(CATALOGUE_FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dryRun', '')).lower() in ('1', 'true')
+        try:
+            summary = import_catalogue(upload.file, fmt, dry_run=dry_run)
+        except (CatalogueError, UnicodeDecodeError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+def _geo_params(request, names):
+    """Float query parameters for the geo endpoints, with lat/lon range checks."""
+    values = {}
+    for name in names:
+        value = _optional_float(request.query_params.get(name))
+        if value is None or not np.isfinite(value):
+            raise ValidationError({'error': f"'{name}' must be a number"})
+        values[name] = value
+    for name in ('lat', 'south', 'north'):
+        if name in values and not -90 <= values[name] <= 90:
+            raise ValidationError({'error': f"'{name}' must be between -90 and 90"})
+    for name in ('lon', 'west', 'east'):
+        if name in values and not -180 <= values[name] <= 180:
+            raise ValidationError({'error': f"'{name}' must be between -180 and 180"})
+    return values
+
+def _geo_limit(request, name='limit', default=100):
+    return max(1, min(_safe_int(request.query_params.get(name), default), MAX_GEO_RESULTS))
+
+def _geo_scope(request):
+    panels = SolarPanels.objects.all()
+    if not request.user.is_staff:
+        panels = panels.filter(user=request.user)
+    return panels
+
+def _geo_payload(ids, distances):
+    rows = {row['id']: row for row in SolarPanels.objects.filter(id__in=ids.tolist()).values(*GEO_PANEL_FIELDS)}
+    results = []
+    for panel_id, distance in zip(ids.tolist(), distances.tolist()):
+        row = rows.get(panel_id)
+        if row is not None:
+            row['distance_km'] = round(distance, 3)
+            results.append(row)
+    return results
+
+class PanelBBoxView(APIView):
+    """
+    Panels inside a lat/lon box: ?south=&west=&north=&east=&limit=. A west
+    edge east of the east edge crosses the antimeridian. The box is pruned
+    through the geo_cell index before the exact coordinate check.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        box = _geo_params(request, ('south', 'west', 'north', 'east'))
+        if box['south'] > box['north']:
+            raise ValidationError({'error': "'south' must not be north of 'north'"})
+        limit = _geo_limit(request)
+        rows = list(
+            _geo_scope(request).filter(bbox_filter(box['south'], box['west'], box['north'], box['east']))
+            .order_by('id').values(*GEO_PANEL_FIELDS)[:limit + 1]
+        )
+        return Response({'count': min(len(rows), limit), 'truncated': len(rows) > limit, 'results': rows[:limit]})
+
+class PanelRadiusView(APIView):
+    """
+    Panels within ?radius_km= (at most NEAREST_MAX_KM) of ?lat=&lon=,
+    nearest first, up to ?limit=; `count` is the full total.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        point = _geo_params(request, ('lat', 'lon', 'radius_km'))
+        if point['radius_km'] <= 0:
+            raise ValidationError({'error': "'radius_km' must be positive"})
+        if point['radius_km'] > NEAREST_MAX_KM:
+            raise ValidationError({'error': f"'radius_km' must be at most {NEAREST_MAX_KM:g}"})
+        ids, distances, total = within_radius(
+            _geo_scope(request), point['lat'], point['lon'], point['radius_km'], _geo_limit(request))
+        return Response({'count': total, 'results': _geo_payload(ids, distances)})
+
+class PanelNearestView(APIView):
+    """The ?k= panels nearest to ?lat=&lon=, nearest first; only panels within NEAREST_MAX_KM count."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        point = _geo_params(request, ('lat', 'lon'))
+        ids, distances = nearest(_geo_scope(request), point['lat'], point['lon'], _geo_limit(request, 'k', 10))
+        return Response({'count': len(ids), 'results': _geo_payload(ids, distances)})
+
+class PanelGridTileView(APIView):
+    """
+    Staff only. Fleet map tile z/x/y (2^z x 2^z lat/lon tiles, y from the
+    north): panel counts per decision on a 32 x 32 grid, read from the
+    precomputed aggregates. JSON by default; ?encoding=binary returns the
+    packed geogrid.TILE_RECORD array. Responses carry an ETag that changes
+    whenever any aggregate does, and If-None-Match gets a 304.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, z, x, y):
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < 1 << z and 0 <= y < 1 << z):
+            return Response({'error': f"Tiles exist for 0 <= z <= {MAX_ZOOM} and 0 <= x, y < 2^z"},
+                            status=status.HTTP_404_NOT_FOUND)
+        binary = request.query_params.get('encoding') == 'binary'
+        etag = '"grid-{}{}"'.format(DataVersion.current(PANEL_GRID), '-bin' if binary else '')
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        elif binary:
+            response = HttpResponse(tile_binary(z, x, y), content_type='application/octet-stream')
+        else:
+            response = Response(tile_json(z, x, y))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+class RecyclingEstimateView(APIView):
+    """
+    Recycling value of a site: recoverable material mass and value range
+    for every panel decided "Recycle Panel" (?decision=any for all panels,
+    or another decision), optionally inside ?south=&west=&north=&east=.
+    ?detail=<n> also prices the first n panels one by one. Non-staff
+    users get their own panels.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        panels = _geo_scope(request)
+        decision = request.query_params.get('decision', 'Recycle Panel')
+        if decision != 'any':
+            if decision not in DECISIONS:
+                raise ValidationError({'error': f"'decision' must be 'any' or one of {', '.join(DECISIONS)}"})
+            panels = panels.filter(decision=decision)
+        if 'south' in request.query_params:
+            box = _geo_params(request, ('south', 'west', 'north', 'east'))
+            panels = panels.filter(bbox_filter(box['south'], box['west'], box['north'], box['east']))
+        detail = max(0, min(_safe_int(request.query_params.get('detail'), 0), MAX_PANEL_RESULTS))
+        return Response(estimate_panels(panels, detail))
+
+class DonationRecyclingView(APIView):
+    """Staff only. Recycling value of a donation's panels, priced as typical crystalline modules."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk):
+        donation = Donation.objects.filter(pk=pk).first()
+        if donation is None:
+            return Response({'error': 'Donation not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(donation_estimate(donation))
+
+class TyphoonEventView(generics.ListAPIView):
+    """
+    Staff only. GET lists past storm events, newest first. POST a storm
+    track as JSON {"name", "track": [{lat, lon, speed, radius_km,
+    outer_radius_km}, ...], "dryRun"} to flag every panel it reaches:
+    reminders inside the outer radius, inspection and drone flags where the
+    storm speed reaches the active profile's typhoon threshold.
+    """
+    permission_classes = [IsAdminUser]
+    serializer_class = TyphoonEventSerializer
+    queryset = TyphoonEvent.objects.all()
+
+    def post(self, request):
+        profile = ThresholdProfile.active()
+        thresholds = profile.as_thresholds() if profile else DEFAULT_THRESHOLDS
+        try:
+            _, summary = fan_out_typhoon(
+                request.data.get('track'), thresholds.typhoon_speed_threshold,
+                name=str(request.data.get('name') or '')[:150], user=request.user,
+                dry_run=str(request.data.get('dryRun', '')).lower() in ('1', 'true'),
+            )
+        except TrackError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary, status=status.HTTP_201_CREATED if summary['event'] else status.HTTP_200_OK)
+
+class DroneRouteView(APIView):
+    """
+    Staff only. Plans drone inspection routes over every panel flagged for
+    a drone inspection: spatial clusters (one crew each), most urgent
+    first, split into battery sorties with per-stop ETAs. Optional
+    ?typhoonEvent=<id>, ?south=&west=&north=&east=, ?budgetMinutes= and
+    ?speedKmh= narrow the panels or change the flight model.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        panels = SolarPanels.objects.all()
+        if request.query_params.get('typhoonEvent'):
+            panels = panels.filter(typhoon_event_id=_safe_int(request.query_params['typhoonEvent'], 0))
+        if 'south' in request.query_params:
+            box = _geo_params(request, ('south', 'west', 'north', 'east'))
+            panels = panels.filter(bbox_filter(box['south'], box['west'], box['north'], box['east']))
+        budget = _optional_float(request.query_params.get('budgetMinutes')) or FLIGHT_BUDGET_MINUTES
+        speed = _optional_float(request.query_params.get('speedKmh')) or DRONE_SPEED_KMH
+        if not (0 < budget <= 240 and 0 < speed <= 200):
+            raise ValidationError({'error': "'budgetMinutes' must be in (0, 240] and 'speedKmh' in (0, 200]"})
+        return Response(plan_inspections(panels, speed_kmh=speed, budget_minutes=budget))
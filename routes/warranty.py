@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import namedtuple
+from django.conf import settings
+from .models import DataVersion, ManufacturerData
+from .signals import MANUFACTURER_DATA
+
+STANDARD_CELL_TEMPERATURE = 25.0        # degC, STC rating point of max_power_temp_coeff
+
+# numeric warranty terms of one catalogue row; any field may be None
+WarrantyCurve = namedtuple('WarrantyCurve', [
+    'product_years',        # warranty_years: defects / workmanship
+    'performance_years',    # primary_years: linear power warranty term
+    'end_output',           # output_power_percent guaranteed at the end of that term, as a fraction
+    'annual_degradation',   # implied linear loss per year, as a fraction (promisedDegradationRate)
+    'temp_coeff',           # max_power_temp_coeff, %/degC (negative)
+])
+
+_COLUMNS = ('id', 'warranty_years_num', 'primary_years_num', 'output_power_percent_num', 'max_power_temp_coeff_num')
+
+
+def warranty_curve(product_years, performance_years, output_percent, temp_coeff):
+    """WarrantyCurve from the parsed spec columns, or None when the row has no warranty data."""
+    if not 0 < (performance_years or 0) <= 50:
+        performance_years = None
+    end_output = output_percent / 100.0 if output_percent and 0 < output_percent <= 100 else None
+    annual = (1.0 - end_output) / performance_years if end_output and performance_years else None
+    if not 0 < (product_years or 0) <= 50:
+        product_years = None
+    curve = WarrantyCurve(product_years, performance_years, end_output, annual, temp_coeff)
+    return curve if any(value is not None for value in curve) else None
+
+
+def warranty_years(curve):
+    """The term used for warrantyAge: the power warranty, else the product warranty."""
+    return curve.performance_years or curve.product_years
+
+
+def guaranteed_output(curve, age):
+    """Fraction of nameplate power the warranty promises at `age` years (None when unknown)."""
+    if curve is None or curve.annual_degradation is None:
+        return None
+    return max(0.0, 1.0 - curve.annual_degradation * min(age, curve.performance_years))
+
+
+class WarrantyCurveCache:
+    """
+    Read-through cache of WarrantyCurves by ManufacturerData id. Misses are
+    fetched in one query per call and kept, including "no such row", until
+    the manufacturer_data DataVersion moves (admin edits and imports bump
+    it on commit); each process checks the version at most every
+    `check_seconds`, so steady-state lookups never touch the database.
+    """
+
+    def __init__(self, check_seconds=2.0):
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._curves = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_seconds:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_seconds:
+                return
+            version = DataVersion.current(MANUFACTURER_DATA)
+            if version != self._version:
+                self._curves = {}
+                self._version = version
+            self._checked_at = now
+
+    def get_many(self, ids):
+        """{id: WarrantyCurve or None} for the given ids (None ids are skipped)."""
+        self._check_version()
+        curves = self._curves
+        wanted = {i for i in ids if i is not None}
+        missing = wanted - curves.keys()
+        if missing:
+            found = dict.fromkeys(missing)
+            for row_id, *values in ManufacturerData.objects.filter(id__in=missing).values_list(*_COLUMNS):
+                found[row_id] = warranty_curve(*values)
+            curves.update(found)
+        return {i: curves[i] for i in wanted}
+
+    def get(self, manufacturer_id):
+        return self.get_many([manufacturer_id]).get(manufacturer_id)
+
+
+def apply_warranty(params, curve):
+    """
+    Replaces the client-supplied promised degradation and warranty age of
+    one parse_panel_params() dict with the catalogue's, where it has them.
+    promisedWindBearingSpeed has no catalogue column and is left alone.
+    """
+    if curve is None:
+        return params
+    if curve.annual_degradation is not None:
+        params['promised_degradation'] = curve.annual_degradation
+    if warranty_years(curve):
+        params['warranty_age'] = warranty_years(curve)
+    return params
+
+
+def warranty_summary(curve, age, surface_max=None):
+    """Warranty terms used for a panel, for the predict_damage response."""
+    if curve is None:
+        return None
+    summary = {
+        'product_years': curve.product_years,
+        'performance_years': curve.performance_years,
+        'annual_degradation': None if curve.annual_degradation is None else round(curve.annual_degradation, 5),
+        'guaranteed_output': None if guaranteed_output(curve, age) is None else round(guaranteed_output(curve, age), 4),
+    }
+    if curve.temp_coeff is not None and surface_max is not None:
+        # power lost to heat at the hottest measured surface temperature, vs STC
+        loss = -curve.temp_coeff * (surface_max - STANDARD_CELL_TEMPERATURE)
+        summary['thermal_power_loss_percent'] = round(max(0.0, loss), 2)
+    return summary
+
+
+warranty_curves = WarrantyCurveCache(getattr(settings, 'WARRANTY_CACHE_CHECK_SECONDS', 2.0))